@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'tracker',
 ]
 
 MIDDLEWARE = [
@@ -73,12 +75,55 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# The tracker_mysql service when MYSQL_DATABASE is set (as in .env), SQLite otherwise.
+# Connections are kept open for CONN_MAX_AGE seconds instead of one per request,
+# and checked before reuse so a MySQL restart does not break long-running commands.
+
+if os.environ.get('MYSQL_DATABASE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.environ['MYSQL_DATABASE'],
+            'USER': os.environ.get('MYSQL_USER', 'root'),
+            'PASSWORD': os.environ.get('MYSQL_PASSWORD', os.environ.get('MYSQL_ROOT_PASSWORD', '')),
+            'HOST': os.environ.get('MYSQL_HOST', 'tracker_mysql'),
+            'PORT': os.environ.get('MYSQL_PORT', '3306'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+
+# MQTT broker the tracker samples are ingested from (manage.py ingest_mqtt)
+
+MQTT_HOST = os.environ.get('MQTT_HOST', 'tracker_mqtt')
+MQTT_PORT = int(os.environ.get('MQTT_PORT', '1883'))
+
+
+# Live WebSocket feed at /ws/live/ (backend/asgi.py): poses kept per tracker for
+# new clients, seconds between batched updates, and whether to read from MQTT
+
+LIVE_HISTORY = int(os.environ.get('LIVE_HISTORY', '100'))
+LIVE_TICK = float(os.environ.get('LIVE_TICK', '0.1'))
+LIVE_MQTT_ENABLED = os.environ.get('LIVE_MQTT_ENABLED', '1') == '1'
+
+
+# Tracker history retention in days for raw samples and per-second rollups
+# (manage.py prune_tracker_history), 0 keeps them forever. Per-minute rollups
+# are small and always kept.
+
+TRACKER_RAW_RETENTION_DAYS = float(os.environ.get('TRACKER_RAW_RETENTION_DAYS', '7'))
+TRACKER_SECOND_RETENTION_DAYS = float(os.environ.get('TRACKER_SECOND_RETENTION_DAYS', '90'))
 
 
 # Password validation
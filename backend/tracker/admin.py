@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import TrackerMinuteRollup, TrackerSample, TrackerSecondRollup
+
+
+@admin.register(TrackerSample)
+class TrackerSampleAdmin(admin.ModelAdmin):
+    list_display = ('tracker', 'timestamp', 'x', 'y', 'z', 'pitch', 'roll', 'yaw')
+    list_filter = ('tracker',)
+
+
+@admin.register(TrackerSecondRollup, TrackerMinuteRollup)
+class TrackerRollupAdmin(admin.ModelAdmin):
+    list_display = ('tracker', 'bucket', 'count', 'x_min', 'x_max', 'y_min', 'y_max', 'z_min', 'z_max')
+    list_filter = ('tracker',)
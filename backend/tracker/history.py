@@ -0,0 +1,201 @@
+"""
+Tracker history: time-bucketed rollups, raw data retention and range queries.
+
+Every batch BatchWriter writes is also folded into per-second and per-minute
+rollups (TrackerSecondRollup, TrackerMinuteRollup) in the same transaction,
+so long ranges can be read without scanning raw samples. Rollups hold the
+sample count and the min/max/sum of the position per bucket; the mean is
+sum / count, which keeps merging a new batch into an existing bucket exact.
+Rollups only cover samples written since they were introduced.
+
+Raw samples and per-second rollups are pruned after TRACKER_RAW_RETENTION_DAYS
+and TRACKER_SECOND_RETENTION_DAYS (manage.py prune_tracker_history); query_range
+only uses a resolution whose retained data covers the whole requested range.
+"""
+
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connection
+
+from .models import TrackerMinuteRollup, TrackerSample, TrackerSecondRollup
+
+AXES = ("x", "y", "z")
+STAT_FIELDS = tuple(f"{axis}_{stat}" for axis in AXES for stat in ("min", "max", "sum"))
+ROLLUP_MODELS = (TrackerSecondRollup, TrackerMinuteRollup)
+MAX_POINTS = 10000  # upper bound on the points one range query returns
+PRUNE_CHUNK = 10000  # rows deleted per statement, keeps each delete's locks short
+
+Resolution = namedtuple("Resolution", "name seconds model retention_setting")
+
+# Coarsest first; seconds=0 is the raw samples
+RESOLUTIONS = (
+    Resolution("1m", 60, TrackerMinuteRollup, None),
+    Resolution("1s", 1, TrackerSecondRollup, "TRACKER_SECOND_RETENTION_DAYS"),
+    Resolution("raw", 0, TrackerSample, "TRACKER_RAW_RETENTION_DAYS"),
+)
+
+
+# --- rollup maintenance ---
+
+def bucket_start(timestamp, seconds):
+    """Start of the bucket of the given length that timestamp falls into."""
+    epoch = timestamp.timestamp()
+    return datetime.fromtimestamp(math.floor(epoch / seconds) * seconds, tz=timezone.utc)
+
+
+def sample_rollup(model, sample):
+    """A one-sample rollup row for sample's bucket."""
+    row = model(tracker=sample.tracker, bucket=bucket_start(sample.timestamp, model.bucket_seconds), count=1)
+    for axis in AXES:
+        value = getattr(sample, axis)
+        setattr(row, f"{axis}_min", value)
+        setattr(row, f"{axis}_max", value)
+        setattr(row, f"{axis}_sum", value)
+    return row
+
+
+def merge_rollup(row, other):
+    """Adds the samples counted in other to row."""
+    row.count += other.count
+    for axis in AXES:
+        setattr(row, f"{axis}_min", min(getattr(row, f"{axis}_min"), getattr(other, f"{axis}_min")))
+        setattr(row, f"{axis}_max", max(getattr(row, f"{axis}_max"), getattr(other, f"{axis}_max")))
+        setattr(row, f"{axis}_sum", getattr(row, f"{axis}_sum") + getattr(other, f"{axis}_sum"))
+
+
+def update_rollups(samples):
+    """
+    Folds samples into every rollup table with one read and one upsert per
+    table. Call inside the transaction that writes the samples; the existing
+    buckets are locked, so concurrent writers cannot lose each other's counts.
+    """
+    if not samples:
+        return
+    for model in ROLLUP_MODELS:
+        rows = {}
+        for sample in samples:
+            row = sample_rollup(model, sample)
+            key = (row.tracker, row.bucket)
+            if key in rows:
+                merge_rollup(rows[key], row)
+            else:
+                rows[key] = row
+        # A superset of the touched buckets, filtered by key below
+        existing = model.objects.select_for_update().filter(
+            tracker__in={tracker for tracker, _ in rows}, bucket__in={bucket for _, bucket in rows})
+        for old in existing:
+            row = rows.get((old.tracker, old.bucket))
+            if row is not None:
+                merge_rollup(row, old)
+        # MySQL upserts on any unique key and does not accept a conflict target
+        unique_fields = (["tracker", "bucket"] if connection.features.supports_update_conflicts_with_target
+                         else None)
+        model.objects.bulk_create(rows.values(), update_conflicts=True, unique_fields=unique_fields,
+                                  update_fields=["count", *STAT_FIELDS])
+
+
+# --- retention ---
+
+def retention_cutoff(resolution, now, days=None):
+    """
+    Oldest time still retained at this resolution, or None if it is kept
+    forever. days overrides the resolution's retention setting.
+    """
+    if days is None and resolution.retention_setting is not None:
+        days = getattr(settings, resolution.retention_setting)
+    return now - timedelta(days=days) if days else None
+
+
+def delete_before(model, field, cutoff, chunk_size=PRUNE_CHUNK):
+    """
+    Deletes rows with field < cutoff, tracker by tracker and in chunks, so
+    every statement uses the (tracker, time) index and commits quickly.
+    Returns the number of rows deleted.
+    """
+    deleted = 0
+    trackers = list(model.objects.order_by().values_list("tracker", flat=True).distinct())
+    for tracker in trackers:
+        expired = model.objects.filter(tracker=tracker, **{f"{field}__lt": cutoff})
+        while True:
+            # MySQL cannot delete with a LIMIT subquery, so the ids are fetched first
+            ids = list(expired.values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                break
+            deleted += model.objects.filter(pk__in=ids).delete()[0]
+    return deleted
+
+
+def prune(now=None, retention_days=None, chunk_size=PRUNE_CHUNK):
+    """
+    Deletes raw samples and rollups past their retention; retention_days maps
+    resolution names to overrides of the settings. Returns {resolution name: rows deleted}.
+    """
+    now = now or datetime.now(timezone.utc)
+    retention_days = retention_days or {}
+    deleted = {}
+    for resolution in RESOLUTIONS:
+        cutoff = retention_cutoff(resolution, now, retention_days.get(resolution.name))
+        if cutoff is not None:
+            field = "timestamp" if resolution.seconds == 0 else "bucket"
+            deleted[resolution.name] = delete_before(resolution.model, field, cutoff, chunk_size)
+    return deleted
+
+
+# --- range queries ---
+
+def choose_resolution(start, end, points, now=None):
+    """
+    The coarsest resolution with at least `points` buckets between start and
+    end, among those whose retained data reaches back to start. Raw samples
+    are the finest; if they have been pruned, the finest retained rollup is used.
+    """
+    now = now or datetime.now(timezone.utc)
+    span = (end - start).total_seconds()
+    available = [r for r in RESOLUTIONS if (cutoff := retention_cutoff(r, now)) is None or start >= cutoff]
+    for resolution in available:
+        if resolution.seconds == 0 or span / resolution.seconds >= points:
+            return resolution
+    return available[-1]
+
+
+def rollup_point(row):
+    point = {"t": row.bucket.timestamp(), "count": row.count}
+    for axis in AXES:
+        point[axis] = getattr(row, f"{axis}_sum") / row.count
+        point[f"{axis}_min"] = getattr(row, f"{axis}_min")
+        point[f"{axis}_max"] = getattr(row, f"{axis}_max")
+    return point
+
+
+def sample_point(sample):
+    return {"t": sample.timestamp.timestamp(), "x": sample.x, "y": sample.y, "z": sample.z,
+            "pitch": sample.pitch, "roll": sample.roll, "yaw": sample.yaw}
+
+
+def query_range(tracker, start, end, points, now=None):
+    """
+    Positions of one tracker in [start, end) at the resolution picked by
+    choose_resolution. Rollup points carry the mean position ("x", "y", "z"),
+    its min/max and the sample count; raw points are full poses. At most
+    MAX_POINTS points are returned, "truncated" says if there were more.
+    """
+    resolution = choose_resolution(start, end, points, now)
+    if resolution.seconds == 0:
+        rows = TrackerSample.objects.filter(tracker=tracker, timestamp__gte=start, timestamp__lt=end)
+        rows, to_point = rows.order_by("timestamp"), sample_point
+    else:
+        # A bucket is included if it starts inside the range
+        rows = resolution.model.objects.filter(tracker=tracker, bucket__gte=start, bucket__lt=end)
+        rows, to_point = rows.order_by("bucket"), rollup_point
+    rows = list(rows[:MAX_POINTS + 1])
+    return {
+        "tracker": tracker,
+        "resolution": resolution.name,
+        "start": start.timestamp(),
+        "end": end.timestamp(),
+        "truncated": len(rows) > MAX_POINTS,
+        "points": [to_point(row) for row in rows[:MAX_POINTS]],
+    }
@@ -0,0 +1,249 @@
+"""
+MQTT telemetry ingestion: message parsing and batched database writes.
+
+Trackers publish JSON poses on tracker/<name>/pose:
+
+    {"x": 1.0, "y": 2.0, "z": 0.5, "pitch": 0, "roll": 0, "yaw": 90, "t": 1718000000.25}
+
+"t" is the sample time in Unix seconds (the receive time if missing), the
+rotation fields default to 0, and a message may also hold a JSON list of
+such objects. Messages arrive on the MQTT client's network thread and are
+buffered by BatchWriter; the ingest_mqtt command's main thread writes them
+with bulk_create once batch_size samples are waiting or flush_interval has
+passed since the oldest one arrived, and folds each batch into the history
+rollups (see history.py) in the same transaction. A batch that fails on a
+lost connection is kept for the next flush; one the database rejects for
+its data is split up until the rejected rows are found, and those are
+logged and dropped.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, transaction
+
+from .history import update_rollups
+from .models import TrackerSample
+
+TOPIC_PREFIX = "tracker/"
+DEFAULT_TOPICS = ("tracker/+/pose",)
+POSE_FIELDS = ("x", "y", "z", "pitch", "roll", "yaw")
+REQUIRED_FIELDS = ("x", "y", "z")
+LATENCY_WINDOW = 1000  # recent flushes kept for the write latency percentiles
+# Failures of the connection rather than of the rows; the batch is retried as it is
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+MAX_TRACKER_NAME = TrackerSample._meta.get_field("tracker").max_length
+
+logger = logging.getLogger(__name__)
+
+
+def make_paho_client():
+    """A new unconnected paho-mqtt client (1.x or 2.x). Raises ImportError without paho-mqtt."""
+    import paho.mqtt.client as mqtt
+    if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    return mqtt.Client()
+
+
+def tracker_name(topic):
+    """tracker/<name>/... -> name, or None for topics outside the tracker tree."""
+    if not topic.startswith(TOPIC_PREFIX):
+        return None
+    return topic[len(TOPIC_PREFIX):].split("/", 1)[0] or None
+
+
+def parse_poses(topic, payload, received_at):
+    """
+    Decodes one MQTT message into (tracker name, [pose dicts]); each dict has
+    "timestamp" (an aware datetime) and the POSE_FIELDS as finite floats.
+    Raises ValueError if the topic or payload is not a valid pose message.
+    """
+    name = tracker_name(topic)
+    if name is None:
+        raise ValueError(f"Not a tracker topic: {topic}")
+    if len(name) > MAX_TRACKER_NAME:
+        raise ValueError(f"Tracker name on {topic} is longer than {MAX_TRACKER_NAME} characters")
+    try:
+        data = json.loads(payload)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid JSON on {topic}: {e}")
+    entries = data if isinstance(data, list) else [data]
+    poses = []
+    for entry in entries:
+        if not isinstance(entry, dict) or any(key not in entry for key in REQUIRED_FIELDS):
+            raise ValueError(f"Pose on {topic} needs {', '.join(REQUIRED_FIELDS)}")
+        try:
+            pose = {key: float(entry.get(key, 0.0)) for key in POSE_FIELDS}
+            pose["timestamp"] = (datetime.fromtimestamp(float(entry["t"]), tz=timezone.utc)
+                                 if "t" in entry else received_at)
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            raise ValueError(f"Invalid pose on {topic}: {e}")
+        # json.loads accepts NaN and Infinity, which no position or angle can be
+        if not all(math.isfinite(pose[key]) for key in POSE_FIELDS):
+            raise ValueError(f"Pose on {topic} has a value that is not finite")
+        poses.append(pose)
+    return name, poses
+
+
+def parse_message(topic, payload, received_at):
+    """
+    Turns one MQTT message into unsaved TrackerSample objects.
+    Raises ValueError if the topic or payload is not a valid pose message.
+    """
+    name, poses = parse_poses(topic, payload, received_at)
+    return [TrackerSample(tracker=name, received_at=received_at, **pose) for pose in poses]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class BatchWriter:
+    """
+    Buffers samples from any thread and writes them in batches.
+
+    add() is called from the MQTT client thread, wait_and_flush() from the
+    thread that owns the database connection. If a write fails on the
+    connection (TRANSIENT_ERRORS) the unwritten samples are kept and retried
+    on the next flush; at most max_buffered samples are held, older ones are
+    dropped beyond that. Samples the database rejects (DataError,
+    IntegrityError, ...) are found by splitting the batch, then logged and
+    dropped, so one bad row cannot hold up the rest.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_buffered=None, clock=time.monotonic):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered or batch_size * 20
+        self.clock = clock
+        self._buffer = []
+        self._oldest = None  # clock() when the oldest buffered sample arrived
+        self._condition = threading.Condition()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = clock()
+        self.received = 0
+        self.invalid = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    # --- MQTT thread ---
+
+    def add_message(self, topic, payload):
+        """Parses and buffers one MQTT message; returns False if it was invalid."""
+        try:
+            samples = parse_message(topic, payload, datetime.now(timezone.utc))
+        except ValueError:
+            with self._condition:
+                self.invalid += 1
+            return False
+        self.add(samples)
+        return True
+
+    def add(self, samples):
+        with self._condition:
+            if not self._buffer:
+                self._oldest = self.clock()
+            self._buffer.extend(samples)
+            self.received += len(samples)
+            overflow = len(self._buffer) - self.max_buffered
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.dropped += overflow
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    # --- database thread ---
+
+    def flush_due(self):
+        return bool(self._buffer) and (len(self._buffer) >= self.batch_size or
+                                       self.clock() - self._oldest >= self.flush_interval)
+
+    def wait_and_flush(self, timeout):
+        """Waits up to timeout for a full batch or the flush interval, then flushes if due."""
+        with self._condition:
+            if self._buffer:
+                timeout = min(timeout, max(0.0, self._oldest + self.flush_interval - self.clock()))
+            due = self._condition.wait_for(self.flush_due, timeout)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far. Returns the number of rows written."""
+        with self._condition:
+            batch, self._buffer = self._buffer, []
+            self._oldest = None
+        if not batch:
+            return 0
+        # Drops connections that are broken or older than CONN_MAX_AGE, as a request would
+        close_old_connections()
+        started = time.perf_counter()
+        pending = [batch]  # chunks still to write, the next one last
+        written = 0
+        try:
+            while pending:
+                chunk = pending.pop()
+                try:
+                    self._write(chunk)
+                    written += len(chunk)
+                except TRANSIENT_ERRORS:
+                    pending.append(chunk)
+                    raise
+                except DatabaseError as e:
+                    if len(chunk) == 1:
+                        self.rejected += 1
+                        logger.warning("Dropping a sample of tracker %s that the database rejected: %s",
+                                       chunk[0].tracker, e)
+                    else:
+                        middle = len(chunk) // 2
+                        pending += [chunk[middle:], chunk[:middle]]
+        except TRANSIENT_ERRORS:
+            self.failed_flushes += 1
+            self.written += written
+            unwritten = [sample for chunk in reversed(pending) for sample in chunk]
+            with self._condition:
+                # Keep the rest for the next attempt, in front of newer samples
+                self._buffer[:0] = unwritten
+                self._oldest = self.clock()
+                overflow = len(self._buffer) - self.max_buffered
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.dropped += overflow
+            raise
+        self._latencies.append(time.perf_counter() - started)
+        self.written += written
+        self.flushes += 1
+        return written
+
+    def _write(self, samples):
+        with transaction.atomic():
+            TrackerSample.objects.bulk_create(samples, batch_size=self.batch_size)
+            update_rollups(samples)
+
+    def stats(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        latencies = sorted(self._latencies)
+        return {
+            "received": self.received,
+            "written": self.written,
+            "buffered": len(self._buffer),
+            "invalid": self.invalid,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "ingest_rate": self.received / elapsed,
+            "write_rate": self.written / elapsed,
+            "write_latency_p50": percentile(latencies, 0.50),
+            "write_latency_p99": percentile(latencies, 0.99),
+            "write_latency_max": latencies[-1] if latencies else 0.0,
+        }
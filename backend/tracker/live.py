@@ -0,0 +1,269 @@
+"""
+Live tracker positions over a WebSocket, served by backend/asgi.py at /ws/live/.
+
+Poses arrive from MQTT (see ingest.py for the topics and payload) and are
+fanned out per topic, where a topic is a tracker name. JSON text messages:
+
+    client -> server   {"type": "subscribe", "topics": ["ball", "p1"]}
+                       (no topics, or an empty list, means every topic;
+                       the same can be given as /ws/live/?topics=ball,p1)
+    server -> client   {"type": "history", "topics": {"ball": [pose, ...], ...}}
+                       on connect and on every subscribe: the last
+                       LIVE_HISTORY poses of each topic from a ring buffer
+                       {"type": "update", "topics": {"ball": [pose, ...], ...}}
+                       the poses published since the previous tick
+
+    pose: {"t": Unix seconds, "x", "y", "z", "pitch", "roll", "yaw"}
+
+Updates are batched: every LIVE_TICK seconds each client gets at most one
+message holding everything new on its topics, and clients with the same
+subscription share one serialized message. Every client has its own writer
+task; while a slow client is still sending, new updates are merged into its
+backlog (at most LIVE_HISTORY poses per topic) instead of queueing a message
+per tick, so it cannot hold up the others or grow without bound.
+
+Everything runs on the ASGI server's event loop; the MQTT client thread hands
+poses over with call_soon_threadsafe.
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+from .ingest import DEFAULT_TOPICS, POSE_FIELDS, make_paho_client, parse_poses
+
+logger = logging.getLogger(__name__)
+
+
+def pose_message(pose):
+    """A parsed pose (see ingest.parse_poses) in the JSON shape sent to browsers."""
+    message = {key: pose[key] for key in POSE_FIELDS}
+    message["t"] = pose["timestamp"].timestamp()
+    return message
+
+
+class LiveClient:
+    """One WebSocket connection and its outgoing messages."""
+
+    def __init__(self, send, max_per_topic):
+        self.send = send
+        self.max_per_topic = max_per_topic
+        self.topics = None  # None: every topic
+        self.closed = False
+        self._control = []  # history messages, sent before any update
+        self._outbox = None  # serialized update waiting for the writer
+        self._backlog = {}  # topic -> poses merged while the client was busy
+        self._busy = False
+        self._wake = asyncio.Event()
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    @property
+    def topic_key(self):
+        """Clients with equal keys get identical updates."""
+        return None if self.topics is None else frozenset(self.topics)
+
+    def queue_history(self, text):
+        # The history already holds every pose waiting to be sent
+        self._outbox = None
+        self._backlog.clear()
+        self._control.append(text)
+        self._wake.set()
+
+    def queue_update(self, text, batch):
+        """Queues a tick's update; batch is the {topic: poses} text was made from."""
+        if not self._busy and self._outbox is None and not self._backlog:
+            self._outbox = text
+        else:
+            for topic, poses in batch.items():
+                backlog = self._backlog.setdefault(topic, deque(maxlen=self.max_per_topic))
+                backlog.extend(poses)
+        self._wake.set()
+
+    def _next_text(self):
+        if self._control:
+            return self._control.pop(0)
+        if self._outbox is not None:
+            text, self._outbox = self._outbox, None
+            return text
+        if self._backlog:
+            backlog, self._backlog = self._backlog, {}
+            return json.dumps({"type": "update", "topics": {t: list(p) for t, p in backlog.items()}})
+        return None
+
+    async def run_writer(self):
+        try:
+            while not self.closed:
+                await self._wake.wait()
+                self._wake.clear()
+                while (text := self._next_text()) is not None:
+                    self._busy = True
+                    await self.send({"type": "websocket.send", "text": text})
+                    self._busy = False
+        except Exception as e:
+            # The ASGI server raises on sends after the socket went away
+            logger.debug("Live client writer stopped: %s", e)
+            self.closed = True
+
+
+class LiveHub:
+    """Ring buffers per topic and the per-tick fan-out to all clients."""
+
+    def __init__(self, history=100, tick=0.1):
+        self.history = history
+        self.tick = tick
+        self.clients = set()
+        self.loop = None
+        self.published = 0
+        self.messages_sent = 0
+        self._rings = {}  # topic -> deque of the last `history` poses
+        self._batch = {}  # topic -> poses published since the last tick
+        self._task = None
+
+    def start(self):
+        """Starts the tick task on the running event loop."""
+        if self._task is None:
+            self.loop = asyncio.get_running_loop()
+            self._task = self.loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, topic, poses):
+        """Adds poses (pose_message dicts) to a topic; event loop thread only."""
+        ring = self._rings.get(topic)
+        if ring is None:
+            ring = self._rings[topic] = deque(maxlen=self.history)
+        ring.extend(poses)
+        self._batch.setdefault(topic, []).extend(poses)
+        self.published += len(poses)
+
+    def publish_threadsafe(self, topic, poses):
+        self.loop.call_soon_threadsafe(self.publish, topic, poses)
+
+    def add(self, client):
+        self.clients.add(client)
+        self.send_history(client)
+
+    def remove(self, client):
+        client.closed = True
+        client._wake.set()
+        self.clients.discard(client)
+
+    def subscribe(self, client, topics):
+        client.topics = set(topics) if topics else None
+        self.send_history(client)
+
+    def send_history(self, client):
+        topics = {topic: list(ring) for topic, ring in self._rings.items() if client.wants(topic)}
+        client.queue_history(json.dumps({"type": "history", "topics": topics}))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Live update fan-out failed")
+
+    def flush(self):
+        """Sends everything published since the last tick, one message per client."""
+        batch, self._batch = self._batch, {}
+        if not batch:
+            return
+        shared = {}  # topic key -> (text, filtered batch)
+        for client in list(self.clients):
+            key = client.topic_key
+            entry = shared.get(key)
+            if entry is None:
+                filtered = {topic: poses for topic, poses in batch.items() if client.wants(topic)}
+                text = json.dumps({"type": "update", "topics": filtered}) if filtered else None
+                entry = shared[key] = (text, filtered)
+            if entry[0] is not None:
+                client.queue_update(*entry)
+                self.messages_sent += 1
+
+
+_hub = None
+
+
+def get_hub():
+    """The process-wide hub, started on first use together with its MQTT source."""
+    global _hub
+    if _hub is None:
+        _hub = LiveHub(settings.LIVE_HISTORY, settings.LIVE_TICK)
+        _hub.start()
+        if settings.LIVE_MQTT_ENABLED:
+            start_mqtt_source(_hub)
+    return _hub
+
+
+def start_mqtt_source(hub, host=None, port=None, topics=DEFAULT_TOPICS):
+    """Feeds the hub from the MQTT broker on paho's network thread. Returns the client, or None without paho."""
+    try:
+        client = make_paho_client()
+    except ImportError:
+        logger.warning("paho-mqtt is not installed, live updates have no source")
+        return None
+
+    def on_connect(client, userdata, flags, *args):
+        for topic in topics:
+            client.subscribe(topic, qos=0)
+
+    def on_message(client, userdata, message):
+        try:
+            name, poses = parse_poses(message.topic, message.payload, datetime.now(timezone.utc))
+        except ValueError as e:
+            logger.debug("Ignoring MQTT message: %s", e)
+            return
+        hub.publish_threadsafe(name, [pose_message(pose) for pose in poses])
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect_async(host or settings.MQTT_HOST, port or settings.MQTT_PORT)
+    client.loop_start()
+    return client
+
+
+def query_topics(scope):
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("topics", [])
+    return [topic for value in values for topic in value.split(",") if topic]
+
+
+async def live_websocket(scope, receive, send, hub=None):
+    """ASGI application for one /ws/live/ WebSocket connection."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    hub = hub or get_hub()
+    await send({"type": "websocket.accept"})
+    client = LiveClient(send, hub.history)
+    client.topics = set(query_topics(scope)) or None
+    hub.add(client)
+    writer = asyncio.create_task(client.run_writer())
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message["type"] != "websocket.receive" or not message.get("text"):
+                continue
+            try:
+                request = json.loads(message["text"])
+            except json.JSONDecodeError:
+                continue
+            if isinstance(request, dict) and request.get("type") == "subscribe":
+                topics = request.get("topics") or []
+                if isinstance(topics, list):
+                    hub.subscribe(client, [str(topic) for topic in topics])
+    finally:
+        hub.remove(client)
+        writer.cancel()
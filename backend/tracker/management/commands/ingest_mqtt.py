@@ -0,0 +1,98 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from tracker.ingest import DEFAULT_TOPICS, BatchWriter, make_paho_client
+
+POLL_INTERVAL = 0.1  # upper bound on how late a time-based flush can start
+
+
+class Command(BaseCommand):
+    help = "Subscribes to the tracker MQTT topics and stores the samples with batched inserts."
+
+    # Returns an unconnected paho-compatible client; tests replace it with a broker stand-in
+    client_factory = staticmethod(make_paho_client)
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default=settings.MQTT_HOST)
+        parser.add_argument("--port", type=int, default=settings.MQTT_PORT)
+        parser.add_argument("--topic", action="append", dest="topics",
+                            help=f"topic filter to subscribe to, repeatable (default: {', '.join(DEFAULT_TOPICS)})")
+        parser.add_argument("--batch-size", type=int, default=500, help="flush once this many samples are buffered")
+        parser.add_argument("--flush-interval", type=float, default=1.0,
+                            help="flush samples at the latest this many seconds after they arrived")
+        parser.add_argument("--report-interval", type=float, default=10.0,
+                            help="seconds between ingest rate and write latency reports, 0 to disable")
+        parser.add_argument("--duration", type=float, default=0.0, help="stop after this many seconds, 0 to run forever")
+
+    def handle(self, *args, **options):
+        topics = options["topics"] or list(DEFAULT_TOPICS)
+        writer = BatchWriter(options["batch_size"], options["flush_interval"])
+        self.stopping = False
+        try:
+            client = self.client_factory()
+        except ImportError:
+            raise CommandError("ingest_mqtt needs the paho-mqtt package")
+
+        def on_connect(client, userdata, flags, *args):
+            # (Re)subscribe on every connect, so a broker restart does not lose the subscription
+            for topic in topics:
+                client.subscribe(topic, qos=0)
+
+        def on_message(client, userdata, message):
+            writer.add_message(message.topic, message.payload)
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.connect(options["host"], options["port"])
+        client.loop_start()
+        self.stdout.write(f"Ingesting {', '.join(topics)} from {options['host']}:{options['port']}")
+        signal.signal(signal.SIGTERM, self._stop)
+
+        started = time.monotonic()
+        report_interval = options["report_interval"]
+        last_report = started
+        last_stats = writer.stats()
+        try:
+            while not self.stopping:
+                now = time.monotonic()
+                if options["duration"] and now - started >= options["duration"]:
+                    break
+                try:
+                    writer.wait_and_flush(POLL_INTERVAL)
+                except DatabaseError as e:
+                    self.stderr.write(f"Write failed, keeping {writer.stats()['buffered']} samples for retry: {e}")
+                    time.sleep(min(options["flush_interval"], 5.0))
+                if report_interval and now - last_report >= report_interval:
+                    last_stats = self.report(writer, last_stats, now - last_report)
+                    last_report = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            client.loop_stop()
+            client.disconnect()
+            try:
+                writer.flush()
+            except DatabaseError as e:
+                self.stderr.write(f"Final write failed, {writer.stats()['buffered']} samples lost: {e}")
+            self.report(writer, None, time.monotonic() - started)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def report(self, writer, previous, elapsed):
+        """Writes the ingest rate since the previous report (or overall) and the write latency."""
+        stats = writer.stats()
+        received = stats["received"] - (previous["received"] if previous else 0)
+        written = stats["written"] - (previous["written"] if previous else 0)
+        self.stdout.write(
+            f"ingest {received / max(elapsed, 1e-9):.1f} samples/s, wrote {written} rows "
+            f"(total {stats['written']}, {stats['flushes']} flushes), "
+            f"write latency p50 {stats['write_latency_p50'] * 1000:.1f} ms "
+            f"p99 {stats['write_latency_p99'] * 1000:.1f} ms, "
+            f"buffered {stats['buffered']}, invalid {stats['invalid']}, dropped {stats['dropped']}, "
+            f"rejected {stats['rejected']}")
+        return stats
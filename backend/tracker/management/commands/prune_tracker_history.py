@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tracker.history import PRUNE_CHUNK, prune
+
+
+class Command(BaseCommand):
+    help = ("Deletes raw tracker samples older than TRACKER_RAW_RETENTION_DAYS and per-second rollups "
+            "older than TRACKER_SECOND_RETENTION_DAYS. Meant to run periodically, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--raw-days", type=float, help="override TRACKER_RAW_RETENTION_DAYS, 0 keeps everything")
+        parser.add_argument("--second-days", type=float,
+                            help="override TRACKER_SECOND_RETENTION_DAYS, 0 keeps everything")
+        parser.add_argument("--chunk-size", type=int, default=PRUNE_CHUNK, help="rows deleted per statement")
+
+    def handle(self, *args, **options):
+        retention_days = {"raw": options["raw_days"], "1s": options["second_days"]}
+        deleted = prune(retention_days=retention_days, chunk_size=options["chunk_size"])
+        for name, count in deleted.items():
+            self.stdout.write(f"{name}: deleted {count} rows")
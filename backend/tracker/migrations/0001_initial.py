@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackerSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracker', models.CharField(max_length=64)),
+                ('timestamp', models.DateTimeField(help_text='When the tracker took the sample')),
+                ('received_at', models.DateTimeField(help_text='When the ingestion command received it')),
+                ('x', models.FloatField()),
+                ('y', models.FloatField()),
+                ('z', models.FloatField()),
+                ('pitch', models.FloatField(default=0.0)),
+                ('roll', models.FloatField(default=0.0)),
+                ('yaw', models.FloatField(default=0.0)),
+            ],
+        ),
+    ]
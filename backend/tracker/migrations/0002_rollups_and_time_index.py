@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackerMinuteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracker', models.CharField(max_length=64)),
+                ('bucket', models.DateTimeField(help_text='Start of the time bucket')),
+                ('count', models.PositiveIntegerField()),
+                ('x_min', models.FloatField()),
+                ('x_max', models.FloatField()),
+                ('x_sum', models.FloatField()),
+                ('y_min', models.FloatField()),
+                ('y_max', models.FloatField()),
+                ('y_sum', models.FloatField()),
+                ('z_min', models.FloatField()),
+                ('z_max', models.FloatField()),
+                ('z_sum', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrackerSecondRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracker', models.CharField(max_length=64)),
+                ('bucket', models.DateTimeField(help_text='Start of the time bucket')),
+                ('count', models.PositiveIntegerField()),
+                ('x_min', models.FloatField()),
+                ('x_max', models.FloatField()),
+                ('x_sum', models.FloatField()),
+                ('y_min', models.FloatField()),
+                ('y_max', models.FloatField()),
+                ('y_sum', models.FloatField()),
+                ('z_min', models.FloatField()),
+                ('z_max', models.FloatField()),
+                ('z_sum', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trackersample',
+            index=models.Index(fields=['tracker', 'timestamp'], name='tracker_sample_tracker_time'),
+        ),
+        migrations.AddConstraint(
+            model_name='trackerminuterollup',
+            constraint=models.UniqueConstraint(fields=('tracker', 'bucket'), name='tracker_minute_rollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='trackersecondrollup',
+            constraint=models.UniqueConstraint(fields=('tracker', 'bucket'), name='tracker_second_rollup_bucket'),
+        ),
+    ]
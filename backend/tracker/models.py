@@ -0,0 +1,68 @@
+from django.db import models
+
+
+class TrackerSample(models.Model):
+    """One pose reported by a tracker over MQTT."""
+
+    tracker = models.CharField(max_length=64)
+    timestamp = models.DateTimeField(help_text="When the tracker took the sample")
+    received_at = models.DateTimeField(help_text="When the ingestion command received it")
+    x = models.FloatField()
+    y = models.FloatField()
+    z = models.FloatField()
+    pitch = models.FloatField(default=0.0)
+    roll = models.FloatField(default=0.0)
+    yaw = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            # Range queries and pruning always filter on one tracker and a time range
+            models.Index(fields=['tracker', 'timestamp'], name='tracker_sample_tracker_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.tracker} @ {self.timestamp:%Y-%m-%d %H:%M:%S.%f}"
+
+
+class TrackerRollup(models.Model):
+    """
+    Position statistics of one tracker over a fixed time bucket. Sums are
+    stored instead of means so new samples can be merged in incrementally.
+    """
+
+    tracker = models.CharField(max_length=64)
+    bucket = models.DateTimeField(help_text="Start of the time bucket")
+    count = models.PositiveIntegerField()
+    x_min = models.FloatField()
+    x_max = models.FloatField()
+    x_sum = models.FloatField()
+    y_min = models.FloatField()
+    y_max = models.FloatField()
+    y_sum = models.FloatField()
+    z_min = models.FloatField()
+    z_max = models.FloatField()
+    z_sum = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.tracker} @ {self.bucket:%Y-%m-%d %H:%M:%S} ({self.count} samples)"
+
+
+class TrackerSecondRollup(TrackerRollup):
+    bucket_seconds = 1
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tracker', 'bucket'], name='tracker_second_rollup_bucket'),
+        ]
+
+
+class TrackerMinuteRollup(TrackerRollup):
+    bucket_seconds = 60
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tracker', 'bucket'], name='tracker_minute_rollup_bucket'),
+        ]
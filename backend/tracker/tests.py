@@ -0,0 +1,378 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .history import choose_resolution, prune, query_range
+from .ingest import BatchWriter, parse_message
+from .live import LiveClient, LiveHub, live_websocket
+from .management.commands import ingest_mqtt
+from .models import TrackerMinuteRollup, TrackerSample, TrackerSecondRollup
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter matching with + and # wildcards."""
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or (level != "+" and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class FakeBroker:
+    """In-process stand-in for the MQTT broker; messages published before a client subscribes are queued."""
+
+    def __init__(self):
+        self.pending = []
+
+    def publish(self, topic, payload):
+        self.pending.append((topic, payload if isinstance(payload, bytes) else json.dumps(payload).encode()))
+
+    def client(self):
+        return FakeClient(self)
+
+
+class FakeClient:
+    """The part of paho.mqtt.client.Client the ingest command uses; delivers on its own thread like paho."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self.subscriptions = []
+        self.delivered = threading.Event()
+        self._thread = None
+
+    def connect(self, host, port):
+        self.address = (host, port)
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+
+    def loop_start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+
+    def _run(self):
+        self.on_connect(self, None, {}, 0, None)
+        for topic, payload in self.broker.pending:
+            if any(topic_matches(f, topic) for f in self.subscriptions):
+                self.on_message(self, None, SimpleNamespace(topic=topic, payload=payload))
+        self.delivered.set()
+
+    def loop_stop(self):
+        self._thread.join()
+
+    def disconnect(self):
+        pass
+
+
+def pose(x, t=None):
+    message = {"x": x, "y": 2.0, "z": 0.5, "yaw": 90}
+    if t is not None:
+        message["t"] = t
+    return message
+
+
+class ParseMessageTests(SimpleTestCase):
+    received_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def test_single_pose(self):
+        [sample] = parse_message("tracker/ball/pose", json.dumps(pose(1.0, t=1700000000.5)), self.received_at)
+        self.assertEqual(sample.tracker, "ball")
+        self.assertEqual((sample.x, sample.y, sample.z, sample.pitch, sample.yaw), (1.0, 2.0, 0.5, 0.0, 90.0))
+        self.assertEqual(sample.timestamp, datetime.fromtimestamp(1700000000.5, tz=timezone.utc))
+        self.assertEqual(sample.received_at, self.received_at)
+
+    def test_list_and_missing_timestamp(self):
+        samples = parse_message("tracker/p1/pose", json.dumps([pose(1.0), pose(2.0)]), self.received_at)
+        self.assertEqual([s.x for s in samples], [1.0, 2.0])
+        self.assertEqual(samples[0].timestamp, self.received_at)
+
+    def test_invalid_messages(self):
+        for topic, payload in [("other/ball/pose", json.dumps(pose(1.0))),
+                               ("tracker/ball/pose", b"not json"),
+                               ("tracker/ball/pose", json.dumps({"x": 1.0})),
+                               ("tracker/ball/pose", json.dumps(pose("a")))]:
+            with self.subTest(topic=topic, payload=payload), self.assertRaises(ValueError):
+                parse_message(topic, payload, self.received_at)
+
+    def test_non_finite_values(self):
+        for payload in ['{"x": NaN, "y": 2.0, "z": 0.5}', '{"x": 1.0, "y": 2.0, "z": 0.5, "yaw": -Infinity}',
+                        json.dumps(pose("inf")), '{"x": 1.0, "y": 2.0, "z": 0.5, "t": NaN}']:
+            with self.subTest(payload=payload), self.assertRaises(ValueError):
+                parse_message("tracker/ball/pose", payload, self.received_at)
+
+    def test_tracker_name_length(self):
+        self.assertEqual(parse_message(f"tracker/{'a' * 64}/pose", json.dumps(pose(1.0)), self.received_at)[0].tracker,
+                         "a" * 64)
+        with self.assertRaises(ValueError):
+            parse_message(f"tracker/{'a' * 65}/pose", json.dumps(pose(1.0)), self.received_at)
+
+
+class BatchWriterTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.writer = BatchWriter(batch_size=3, flush_interval=1.0, max_buffered=5, clock=lambda: self.now)
+
+    def add(self, count):
+        for index in range(count):
+            self.writer.add_message("tracker/ball/pose", json.dumps(pose(float(index))))
+
+    def test_flushes_on_batch_size(self):
+        self.add(2)
+        self.assertFalse(self.writer.flush_due())
+        self.add(1)
+        self.assertTrue(self.writer.flush_due())
+        self.writer.wait_and_flush(0)
+        self.assertEqual(TrackerSample.objects.count(), 3)
+        self.assertEqual(self.writer.stats()["flushes"], 1)
+
+    def test_flushes_on_interval(self):
+        self.add(1)
+        self.now = 0.5
+        self.writer.wait_and_flush(0)
+        self.assertEqual(TrackerSample.objects.count(), 0)
+        self.now = 1.0
+        self.writer.wait_and_flush(0)
+        self.assertEqual(TrackerSample.objects.count(), 1)
+
+    def test_failed_write_keeps_samples(self):
+        self.add(2)
+        with mock.patch.object(TrackerSample.objects, "bulk_create", side_effect=OperationalError("gone")):
+            with self.assertRaises(DatabaseError):
+                self.writer.flush()
+        self.assertEqual(self.writer.stats()["buffered"], 2)
+        self.add(5)  # over max_buffered, the oldest are dropped
+        self.assertEqual(self.writer.stats()["dropped"], 2)
+        self.assertEqual(self.writer.flush(), 5)
+        self.assertEqual(TrackerSample.objects.count(), 5)
+
+    def test_rejected_rows_are_dropped(self):
+        writer = BatchWriter(batch_size=8, flush_interval=1.0, clock=lambda: self.now)
+        for index in range(8):
+            writer.add_message("tracker/ball/pose", json.dumps(pose(float(index))))
+        bulk_create = TrackerSample.objects.bulk_create
+
+        def reject_x3(samples, **kwargs):
+            if any(sample.x == 3.0 for sample in samples):
+                raise IntegrityError("bad row")
+            return bulk_create(samples, **kwargs)
+
+        with mock.patch.object(TrackerSample.objects, "bulk_create", side_effect=reject_x3), \
+                self.assertLogs("tracker.ingest", "WARNING"):
+            self.assertEqual(writer.flush(), 7)
+        self.assertEqual(sorted(TrackerSample.objects.values_list("x", flat=True)), [0, 1, 2, 4, 5, 6, 7])
+        self.assertEqual(writer.stats()["rejected"], 1)
+        self.assertEqual(writer.stats()["buffered"], 0)
+
+    def test_invalid_messages_are_counted(self):
+        self.assertFalse(self.writer.add_message("tracker/ball/pose", b"{"))
+        self.assertEqual(self.writer.stats()["invalid"], 1)
+
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def write_samples(writer, tracker, offsets_and_x):
+    """Writes samples at T0 + offset seconds through the batch writer."""
+    writer.add([TrackerSample(tracker=tracker, timestamp=T0 + timedelta(seconds=offset), received_at=T0,
+                              x=x, y=-x, z=0.0) for offset, x in offsets_and_x])
+    writer.flush()
+
+
+class RollupTests(TestCase):
+    def test_rollups_merge_across_batches(self):
+        writer = BatchWriter()
+        write_samples(writer, "ball", [(0.1, 1.0), (0.5, 3.0), (1.2, 5.0)])
+        write_samples(writer, "ball", [(0.9, -1.0), (61.0, 7.0)])
+        write_samples(writer, "p1", [(0.2, 9.0)])
+        first = TrackerSecondRollup.objects.get(tracker="ball", bucket=T0)
+        self.assertEqual((first.count, first.x_min, first.x_max, first.x_sum), (3, -1.0, 3.0, 3.0))
+        self.assertEqual((first.y_min, first.y_max), (-3.0, 1.0))
+        self.assertEqual(TrackerSecondRollup.objects.filter(tracker="ball").count(), 3)
+        minutes = TrackerMinuteRollup.objects.filter(tracker="ball").order_by("bucket")
+        self.assertEqual([(m.count, m.x_sum) for m in minutes], [(4, 8.0), (1, 7.0)])
+        self.assertEqual(TrackerMinuteRollup.objects.get(tracker="p1").count, 1)
+
+    def test_failed_rollup_rolls_back_samples(self):
+        writer = BatchWriter()
+        with mock.patch("tracker.ingest.update_rollups", side_effect=OperationalError("gone")):
+            with self.assertRaises(DatabaseError):
+                write_samples(writer, "ball", [(0.0, 1.0)])
+        self.assertEqual(TrackerSample.objects.count(), 0)
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(TrackerSecondRollup.objects.get().count, 1)
+
+
+@override_settings(TRACKER_RAW_RETENTION_DAYS=1, TRACKER_SECOND_RETENTION_DAYS=7)
+class HistoryQueryTests(TestCase):
+    def setUp(self):
+        # Two samples per second over the first 10 minutes
+        write_samples(BatchWriter(batch_size=2000), "ball", [(i / 2, float(i)) for i in range(1200)])
+        self.now = T0 + timedelta(hours=1)
+
+    def test_chooses_coarsest_resolution_with_enough_points(self):
+        end = T0 + timedelta(minutes=10)
+        for points, name in [(10, "1m"), (11, "1s"), (600, "1s"), (601, "raw")]:
+            with self.subTest(points=points):
+                self.assertEqual(choose_resolution(T0, end, points, self.now).name, name)
+
+    def test_skips_pruned_resolutions(self):
+        now = T0 + timedelta(days=2)  # raw samples of T0 are past retention
+        self.assertEqual(choose_resolution(T0, T0 + timedelta(minutes=10), 1000, now).name, "1s")
+        now = T0 + timedelta(days=30)
+        self.assertEqual(choose_resolution(T0, T0 + timedelta(minutes=10), 1000, now).name, "1m")
+
+    def test_query_range(self):
+        result = query_range("ball", T0, T0 + timedelta(minutes=2), 2, self.now)
+        self.assertEqual(result["resolution"], "1m")
+        [first, second] = result["points"]
+        self.assertEqual((first["count"], first["x"], first["x_min"], first["x_max"]), (120, 59.5, 0.0, 119.0))
+        self.assertEqual(second["t"], (T0 + timedelta(minutes=1)).timestamp())
+        raw = query_range("ball", T0, T0 + timedelta(seconds=2), 100, self.now)
+        self.assertEqual((raw["resolution"], [p["x"] for p in raw["points"]]), ("raw", [0.0, 1.0, 2.0, 3.0]))
+        self.assertFalse(raw["truncated"])
+
+    @override_settings(TRACKER_RAW_RETENTION_DAYS=0, TRACKER_SECOND_RETENTION_DAYS=0)
+    def test_history_view(self):
+        # The view measures retention from the current time, so keep everything
+        response = self.client.get("/api/trackers/ball/history/",
+                                   {"start": T0.timestamp(), "end": "2025-01-01T00:10:00Z", "points": 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["resolution"], "1s")
+        self.assertEqual(len(response.json()["points"]), 600)
+        for params in [{"start": "yesterday"}, {"start": T0.timestamp(), "end": T0.timestamp()}, {"points": 0}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get("/api/trackers/ball/history/", params).status_code, 400)
+
+    def test_prune(self):
+        deleted = prune(now=T0 + timedelta(days=1, minutes=5), chunk_size=100)
+        self.assertEqual(deleted, {"1s": 0, "raw": 600})
+        self.assertEqual(TrackerSample.objects.earliest("timestamp").timestamp, T0 + timedelta(minutes=5))
+        out = StringIO()
+        call_command("prune_tracker_history", raw_days=0, second_days=1, stdout=out)
+        self.assertEqual(TrackerSecondRollup.objects.count(), 0)
+        self.assertEqual(TrackerSample.objects.count(), 600)
+        self.assertEqual(TrackerMinuteRollup.objects.count(), 10)
+        self.assertEqual(out.getvalue(), "1s: deleted 600 rows\n")
+
+
+class IngestCommandTests(TestCase):
+    def test_ingests_published_samples(self):
+        broker = FakeBroker()
+        for index in range(25):
+            broker.publish(f"tracker/p{index % 2}/pose", pose(float(index), t=1700000000 + index))
+        broker.publish("tracker/p0/status", {"battery": 0.5})  # not subscribed
+        broker.publish("tracker/p0/pose", b"garbage")
+        client = broker.client()
+        command = ingest_mqtt.Command()
+        command.client_factory = lambda: client
+        out = StringIO()
+        call_command(command, host="broker", port=1234, batch_size=10, flush_interval=0.05,
+                     report_interval=0, duration=0.3, stdout=out)
+        self.assertEqual(client.address, ("broker", 1234))
+        self.assertEqual(client.subscriptions, ["tracker/+/pose"])
+        self.assertEqual(TrackerSample.objects.count(), 25)
+        self.assertEqual(TrackerSample.objects.filter(tracker="p1").count(), 12)
+        self.assertIn("invalid 1", out.getvalue())
+        self.assertIn("write latency", out.getvalue())
+
+
+class WebSocketDriver:
+    """Drives live_websocket like an ASGI server would."""
+
+    def __init__(self, hub, query_string=b""):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {"type": "websocket", "path": "/ws/live/", "query_string": query_string}
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(live_websocket(scope, self.incoming.get, self.outgoing.put, hub=hub))
+
+    async def receive_json(self):
+        message = await asyncio.wait_for(self.outgoing.get(), 1)
+        if message["type"] == "websocket.accept":
+            message = await asyncio.wait_for(self.outgoing.get(), 1)
+        return json.loads(message["text"])
+
+    def send_json(self, data):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 1)
+
+
+def live_pose(x):
+    return {"t": 1700000000.0 + x, "x": x, "y": 0.0, "z": 0.0, "pitch": 0.0, "roll": 0.0, "yaw": 0.0}
+
+
+class LiveFeedTests(SimpleTestCase):
+    async def test_history_on_connect(self):
+        hub = LiveHub(history=3)
+        hub.publish("ball", [live_pose(x) for x in range(5)])
+        client = WebSocketDriver(hub)
+        message = await client.receive_json()
+        self.assertEqual(message["type"], "history")
+        self.assertEqual([p["x"] for p in message["topics"]["ball"]], [2, 3, 4])
+        await client.close()
+
+    async def test_one_batched_update_per_tick(self):
+        hub = LiveHub()
+        client = WebSocketDriver(hub)
+        await client.receive_json()
+        for x in range(4):
+            hub.publish("ball" if x % 2 else "p1", [live_pose(x)])
+        hub.flush()
+        hub.flush()  # nothing new, nothing sent
+        message = await client.receive_json()
+        self.assertEqual(message["type"], "update")
+        self.assertEqual({t: [p["x"] for p in poses] for t, poses in message["topics"].items()},
+                         {"p1": [0, 2], "ball": [1, 3]})
+        self.assertTrue(client.outgoing.empty())
+        await client.close()
+
+    async def test_topic_subscription(self):
+        hub = LiveHub()
+        hub.publish("p1", [live_pose(0)])
+        client = WebSocketDriver(hub, b"topics=ball")
+        self.assertEqual((await client.receive_json())["topics"], {})
+        hub.publish("p1", [live_pose(1)])
+        hub.publish("ball", [live_pose(2)])
+        hub.flush()
+        self.assertEqual(list((await client.receive_json())["topics"]), ["ball"])
+        client.send_json({"type": "subscribe", "topics": ["p1"]})
+        history = await client.receive_json()
+        self.assertEqual([p["x"] for p in history["topics"]["p1"]], [0, 1])
+        await client.close()
+
+    async def test_slow_client_gets_merged_backlog(self):
+        release = asyncio.Event()
+        sent = []
+
+        async def slow_send(message):
+            sent.append(json.loads(message["text"]))
+            await release.wait()
+
+        client = LiveClient(slow_send, max_per_topic=2)
+        writer = asyncio.create_task(client.run_writer())
+        for x in range(4):
+            batch = {"ball": [live_pose(x)]}
+            client.queue_update(json.dumps({"type": "update", "topics": batch}), batch)
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.sleep(0.01)
+        client.closed = True
+        writer.cancel()
+        # The first update went out; the three queued behind it were merged, keeping the newest two poses
+        self.assertEqual([[p["x"] for p in m["topics"]["ball"]] for m in sent], [[0], [2, 3]])
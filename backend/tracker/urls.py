@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('<str:tracker>/history/', views.tracker_history, name='tracker-history'),
+]
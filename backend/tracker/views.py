@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from .history import query_range
+
+DEFAULT_RANGE = timedelta(hours=1)
+DEFAULT_POINTS = 500
+
+
+def parse_time(value):
+    """Unix seconds or an ISO 8601 datetime (UTC if it has no offset). Raises ValueError."""
+    try:
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except ValueError:
+        pass
+    except (OverflowError, OSError) as e:
+        raise ValueError(f"Time out of range: {value}") from e
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid time: {value}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@require_GET
+def tracker_history(request, tracker):
+    """
+    GET /api/trackers/<tracker>/history/?start=&end=&points=
+
+    Positions between start and end (default: the last hour) at the coarsest
+    stored resolution that still yields `points` points, see history.query_range.
+    """
+    try:
+        end = parse_time(request.GET["end"]) if "end" in request.GET else datetime.now(timezone.utc)
+        start = parse_time(request.GET["start"]) if "start" in request.GET else end - DEFAULT_RANGE
+        points = int(request.GET.get("points", DEFAULT_POINTS))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if start >= end:
+        return JsonResponse({"error": "start must be before end"}, status=400)
+    if points < 1:
+        return JsonResponse({"error": "points must be at least 1"}, status=400)
+    return JsonResponse(query_range(tracker, start, end, points))
@@ -1,11 +1,124 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
+import { Badge, Table } from "react-bootstrap";
 import "../styles/Home.css";
 
+// Live tracker feed from the backend (backend/tracker/live.py). The server
+// sends a "history" message on connect and one batched "update" per tick.
+const LIVE_URL =
+  import.meta.env.VITE_LIVE_URL ??
+  `${window.location.protocol === "https:" ? "wss" : "ws"}://${window.location.host}/ws/live/`;
+const MAX_RECONNECT_DELAY = 10000;
+
+// Keeps the newest pose and a sample count per tracker
+function mergePoses(trackers, topics, replace) {
+  const next = replace ? {} : { ...trackers };
+  for (const [name, poses] of Object.entries(topics)) {
+    if (poses.length === 0) continue;
+    const previous = next[name];
+    next[name] = {
+      pose: poses[poses.length - 1],
+      samples: (previous && !replace ? previous.samples : 0) + poses.length,
+    };
+  }
+  return next;
+}
+
+function useLiveTrackers() {
+  const [trackers, setTrackers] = useState({});
+  const [connected, setConnected] = useState(false);
+
+  useEffect(() => {
+    let socket;
+    let retryTimer;
+    let retryDelay = 500;
+    let stopped = false;
+
+    function connect() {
+      socket = new WebSocket(LIVE_URL);
+      socket.onopen = () => {
+        setConnected(true);
+        retryDelay = 500;
+      };
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        setTrackers((current) =>
+          mergePoses(current, message.topics, message.type === "history"),
+        );
+      };
+      socket.onclose = () => {
+        setConnected(false);
+        if (!stopped) {
+          retryTimer = setTimeout(connect, retryDelay);
+          retryDelay = Math.min(retryDelay * 2, MAX_RECONNECT_DELAY);
+        }
+      };
+    }
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      socket.close();
+    };
+  }, []);
+
+  return { trackers, connected };
+}
+
+function formatNumber(value) {
+  return value.toFixed(2);
+}
+
 function Home() {
+  const { trackers, connected } = useLiveTrackers();
+  const names = Object.keys(trackers).sort();
+
   return (
     <main role="main">
       <div className="page-container">
         <h1 className="text-center">Live Data</h1>
+        <p>
+          <Badge bg={connected ? "success" : "secondary"}>
+            {connected ? "Connected" : "Connecting..."}
+          </Badge>
+        </p>
+        {names.length === 0 ? (
+          <p>No tracker data yet.</p>
+        ) : (
+          <Table striped bordered size="sm" className="live-table">
+            <thead>
+              <tr>
+                <th>Tracker</th>
+                <th>X</th>
+                <th>Y</th>
+                <th>Z</th>
+                <th>Pitch</th>
+                <th>Roll</th>
+                <th>Yaw</th>
+                <th>Time</th>
+                <th>Samples</th>
+              </tr>
+            </thead>
+            <tbody>
+              {names.map((name) => {
+                const { pose, samples } = trackers[name];
+                return (
+                  <tr key={name}>
+                    <td>{name}</td>
+                    <td>{formatNumber(pose.x)}</td>
+                    <td>{formatNumber(pose.y)}</td>
+                    <td>{formatNumber(pose.z)}</td>
+                    <td>{formatNumber(pose.pitch)}</td>
+                    <td>{formatNumber(pose.roll)}</td>
+                    <td>{formatNumber(pose.yaw)}</td>
+                    <td>{new Date(pose.t * 1000).toLocaleTimeString()}</td>
+                    <td>{samples}</td>
+                  </tr>
+                );
+              })}
+            </tbody>
+          </Table>
+        )}
       </div>
     </main>
   );
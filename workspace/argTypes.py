@@ -0,0 +1,17 @@
+"""
+argparse type helpers shared by the server and the tools around it
+(blenderServer.py, benchmark.py). Standard library only, no bpy.
+"""
+
+import argparse
+
+
+def parse_resolution(text):
+    """'1280x720' -> (1280, 720), for argparse."""
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"resolution must be positive, got {text!r}")
+    return width, height
@@ -0,0 +1,278 @@
+"""
+Load generator for the Blender render server, runnable without Blender.
+
+The server (blenderServer.py) runs in a child process against the stand-in
+bpy from fakeBpy.py, with a synthetic render cost. N concurrent clients each
+send a weighted mix of move and render commands, one at a time, for a fixed
+duration. The result is printed as JSON: throughput and latency percentiles
+per command and overall, as seen by the clients, plus the server's own stats
+(per-stage timings, render cache, coalescing).
+
+    python3 benchmark.py --clients 8 --duration 10 --mix move=4,render=1 \\
+        --render-ms 20 --resolution 640x480 --encoding jpeg --output result.json
+
+Needs numpy, like the server; JPEG/WebP encodings also need Pillow.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+
+import argTypes
+import protocol
+
+SERVER_START_TIMEOUT = 30.0
+REPLY_TIMEOUT = 60.0
+
+
+# === Server process ===
+
+def run_server(port, options):
+    """
+    Child process: the real blenderServer module on top of fakeBpy. The scene
+    holds options["objects"] and options["cameras"] if given (replay.py),
+    else the single options["object"] and options["camera"].
+    """
+    import fakeBpy
+    fakeBpy.install(render_seconds=options["render_ms"] / 1000.0,
+                    render_seconds_per_mpixel=options["render_ms_per_mpixel"] / 1000.0,
+                    objects=options.get("objects") or [options["object"]],
+                    cameras=options.get("cameras") or [options["camera"]])
+    if not options["server_log"]:
+        sys.stdout = open(os.devnull, "w")
+    import blenderServer
+    if not options["cache"]:
+        blenderServer.render_cache.max_bytes = 0
+    blenderServer.start_network_server(host='127.0.0.1', port=port, coalesce=options["coalesce"])
+    blenderServer.run_background_loop()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(port, process):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        if not process.is_alive():
+            raise RuntimeError(f"Server process exited with code {process.exitcode}")
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+# === Clients ===
+
+class V2Client:
+    """Protocol v2 client sending OP_JSON requests; replies are matched by request id."""
+
+    async def connect(self, port, host='127.0.0.1'):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(protocol.V2_HELLO.pack(protocol.PROTOCOL_V2_MAGIC, protocol.PROTOCOL_V2_VERSION))
+        await self.reader.readexactly(protocol.V2_HELLO.size)
+        self._next_id = 0
+
+    async def request(self, command):
+        """Sends one command and returns (bytes received, error) once its reply is complete."""
+        self._next_id += 1
+        self.writer.write(protocol.encode_v2_request(self._next_id, command))
+        received = 0
+        while True:
+            header = await self.reader.readexactly(protocol.V2_HEADER.size)
+            length, opcode, _, request_id = protocol.V2_HEADER.unpack(header)
+            payload = await self.reader.readexactly(length)
+            received += len(header) + length
+            if opcode == protocol.OP_ERROR:
+                return received, payload.decode("utf-8", "replace")
+            if opcode == protocol.OP_FRAME:
+                _, index, count = protocol.decode_v2_frame(payload)
+                if index + 1 < count:
+                    continue
+            return received, None
+
+    def close(self):
+        self.writer.close()
+
+
+class JsonClient:
+    """JSON lines client; render requests always ask for an encoding so replies carry a frame header."""
+
+    async def connect(self, port):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+
+    async def request(self, command):
+        self.writer.write(json.dumps(command).encode("utf-8") + b"\n")
+        if command["command"] == "render":
+            header = await self.reader.readexactly(protocol.FRAME_HEADER.size)
+            length = protocol.FRAME_HEADER.unpack(header)[3]
+            await self.reader.readexactly(length)
+            return len(header) + length, None
+        line = await self.reader.readline()
+        return len(line), None
+
+    def close(self):
+        self.writer.close()
+
+
+CLIENTS = {"v2": V2Client, "json": JsonClient}
+
+
+def make_command(rng, command_type, args):
+    pose = {key: rng.uniform(-10.0, 10.0) for key in protocol.POSE_KEYS}
+    if command_type == "move":
+        return dict(pose, command="move", name=args.object)
+    if args.views:
+        # Draw from a fixed set of views so repeated renders can hit the render cache
+        pose = {key: float(rng.randrange(args.views)) for key in protocol.POSE_KEYS}
+    return dict(args.render_fields, **pose, command="render", camera=args.camera,
+                resolution=list(args.resolution), encoding=args.encoding)
+
+
+async def run_client(index, args, port, measure_start, deadline, samples):
+    """Sends commands back to back until the deadline; samples after measure_start are recorded."""
+    rng = random.Random(args.seed + index)
+    kinds, weights = zip(*args.mix.items())
+    client = CLIENTS[args.protocol]()
+    await client.connect(port)
+    try:
+        while time.perf_counter() < deadline:
+            command_type = rng.choices(kinds, weights)[0]
+            command = make_command(rng, command_type, args)
+            started = time.perf_counter()
+            received, error = await asyncio.wait_for(client.request(command), REPLY_TIMEOUT)
+            if started >= measure_start:
+                samples.append((command_type, time.perf_counter() - started, received, error))
+    finally:
+        client.close()
+
+
+async def fetch_server_stats(port, host='127.0.0.1'):
+    client = V2Client()
+    await client.connect(port, host)
+    try:
+        client.writer.write(protocol.encode_v2_request(1, {"command": "stats"}))
+        header = await client.reader.readexactly(protocol.V2_HEADER.size)
+        length, opcode, _, _ = protocol.V2_HEADER.unpack(header)
+        payload = await client.reader.readexactly(length)
+        return json.loads(payload) if opcode == protocol.OP_RESULT else None
+    finally:
+        client.close()
+
+
+# === Reporting ===
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+def summarize(samples, duration):
+    latencies = sorted(sample[1] for sample in samples)
+    return {
+        "count": len(samples),
+        "errors": sum(1 for sample in samples if sample[3] is not None),
+        "throughput": len(samples) / duration,
+        "bytes_per_second": sum(sample[2] for sample in samples) / duration,
+        "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": latencies[-1] if latencies else 0.0,
+    }
+
+
+async def run_benchmark(args, port, process):
+    await wait_for_server(port, process)
+    samples = []
+    measure_start = time.perf_counter() + args.warmup
+    deadline = measure_start + args.duration
+    await asyncio.gather(*(run_client(index, args, port, measure_start, deadline, samples)
+                           for index in range(args.clients)))
+    # Clients finish their last request after the deadline; measure up to the last completed one
+    duration = max(time.perf_counter() - measure_start, 1e-9)
+    commands = {kind: summarize([s for s in samples if s[0] == kind], duration) for kind in args.mix}
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "duration": duration,
+        "total": summarize(samples, duration),
+        "commands": commands,
+        "server": await fetch_server_stats(port),
+    }
+
+
+# === Command Line ===
+
+def parse_mix(text):
+    """'move=4,render=1' -> {'move': 4.0, 'render': 1.0}"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ("move", "render"):
+            raise argparse.ArgumentTypeError(f"unknown command '{name}' in mix")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark blenderServer.py against a stand-in bpy.")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("move=1,render=1"),
+                        help="command weights, e.g. move=4,render=1")
+    parser.add_argument("--protocol", choices=sorted(CLIENTS), default="v2")
+    parser.add_argument("--render-ms", type=float, default=20.0, help="synthetic cost of every render")
+    parser.add_argument("--render-ms-per-mpixel", type=float, default=0.0,
+                        help="additional render cost per megapixel")
+    parser.add_argument("--resolution", type=argTypes.parse_resolution, default=(640, 480), help="WIDTHxHEIGHT")
+    parser.add_argument("--encoding", default="raw", help="raw, png, jpeg or webp")
+    parser.add_argument("--render-fields", type=json.loads, default={},
+                        help='extra render request fields as JSON, e.g. \'{"crop": [0, 0, 0.5, 0.5]}\'')
+    parser.add_argument("--views", type=int, default=0,
+                        help="distinct values per pose field for renders, 0 for a new view every time")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="disable the render cache")
+    parser.add_argument("--coalesce", action="store_true", help="coalesce queued moves on the server")
+    parser.add_argument("--object", default="Ball")
+    parser.add_argument("--camera", default="Camera")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-log", action="store_true", help="show the server's output")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    port = free_port()
+    options = {key: getattr(args, key) for key in
+               ("render_ms", "render_ms_per_mpixel", "object", "camera", "cache", "coalesce", "server_log")}
+    # spawn, so the child imports the fake bpy into a clean interpreter
+    process = multiprocessing.get_context("spawn").Process(target=run_server, args=(port, options), daemon=True)
+    process.start()
+    try:
+        result = asyncio.run(run_benchmark(args, port, process))
+    finally:
+        process.terminate()
+        process.join()
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
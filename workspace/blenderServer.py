@@ -1,19 +1,111 @@
 import bpy
 import numpy as np
-import socket
-import struct
+import argparse
+import os
+import sys
 import math
-import threading
 import queue
-import json
+import threading
+import time
+import weakref
+from collections import deque
+from functools import partial
 from mathutils import Euler
 
+# Blender does not put the script's folder on sys.path, add it for the helper modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import argTypes
+import cameraStreams
+import commandScheduler
+import commandLog
+import frameEncoding
+import networkServer
+import poseBridge
+import poseFilter
+import protocol
+import renderCache
+import renderOverrides
+import sceneHandles
+import serverMetrics
+
+_script_started = time.perf_counter()
+
 # === Global Variables for the Server ===
-server_socket = None
-client_threads = []
-command_queue = queue.Queue()  # Thread-safe queue for requests
+network_server = None  # networkServer.NetworkServer while the server runs
+command_queue = queue.Queue()  # Thread-safe queue of (conn, data, enqueue time)
 server_running = False
-server_thread = None
+
+# Timer scheduling for process_commands: run again right away while work is
+# queued, poll quickly right after activity and back off towards the idle
+# interval when nothing arrives. Each tick stops starting new commands once
+# its time budget is spent so the Blender UI stays responsive.
+TICK_BUDGET = 0.05
+MIN_INTERVAL = 0.001
+IDLE_INTERVAL = 0.02  # an idle tick is one queue check, polling at 50 Hz costs nothing
+_next_interval = MIN_INTERVAL
+# Commands taken off command_queue wait in per-client queues; moves go first,
+# clients take turns and expired or orphaned commands are dropped (see
+# commandScheduler.py). Latest-wins move coalescing is off unless
+# start_network_server enables it: of several queued moves of one object from
+# one client only the newest is applied before that client's next command that
+# is not a move. Superseded moves are acknowledged with ACK_SUPERSEDED, or not
+# at all if the move sets "superseded_ack": false.
+scheduler = commandScheduler.CommandScheduler()
+
+# Push-based camera streams (subscribe command); rendered from process_commands
+streams = cameraStreams.StreamRegistry()
+
+# Tracker poses straight from MQTT (start_pose_bridge); applied once per process_commands tick
+pose_bridge = None  # poseBridge.PoseBridge while subscribed
+_bridge_missing = set()  # mapped objects not in the scene, reported once each
+# With filtering on, MQTT poses feed a Kalman filter instead of moving objects
+# directly, and every render first moves the objects to their filtered poses
+# predicted to the render time (sync_filtered_poses)
+pose_filter = None  # poseFilter.PoseFilter while filtering
+_filtered_poses = None  # the poses last applied, one row per pose_filter.names entry
+FILTER_TOLERANCE = 1e-4  # smaller changes are not applied, so a still scene stays cached
+
+# Integer handles for object names, also caching the name lookups of moves and renders
+handles = sceneHandles.HandleRegistry(lambda: bpy.data.objects)
+
+# Every received command is appended to this commandLog.CommandRecorder while recording (--record)
+recorder = None
+
+# Warm start: throwaway renders of the configured views (start_warmup), one per
+# process_commands tick, so the first client renders do not pay for shader
+# compilation and BVH builds. The server reports ready (/ready, ready command)
+# once they are done. startup_phases holds the seconds each startup phase took.
+warmup_views = deque()  # (camera name, resolution or None) still to render
+_warmup_total = 0
+_warmup_started = None
+_warmup_restore = None  # (camera, resolution) to put back once warm-up is done
+startup_phases = {}
+
+# Per-command stage timings, counts and bytes sent; see the stats command and /metrics
+metrics = serverMetrics.ServerMetrics()
+DEFAULT_STATUS_PORT = 9464
+# The /metrics and /ready handlers run on the network thread, and the state
+# they report belongs to the main thread; it publishes them these instead
+# (publish_status(), every tick for readiness, every STATUS_INTERVAL for metrics)
+STATUS_INTERVAL = 1.0
+status_ready = False
+status_metrics = ""
+_status_published = None
+
+# Render results keyed on view and scene version; 0 bytes disables the cache
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+render_cache = renderCache.RenderCache(RENDER_CACHE_MAX_BYTES)
+scene_version = 0  # Bumped on every move or other scene edit
+# ID types whose changes alter what a render looks like (cameras are handled separately)
+SCENE_CONTENT_TYPES = (bpy.types.Mesh, bpy.types.Material, bpy.types.Light, bpy.types.World)
+
+# Reusable readback buffers keyed on (width, height); see read_viewer_pixels()
+MAX_READBACK_RESOLUTIONS = 4
+MAX_READBACK_SPARES = 4  # free RGB buffers kept per resolution
+_readback_buffers = {}  # (width, height) -> (float RGBA buffer, [free RGB buffers])
+_readback_lent = weakref.WeakValueDictionary()  # id -> RGB buffer handed out and not yet released
+_readback_lock = threading.Lock()  # buffers are released on the network thread
 
 # === Blender Node Setup for Render Preview ===
 # Enable node-based compositing and clear default nodes
@@ -29,193 +121,965 @@ viewer_node = tree.nodes.new('CompositorNodeViewer')
 viewer_node.location = (750, 210)
 viewer_node.use_alpha = False
 tree.links.new(rl.outputs[0], viewer_node.inputs[0])
+startup_phases["scene_setup"] = time.perf_counter() - _script_started
+print(f"Startup phase 'scene_setup' took {startup_phases['scene_setup']:.3f}s")
 
 # === Utility Functions ===
 
+def xform_object(obj, x, y, z, pitch, roll, yaw):
+    """Move and rotate an object; angles in degrees."""
+    obj.location = (x, y, z)
+    # Convert degrees to radians for Euler angles
+    obj.rotation_euler = Euler((math.radians(pitch),
+                                math.radians(roll),
+                                math.radians(yaw)), 'XYZ')
+
 def xform_object_by_name(object_name, x, y, z, pitch, roll, yaw):
     """Move and rotate the specified object if found."""
-    if object_name in bpy.data.objects:
-        obj = bpy.data.objects[object_name]
-        obj.location = (x, y, z)
-        # Convert degrees to radians for Euler angles
-        obj.rotation_euler = Euler((math.radians(pitch),
-                                    math.radians(roll),
-                                    math.radians(yaw)), 'XYZ')
+    obj = handles.lookup(object_name)
+    if obj is not None:
+        xform_object(obj, x, y, z, pitch, roll, yaw)
     else:
         print(f"Object '{object_name}' not found.")
 
 def xform_camera_by_name(camera_name, x, y, z, pitch, roll, yaw):
     """Move and rotate the specified camera if found."""
-    if camera_name in bpy.data.objects:
-        cam = bpy.data.objects[camera_name]
-        cam.location = (x, y, z)
-        cam.rotation_euler = Euler((math.radians(pitch),
-                                    math.radians(roll),
-                                    math.radians(yaw)), 'XYZ')
+    cam = handles.lookup(camera_name)
+    if cam is not None:
+        xform_object(cam, x, y, z, pitch, roll, yaw)
     else:
         print(f"Camera '{camera_name}' not found.")
 
 def set_camera_focal_length(camera_name, focal_length):
     """Set focal length for the specified camera."""
-    if camera_name in bpy.data.objects and bpy.data.objects[camera_name].type == 'CAMERA':
-        bpy.data.objects[camera_name].data.lens = focal_length
+    cam = handles.lookup(camera_name)
+    if cam is not None and cam.type == 'CAMERA':
+        cam.data.lens = focal_length
     else:
         print(f"Camera '{camera_name}' not found or not a valid camera.")
 
-# === Server Connection Handling ===
+def prepare_view(camera_name, pose, resolution=None, focal_length=None):
+    """
+    Positions and activates the camera and applies resolution and focal length.
+    pose is (x, y, z, pitch, roll, yaw), or None to keep the camera where it
+    is. The resolution is only written when it differs from the current one,
+    so repeated renders at one size do not touch the scene settings.
+    """
+    scene = bpy.context.scene
+    # If resolution is provided update scene render resolution
+    if resolution and isinstance(resolution, (list, tuple)) and len(resolution) == 2:
+        width, height = int(resolution[0]), int(resolution[1])
+        if (scene.render.resolution_x, scene.render.resolution_y) != (width, height):
+            scene.render.resolution_x = width
+            scene.render.resolution_y = height
+    # Without a camera name (legacy protocol) the active camera renders as it is
+    if camera_name is None:
+        return
+    # Update camera transform
+    if pose is not None:
+        xform_camera_by_name(camera_name, *pose)
+    # Optionally set focal length if provided
+    if focal_length:
+        set_camera_focal_length(camera_name, focal_length)
+    # Render through the requested camera, not whichever one happens to be active
+    cam = handles.lookup(camera_name) if camera_name else None
+    if cam is not None and cam.type == 'CAMERA' and scene.camera != cam:
+        scene.camera = cam
+
+# === Metrics ===
+
+def record_stage(command, stage, started):
+    """Records the time since started for one stage of a command and returns the current time."""
+    now = time.perf_counter()
+    metrics.observe(command, stage, now - started)
+    return now
+
+def collect_stats():
+    """Everything the stats command reports, as a JSON-serializable dict."""
+    return {
+        "commands": metrics.snapshot(),
+        "render_cache": render_cache.stats(),
+        "moves_superseded": scheduler.superseded,
+        "queue_depth": command_queue.qsize() + len(scheduler),
+        "scheduler": scheduler.stats(),
+        "clients": len(network_server.clients) if network_server else 0,
+        "send_queue": network_server.send_stats() if network_server else None,
+        "scene_version": scene_version,
+        "streams": streams.stats(),
+        "pose_bridge": pose_bridge.stats() if pose_bridge else None,
+        "pose_filter": pose_filter.stats() if pose_filter else None,
+        "recorder": recorder.stats() if recorder else None,
+        "handles": handles.stats(),
+        "ready": is_ready(),
+        "startup": startup_phases,
+    }
 
-def client_handler(conn, addr):
+def prometheus_metrics():
+    """The metrics in Prometheus text format, for the stats command and the /metrics endpoint."""
+    gauges = {f"render_cache_{name}": value for name, value in render_cache.stats().items()}
+    gauges.update(moves_superseded_total=scheduler.superseded,
+                  queue_depth=command_queue.qsize() + len(scheduler),
+                  commands_expired_total=scheduler.expired,
+                  commands_dropped_closed_total=scheduler.dropped_closed,
+                  clients=len(network_server.clients) if network_server else 0)
+    if network_server:
+        gauges.update((f"send_queue_{name}", value) for name, value in network_server.send_stats().items()
+                      if name != "policy")
+    gauges.update((f"stream_{name}", value) for name, value in streams.stats().items())
+    if pose_bridge:
+        gauges.update((f"pose_bridge_{name}", value) for name, value in pose_bridge.stats().items())
+    if pose_filter:
+        gauges.update((f"pose_filter_{name}", value) for name, value in pose_filter.stats().items())
+    gauges["ready"] = int(is_ready())
+    gauges.update((f"startup_{name}_seconds", value) for name, value in startup_phases.items())
+    return metrics.prometheus(gauges)
+
+def publish_status(force=False):
+    """Main thread: refreshes the readiness and metrics served over HTTP by the network thread."""
+    global status_ready, status_metrics, _status_published
+    status_ready = is_ready()
+    now = time.perf_counter()
+    if force or _status_published is None or now - _status_published >= STATUS_INTERVAL:
+        status_metrics = prometheus_metrics()
+        _status_published = now
+
+# === Scene Version and Render Cache ===
+
+def bump_scene_version():
+    """Marks the scene as changed so cached renders of the old state are no longer used."""
+    global scene_version
+    scene_version += 1
+
+def on_depsgraph_update(scene, depsgraph):
     """
-    Reads JSON messages (each terminated by a newline) from this client.
-    Each message should be a JSON object with at least a key 'command' that is either
-    "move" or "render". The remaining keys depend on the command.
+    Bumps the scene version when anything other than a camera changes, e.g.
+    edits made in the Blender UI. Camera moves are part of the cache key
+    already and the render result images change on every render, so those
+    updates are ignored.
     """
-    print(f"Client connected from {addr}")
+    for update in depsgraph.updates:
+        id_data = update.id
+        if isinstance(id_data, bpy.types.Object):
+            if id_data.type == 'CAMERA':
+                continue
+        elif not isinstance(id_data, SCENE_CONTENT_TYPES):
+            continue
+        bump_scene_version()
+        return
+
+@bpy.app.handlers.persistent
+def on_load_post(*args):
+    """Another .blend file was loaded: every object is new."""
+    handles.invalidate()
+    bump_scene_version()
+
+def render_cache_key(camera_name, pose, encoding, overrides):
+    """
+    Builds the cache key for a view that has already been prepared with
+    prepare_view(), so resolution and focal length are the effective values.
+    overrides are the request's parsed render overrides.
+    """
+    render = bpy.context.scene.render
+    resolution = (render.resolution_x, render.resolution_y, render.resolution_percentage)
+    cam = handles.lookup(camera_name) if camera_name else None
+    focal_length = cam.data.lens if cam is not None and cam.type == 'CAMERA' else None
+    if pose is None and cam is not None:
+        # The camera was left where it is, so key on where that is
+        pose = tuple(cam.location) + tuple(math.degrees(angle) for angle in cam.rotation_euler)
+    return render_cache.make_key(camera_name, pose, resolution, focal_length, encoding, scene_version,
+                                 renderOverrides.overrides_key(overrides))
+
+def request_encoding(request):
+    """Returns the (encoding, quality, scale) a request asked for, raw if it is invalid."""
     try:
-        # Wrap the socket in a file-like object to conveniently read lines.
-        file_obj = conn.makefile(mode='r')
-        while server_running:
-            line = file_obj.readline()  # reads until newline
-            if not line:
-                break  # Connection closed
-            try:
-                data = json.loads(line)
-                # Place a tuple (connection, data) on the command queue.
-                command_queue.put((conn, data))
-            except json.JSONDecodeError as e:
-                print("JSON decode error:", e)
-    except Exception as e:
-        print("Exception in client handler:", e)
-    finally:
-        print(f"Client from {addr} disconnected.")
-        try:
-            conn.close()
-        except Exception:
-            pass
-
-def server_listener(host='0.0.0.0', port=55001):
-    """Listener thread that accepts client connections and spawns handler threads."""
-    global server_socket, server_running, client_threads
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((host, port))
-    server_socket.listen()
-    server_socket.settimeout(1.0)
-    print(f"Server listening on {host}:{port}")
-    while server_running:
-        try:
-            conn, addr = server_socket.accept()
-            t = threading.Thread(target=client_handler, args=(conn, addr), daemon=True)
-            t.start()
-            client_threads.append(t)
-        except socket.timeout:
+        return frameEncoding.parse_encoding(request)
+    except (TypeError, ValueError) as e:
+        print(f"Invalid encoding options, sending raw frame: {e}")
+        return 'raw', frameEncoding.DEFAULT_QUALITY, 1.0
+
+def render_request(request, command="render", sync_poses=True, optional_pose=False):
+    """
+    Produces the encoded frame for a render request, from render_cache when
+    the same view was rendered at the current scene version, otherwise by
+    rendering it. Preview and crop fields (see renderOverrides) only apply
+    to this render. Stage timings are recorded under the given command name.
+    Filtered MQTT poses are synced first unless sync_poses is False. With
+    optional_pose, a request without pose fields renders the camera where it
+    is instead of moving it to the origin.
+    Returns (frame, cache_hit); frame is None if nothing could be read back.
+    A raw frame's payload may be a pooled readback buffer, which the caller
+    hands back with release_readback() once it has been sent.
+    Raises ValueError for invalid render overrides.
+    """
+    camera = request.get("camera")
+    pose = read_optional_pose(request) if optional_pose else read_pose(request)
+    encoding = request_encoding(request)
+    overrides = renderOverrides.parse_overrides(request)
+    if sync_poses:
+        sync_filtered_poses()
+    started = time.perf_counter()
+    # Applying the view is cheap, and doing it on cache hits too keeps the
+    # scene state identical to what an uncached render would leave behind
+    prepare_view(camera, pose, request.get("resolution"), request.get("focal_length"))
+    with renderOverrides.apply_overrides(bpy.context.scene, overrides):
+        started = record_stage(command, "xform", started)
+        key = None
+        if render_cache.enabled and request.get("cache", True):
+            key = render_cache_key(camera, pose, encoding, overrides)
+            frame = render_cache.get(key)
+            if frame is not None:
+                return frame, True
+        # Render the scene
+        bpy.ops.render.render()
+        started = record_stage(command, "render", started)
+        # Obtain pixel data from the Viewer Node (assumes node setup as above)
+        rgb, width, height = read_viewer_pixels()
+        started = record_stage(command, "readback", started)
+    if rgb is None:
+        return None, False
+    frame = frameEncoding.encode_frame(rgb, width, height, *encoding)
+    record_stage(command, "encode", started)
+    if key is not None and frame.payload is rgb:
+        # The readback buffer goes back to the pool, cache a copy
+        frame = frame._replace(payload=rgb.copy())
+    if frame.payload is not rgb:
+        release_readback(rgb)
+    if key is not None:
+        render_cache.put(key, frame, frameEncoding.payload_size(frame.payload))
+    return frame, False
+
+# === Camera Streams ===
+
+def stream_view_state(subscription):
+    """
+    Everything that decides what a stream's next frame looks like and is not
+    in its group key: scene version, camera transform and lens, and the scene
+    resolution if the stream does not set one. None if the camera is missing.
+    """
+    cam = handles.lookup(subscription.camera)
+    if cam is None:
+        return None
+    render = bpy.context.scene.render
+    resolution = subscription.request.get("resolution") or (render.resolution_x, render.resolution_y)
+    return (scene_version, tuple(cam.location), tuple(cam.rotation_euler),
+            cam.data.lens if cam.type == 'CAMERA' else None, tuple(resolution))
+
+def render_streams():
+    """
+    Renders every due stream group once and pushes the frame to its due
+    members whose view changed since their last frame. Called on every tick.
+    """
+    streams.drop_closed()
+    now = time.perf_counter()
+    groups = streams.due_groups(now)
+    if groups:
+        sync_filtered_poses()
+    for group in groups.values():
+        state = stream_view_state(group[0])
+        for subscription in group:
+            cameraStreams.advance(subscription, now)
+        # A delta stream waits until its previous frame is out: dropping a
+        # delta would leave the client patching the wrong frame
+        waiting = [s for s in group if s.last_state != state and
+                   not (s.delta is not None and s.conn.push_pending(s.stream_key))]
+        if state is None or not waiting:
             continue
-        except Exception as e:
-            print("Exception in server_listener:", e)
-            break
+        first = waiting[0]
+        started = time.perf_counter()
+        prepare_view(first.camera, None, first.request.get("resolution"), first.request.get("focal_length"))
+        with renderOverrides.apply_overrides(bpy.context.scene, first.overrides):
+            started = record_stage("subscribe", "xform", started)
+            bpy.ops.render.render()
+            started = record_stage("subscribe", "render", started)
+            rgb, width, height = read_viewer_pixels()
+            started = record_stage("subscribe", "readback", started)
+        if rgb is None:
+            continue
+        streams.frames_rendered += 1
+        frames = {}  # encoding -> EncodedFrame, one per encoding asked for in the group
+        for subscription in waiting:
+            frame = None
+            if subscription.delta is not None:
+                _, _, scale = subscription.encoding
+                delta_rgb, delta_width, delta_height = (
+                    frameEncoding.downscale(rgb, width, height, scale) if scale < 1.0 else (rgb, width, height))
+                # None when a keyframe is due, which is the normally encoded frame below
+                frame = subscription.delta.next_frame(delta_rgb, delta_width, delta_height)
+            if frame is None:
+                frame = frames.get(subscription.encoding)
+            if frame is None:
+                frame = frameEncoding.encode_frame(rgb, width, height, *subscription.encoding)
+                if frame.payload is rgb:
+                    # Pushed frames are sent later, after the readback buffer is released
+                    frame = frame._replace(payload=rgb.copy())
+                frames[subscription.encoding] = frame
+            parts = subscription.conn.codec.encode_frame(subscription.request, frame)
+            subscription.conn.push_latest(subscription.stream_key, parts)
+            metrics.add_bytes("subscribe", sum(memoryview(part).nbytes for part in parts))
+            subscription.last_state = state
+            subscription.frames_sent += 1
+            streams.frames_pushed += 1
+        release_readback(rgb)
+        record_stage("subscribe", "encode", started)
+
+# === Pixel Readback ===
+
+def _get_readback_buffers(width, height, channels):
+    """
+    Returns a float RGBA buffer and a free uint8 RGB buffer for this
+    resolution, allocating them as needed. The RGB buffer is lent out until
+    release_readback(). Only the most recently used resolutions are kept so
+    a client cycling through sizes does not grow memory forever.
+    """
+    key = (width, height)
+    with _readback_lock:
+        buffers = _readback_buffers.pop(key, None)
+        if buffers is None or buffers[0].shape[1] != channels:
+            buffers = (np.empty((width * height, channels), dtype=np.float32), [])
+        # Re-insert so dict order tracks recency, then evict the oldest entries
+        _readback_buffers[key] = buffers
+        while len(_readback_buffers) > MAX_READBACK_RESOLUTIONS:
+            del _readback_buffers[next(iter(_readback_buffers))]
+        rgba, spares = buffers
+        rgb = spares.pop() if spares else np.empty((width * height, 3), dtype=np.uint8)
+        _readback_lent[id(rgb)] = rgb
+    return rgba, rgb
+
+def release_readback(array):
+    """
+    Returns an RGB buffer from read_viewer_pixels() for reuse; anything else
+    (encoded payloads, copies) is ignored, so every frame payload can be
+    passed. Safe to call from any thread.
+    """
+    with _readback_lock:
+        if _readback_lent.get(id(array)) is not array:
+            return
+        del _readback_lent[id(array)]
+        # RGB buffers only depend on the pixel count
+        for (width, height), (_, spares) in _readback_buffers.items():
+            if width * height == len(array):
+                if len(spares) < MAX_READBACK_SPARES:
+                    spares.append(array)
+                return
+
+def read_viewer_pixels():
+    """
+    Copies the Viewer Node image into an RGB uint8 buffer from the readback
+    pool. The float pixels are fetched with foreach_get straight into a
+    reusable float32 array and converted in place, so no Python list or
+    float64 intermediate is built. The returned array is lent out: pass it
+    to release_readback() (or as a frame payload to send_frame's on_sent)
+    when it is no longer needed, so frame N can still be on its way to a
+    client while frame N+1 is read back into another buffer.
+    Returns (rgb, width, height) or (None, 0, 0) if there is no image.
+    """
+    image = bpy.data.images.get('Viewer Node')
+    if image is None:
+        return None, 0, 0
+    width, height = image.size
+    channels = image.channels
+    rgba, rgb = _get_readback_buffers(width, height, channels)
+    image.pixels.foreach_get(rgba.ravel())
+    # Convert the raw [0,1] float values to 8-bit values (without gamma correction)
+    np.clip(rgba, 0.0, 1.0, out=rgba)
+    np.multiply(rgba, 255.0, out=rgba)
+    # Drop the alpha channel while casting into the RGB output buffer
+    np.copyto(rgb, rgba[:, :3], casting='unsafe')
+    return rgb, width, height
+
+# === Frame Replies ===
+
+EMPTY_FRAME = frameEncoding.EncodedFrame(frameEncoding.FORMAT_TAGS['raw'], 0, 0, b'')
+# Renders of a render_multi call before giving up on a scene that keeps changing
+RENDER_MULTI_ATTEMPTS = 3
+
+# === Warm Start ===
+
+def record_startup_phase(name, started):
+    """Keeps and logs how long a startup phase took; returns the current time."""
+    now = time.perf_counter()
+    startup_phases[name] = now - started
+    print(f"Startup phase '{name}' took {startup_phases[name]:.3f}s")
+    return now
 
-def start_network_server(host='0.0.0.0', port=55001):
-    """Starts the network listener in a separate thread and registers the timer in Blender."""
-    global server_running, server_thread
+def is_ready():
+    """True once the server is listening and warm-up is done."""
+    return network_server is not None and not warmup_views
+
+def start_warmup(cameras=None, resolutions=None, persistent_data=True):
+    """
+    Queues one throwaway render per camera (every camera in the scene by
+    default) and resolution (the scene's by default); process_commands
+    renders one per tick and the server reports ready after the last.
+    With persistent_data, Cycles keeps the synced scene (BVH, shaders,
+    textures) between renders instead of rebuilding it for every frame.
+    """
+    global _warmup_total, _warmup_started, _warmup_restore
+    scene = bpy.context.scene
+    if persistent_data:
+        scene.render.use_persistent_data = True
+    if cameras is None:
+        cameras = [obj.name for obj in bpy.data.objects.values() if obj.type == 'CAMERA']
+    warmup_views.extend((camera, resolution) for camera in cameras for resolution in resolutions or [None])
+    _warmup_total = len(warmup_views)
+    _warmup_started = time.perf_counter()
+    _warmup_restore = (scene.camera, (scene.render.resolution_x, scene.render.resolution_y))
+    print(f"Warming up {_warmup_total} views" + (" with persistent render data" if persistent_data else ""))
+
+def warmup_step():
+    """Renders the next warm-up view and finishes warm-up after the last one."""
+    camera, resolution = warmup_views.popleft()
+    started = time.perf_counter()
+    if handles.lookup(camera) is None:
+        print(f"Warm-up camera '{camera}' is not in the scene, skipped.")
+    else:
+        prepare_view(camera, None, resolution)
+        bpy.ops.render.render()
+        rgb, width, height = read_viewer_pixels()
+        release_readback(rgb)
+        record_stage("warmup", "render", started)
+        print(f"Warm-up render of '{camera}' at {width}x{height} took {time.perf_counter() - started:.3f}s")
+    if not warmup_views:
+        finish_warmup()
+
+def finish_warmup():
+    camera, resolution = _warmup_restore
+    scene = bpy.context.scene
+    if camera is not None:
+        scene.camera = camera
+    prepare_view(None, None, resolution)
+    record_startup_phase("warmup", _warmup_started)
+    record_startup_phase("until_ready", _script_started)
+
+# === Server Connection Handling ===
+
+def enqueue_command(conn, data):
+    """Called on the network thread for every decoded command; hands it to the main thread."""
+    if recorder is not None:
+        recorder.record(conn, data)
+    # Place a tuple (connection, data, enqueue time) on the command queue.
+    command_queue.put((conn, data, time.perf_counter()))
+
+def start_network_server(host='0.0.0.0', port=55001,
+                         max_connections=networkServer.DEFAULT_MAX_CONNECTIONS,
+                         max_inflight=networkServer.DEFAULT_MAX_INFLIGHT,
+                         coalesce=False, status_port=0,
+                         max_queued=networkServer.DEFAULT_MAX_QUEUED,
+                         send_policy=networkServer.DEFAULT_SEND_POLICY):
+    """
+    Starts the asyncio network front-end in a background thread and registers the timer in Blender.
+    At most max_connections clients are served and each may have max_inflight
+    commands queued before the server stops reading from its socket.
+    Replies are sent from the network thread; each client has up to
+    max_queued of them waiting, send_policy says what happens beyond that
+    (see networkServer.SEND_POLICIES).
+    With coalesce, queued moves of one object from one client are collapsed to the newest.
+    With a status_port, Prometheus metrics are served over HTTP at /metrics
+    and readiness at /ready (503 until warm-up is done, see start_warmup()).
+    """
+    global server_running, network_server
     if server_running:
         print("Server already running.")
         return
     server_running = True
-    server_thread = threading.Thread(target=server_listener, args=(host, port), daemon=True)
-    server_thread.start()
-    bpy.app.timers.register(process_commands, first_interval=0.1)
+    started = time.perf_counter()
+    scheduler.coalesce = coalesce
+    # Served from what the main thread published, see publish_status()
+    status_routes = {
+        "/metrics": lambda: (200, "text/plain; version=0.0.4", status_metrics),
+        "/ready": lambda: (200, "text/plain", "ready\n") if status_ready else (503, "text/plain", "warming up\n"),
+    }
+    network_server = networkServer.NetworkServer(enqueue_command, host, port,
+                                                 max_connections, max_inflight,
+                                                 status_port=status_port, status_routes=status_routes,
+                                                 max_queued=max_queued, send_policy=send_policy)
+    publish_status(force=True)
+    network_server.start()
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+    # Without a UI (blender -b) timers never fire; run_background_loop() drives the server instead
+    if not bpy.app.background:
+        bpy.app.timers.register(process_commands, first_interval=MIN_INTERVAL)
     print("Network server started.")
+    record_startup_phase("network", started)
+    if not warmup_views and "until_ready" not in startup_phases:
+        record_startup_phase("until_ready", _script_started)
 
 def stop_network_server():
-    """Stops the server, the listener, and active client threads."""
-    global server_running, server_socket
+    """Stops the server, closing the listener and all client connections."""
+    global server_running, network_server
     server_running = False
-    if server_socket:
-        try:
-            server_socket.close()
-        except Exception:
-            pass
-    print("Waiting for client threads to finish...")
-    for t in client_threads:
-        t.join(timeout=1.0)
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    if network_server:
+        network_server.stop()
+        network_server = None
+    stop_pose_bridge()
+    stop_recording()
     print("Server stopped.")
 
+def start_recording(path):
+    """Records every command received from now on to path (see commandLog.py and replay.py)."""
+    global recorder
+    stop_recording()
+    recorder = commandLog.CommandRecorder(path)
+    print(f"Recording commands to {path}.rec")
+
+def stop_recording():
+    global recorder
+    if recorder:
+        recorder.close()
+        print(f"Recorded {recorder.records} commands to {recorder.path}.rec")
+        recorder = None
+
+def start_pose_bridge(host, port=poseBridge.DEFAULT_PORT, topics=poseBridge.DEFAULT_TOPICS, mapping=None,
+                      filtered=False):
+    """
+    Subscribes to tracker poses on the MQTT broker at host and applies the
+    latest pose of each mapped object every tick, like a move command.
+    mapping is {tracker name: object name}; without it every tracker moves
+    the object of the same name. With filtered, poses are smoothed and
+    predicted to each render's time by a poseFilter.PoseFilter.
+    """
+    global pose_bridge, pose_filter, _filtered_poses
+    stop_pose_bridge()
+    bridge = poseBridge.PoseBridge(mapping, topics)
+    if bridge.start(host, port):
+        pose_bridge = bridge
+        pose_filter = poseFilter.PoseFilter() if filtered else None
+        _filtered_poses = None
+
+def stop_pose_bridge():
+    global pose_bridge, pose_filter
+    if pose_bridge:
+        pose_bridge.stop()
+        pose_bridge = None
+    pose_filter = None
+
+# === Command Handlers ===
+
+POSE_KEYS = ("x", "y", "z", "pitch", "roll", "yaw")
+
+def read_pose(data):
+    """Returns the (x, y, z, pitch, roll, yaw) fields of a request, defaulting to 0."""
+    return tuple(data.get(key, 0) for key in POSE_KEYS)
+
+def read_optional_pose(data):
+    """read_pose() if the request sets any pose field, else None."""
+    return read_pose(data) if any(key in data for key in POSE_KEYS) else None
+
+def handle_move(conn, data):
+    """
+    Expected keys: "name" or "handle" (see the handles command), "x", "y",
+    "z", "pitch", "roll", "yaw", and optionally "superseded_ack" (default
+    true) to choose whether a move dropped by coalescing is acknowledged
+    with ACK_SUPERSEDED.
+    """
+    if data.get("_superseded"):
+        # A newer move of this object is queued; skip Blender and the log line
+        if data.get("superseded_ack", True):
+            metrics.add_bytes("move", conn.send_ack(data, "ACK_SUPERSEDED", protocol.FLAG_SUPERSEDED))
+        return
+    name = data.get("name")
+    x, y, z, pitch, roll, yaw = read_pose(data)
+    print(f"Moving object '{name or data.get('handle')}' to ({x}, {y}, {z}) with rotation ({pitch}, {roll}, {yaw})")
+    started = time.perf_counter()
+    if name is None and "handle" in data:
+        obj = handles.resolve(data["handle"])
+        if obj is None:
+            conn.send_error(data, f"Unknown handle {data['handle']!r}")
+            return
+        xform_object(obj, x, y, z, pitch, roll, yaw)
+    else:
+        xform_object_by_name(name, x, y, z, pitch, roll, yaw)
+    bump_scene_version()
+    started = record_stage("move", "xform", started)
+    # Optionally send an acknowledgement (here we send a simple string)
+    try:
+        metrics.add_bytes("move", conn.send_ack(data, "ACK_MOVE"))
+        record_stage("move", "send", started)
+    except Exception as e:
+        print("Error sending ACK_MOVE:", e)
+
+def handle_render(conn, data):
+    """
+    Expected keys: "camera" (camera name),
+    "x", "y", "z", "pitch", "roll", "yaw", optionally "resolution" and "focal_length",
+    optionally "encoding" ("raw", "png", "jpeg", "webp"), "quality" and "scale",
+    and optionally "engine", "samples", "resolution_percentage" and "crop".
+    """
+    camera = data.get("camera")
+    x, y, z, pitch, roll, yaw = read_pose(data)
+    try:
+        frame, cache_hit = render_request(data)
+    except ValueError as e:
+        print("Invalid render request:", e)
+        conn.send_error(data, str(e))
+        return
+    print(f"Render request from camera '{camera}' at position ({x}, {y}, {z}) with rotation ({pitch}, {roll}, {yaw})"
+          + (" (cache hit)" if cache_hit else ""))
+    if frame is None:
+        print("Viewer Node image not found after render.")
+        conn.send_error(data, "Viewer Node image not found after render")
+        return
+    try:
+        started = time.perf_counter()
+        metrics.add_bytes("render", conn.send_frame(data, frame, on_sent=partial(release_readback, frame.payload)))
+        record_stage("render", "send", started)
+    except Exception as e:
+        print("Error sending render image:", e)
+
+def render_sequence_frame(request, command, index, sync_poses=True, optional_pose=False):
+    """Renders one frame of a multi-frame reply; a frame that cannot be rendered is EMPTY_FRAME."""
+    try:
+        frame, _ = render_request(request, command, sync_poses, optional_pose)
+    except ValueError as e:
+        print(f"Invalid {command} frame {index}:", e)
+        frame = None
+    if frame is None:
+        print(f"Viewer Node image not found for {command} frame {index}.")
+        frame = EMPTY_FRAME
+    return frame
+
+def send_sequence_frame(conn, command, request, frame, index, count):
+    """
+    Sends one frame of a multi-frame reply with its index and the frame count
+    (for JSON clients a protocol.BATCH_FRAME_HEADER in front of a normal
+    render reply). Returns False if the client cannot be sent to.
+    """
+    try:
+        started = time.perf_counter()
+        metrics.add_bytes(command, conn.send_frame(request, frame, index, count,
+                                                   partial(release_readback, frame.payload)))
+        record_stage(command, "send", started)
+        return True
+    except Exception as e:
+        print(f"Error sending {command} frame:", e)
+        return False
+
+def send_frame_sequence(conn, command, requests, sync_poses=True):
+    """Renders the requests back to back and sends each frame as soon as it is rendered."""
+    count = len(requests)
+    for index, request in enumerate(requests):
+        frame = render_sequence_frame(request, command, index, sync_poses)
+        if not send_sequence_frame(conn, command, request, frame, index, count):
+            return
+
+def handle_render_batch(conn, data):
+    """
+    Renders a list of views back to back and streams them in order.
+    Expected keys: "frames", a list of dicts with the same keys as a render request.
+    Any other key on the batch itself ("camera", "resolution", "focal_length",
+    "encoding", ...) is a default for frames that do not set it.
+    Each frame is sent with its index and the frame count (send_frame_sequence).
+    """
+    frames = data.get("frames") or []
+    defaults = {k: v for k, v in data.items() if k not in ("command", "frames")}
+    print(f"Render batch of {len(frames)} frames from camera '{data.get('camera')}'")
+    send_frame_sequence(conn, "render_batch", [dict(defaults, **frame) for frame in frames])
+
+def handle_render_multi(conn, data):
+    """
+    Renders several cameras at one scene state.
+    Expected keys: "views", a list of dicts with a "camera" and the other keys
+    of a render request (pose, "resolution", "encoding", ...); keys on the
+    command itself are defaults for views that do not set them. A view
+    without pose fields renders its camera where it is.
+    Filtered MQTT poses are synced once up front and every view is rendered
+    before any is sent. If the scene version changed meanwhile, the views are
+    rendered again (up to RENDER_MULTI_ATTEMPTS times, then an error is sent),
+    so every frame shows the same scene version.
+    The reply is framed like a render_batch reply, one frame per view in order.
+    """
+    views = data.get("views")
+    if not isinstance(views, list) or not views or not all(isinstance(view, dict) for view in views):
+        conn.send_error(data, "render_multi needs a non-empty list of views")
+        return
+    defaults = {k: v for k, v in data.items() if k not in ("command", "views")}
+    requests = [dict(defaults, **view) for view in views]
+    for attempt in range(RENDER_MULTI_ATTEMPTS):
+        sync_filtered_poses()
+        version = scene_version
+        print(f"Render multi of {len(requests)} views from cameras "
+              f"{[request.get('camera') for request in requests]} at scene version {version}")
+        frames = [render_sequence_frame(request, "render_multi", index, sync_poses=False, optional_pose=True)
+                  for index, request in enumerate(requests)]
+        if scene_version == version:
+            break
+        print(f"The scene changed during render_multi (version {version} -> {scene_version}), rendering again")
+        for frame in frames:
+            release_readback(frame.payload)
+    else:
+        conn.send_error(data, f"The scene kept changing during render_multi ({RENDER_MULTI_ATTEMPTS} attempts)")
+        return
+    for index, (request, frame) in enumerate(zip(requests, frames)):
+        if not send_sequence_frame(conn, "render_multi", request, frame, index, len(frames)):
+            for unsent in frames[index + 1:]:
+                release_readback(unsent.payload)
+            return
+
+def handle_stats(conn, data):
+    """
+    Replies with the server metrics: per-command stage percentiles, counts and
+    bytes sent, plus render cache, coalescing and queue figures. With
+    "format": "prometheus" the reply is {"format": "prometheus", "text": ...}.
+    """
+    if data.get("format") == "prometheus":
+        result = {"format": "prometheus", "text": prometheus_metrics()}
+    else:
+        result = collect_stats()
+    conn.send_result(data, result)
+
+def handle_handles(conn, data):
+    """
+    Resolves object names to integer handles for move and snapshot.
+    With "names" (a list) replies {"handles": {name: handle or null}},
+    without it the handles of every object in the scene.
+    """
+    names = data.get("names")
+    if names is None:
+        result = handles.all_handles()
+    elif isinstance(names, list):
+        result = {str(name): handles.handle(str(name)) for name in names}
+    else:
+        conn.send_error(data, "names must be a list")
+        return
+    conn.send_result(data, {"handles": result, "generation": handles.generation})
+
+def handle_snapshot(conn, data):
+    """
+    Replies with the state of every object, or of the "names" or "handles"
+    given, as one frame of format SNAP: width is the number of fields
+    (sceneHandles.SNAPSHOT_FIELDS), height the number of objects and the
+    payload little-endian float32 rows. Unknown names and handles are left out.
+    """
+    started = time.perf_counter()
+    if "handles" in data:
+        requested = data["handles"] if isinstance(data["handles"], list) else []
+        entries = [(handle, handles.resolve(handle)) for handle in requested]
+    else:
+        names = data.get("names")
+        if not isinstance(names, list):
+            names = list(bpy.data.objects.keys())
+        entries = [(handles.handle(name), handles.lookup(name)) for name in names]
+    entries = [(handle, obj) for handle, obj in entries if obj is not None]
+    snapshot = sceneHandles.snapshot_array(entries)
+    started = record_stage("snapshot", "readback", started)
+    frame = frameEncoding.EncodedFrame(sceneHandles.SNAPSHOT_FORMAT, snapshot.shape[1], snapshot.shape[0],
+                                       snapshot)
+    # JSON lines only send the frame header (which carries the shape) for requests with an encoding
+    request = data if "encoding" in data else dict(data, encoding="snap")
+    metrics.add_bytes("snapshot", conn.send_frame(request, frame))
+    record_stage("snapshot", "send", started)
+
+def handle_ready(conn, data):
+    """Replies {"ready": bool, "warmup": {"done", "total"}, "startup": {phase: seconds}}."""
+    conn.send_result(data, {
+        "ready": is_ready(),
+        "warmup": {"done": _warmup_total - len(warmup_views), "total": _warmup_total},
+        "startup": startup_phases,
+    })
+
+def handle_subscribe(conn, data):
+    """
+    Starts pushing frames of a camera to this client.
+    Expected keys: "camera", optionally "fps" (default 30) and the render
+    fields "resolution", "focal_length", "encoding", "quality", "scale",
+    "engine", "samples", "resolution_percentage" and "crop". The camera is
+    rendered where it is; move it with the move command. Replies ACK_SUBSCRIBE,
+    then frames follow as replies to this request whenever the view changed.
+    Subscribing to the same camera again replaces the earlier subscription.
+    """
+    try:
+        subscription = cameraStreams.parse_subscription(conn, data)
+    except ValueError as e:
+        print("Invalid subscribe request:", e)
+        conn.send_error(data, str(e))
+        return
+    streams.subscribe(subscription)
+    print(f"Client {conn.addr} subscribed to camera '{subscription.camera}' at {1 / subscription.interval:g} fps")
+    conn.send_ack(data, "ACK_SUBSCRIBE")
+
+def handle_unsubscribe(conn, data):
+    """Stops the client's stream of "camera", or all of its streams without a camera."""
+    removed = streams.unsubscribe(conn, data.get("camera"))
+    print(f"Client {conn.addr} unsubscribed from {removed} streams")
+    conn.send_ack(data, "ACK_UNSUBSCRIBE")
+
+COMMAND_HANDLERS = {
+    "move": handle_move,
+    "render": handle_render,
+    "render_batch": handle_render_batch,
+    "render_multi": handle_render_multi,
+    "stats": handle_stats,
+    "handles": handle_handles,
+    "snapshot": handle_snapshot,
+    "ready": handle_ready,
+    "subscribe": handle_subscribe,
+    "unsubscribe": handle_unsubscribe,
+}
+
 # === Main Timer Callback for Processing Commands ===
 
-def process_commands():
+def apply_bridge_poses():
     """
-    Called repeatedly from Blender's main thread.
-    It checks the command_queue and processes all waiting commands.
+    Applies the latest MQTT pose of every object in one pass, or feeds them
+    all to pose_filter in one update. Returns the number of poses taken.
+    """
+    slots = pose_bridge.take()
+    if not slots:
+        return 0
+    started = time.perf_counter()
+    if pose_filter is not None:
+        # Receive times rather than the trackers' own timestamps, so
+        # predictions to the render time use one clock
+        names = list(slots)
+        pose_filter.update(names, [slots[name][0] for name in names], [slots[name][2] for name in names])
+        metrics.count_command("mqtt_pose")
+        record_stage("mqtt_pose", "filter", started)
+        return len(names)
+    applied = 0
+    for name, (pose, _, _) in slots.items():
+        if handles.lookup(name) is None:
+            if name not in _bridge_missing:
+                _bridge_missing.add(name)
+                print(f"MQTT poses for object '{name}' ignored, it is not in the scene.")
+            continue
+        xform_object_by_name(name, *pose)
+        applied += 1
+    if applied:
+        pose_bridge.applied += applied
+        bump_scene_version()
+    metrics.count_command("mqtt_pose")
+    record_stage("mqtt_pose", "xform", started)
+    return applied
+
+def sync_filtered_poses():
+    """Moves every filtered object to its pose predicted for now; called right before rendering."""
+    global _filtered_poses
+    if pose_filter is None or not len(pose_filter):
+        return
+    started = time.perf_counter()
+    poses = pose_filter.predict(time.time())
+    previous = _filtered_poses
+    if previous is None or len(previous) != len(poses):
+        changed = range(len(poses))
+    else:
+        changed = np.flatnonzero(np.abs(poses - previous).max(axis=1) > FILTER_TOLERANCE)
+    applied = 0
+    for row in changed:
+        name = pose_filter.names[row]
+        if handles.lookup(name) is not None:
+            xform_object_by_name(name, *poses[row].tolist())
+            applied += 1
+        elif name not in _bridge_missing:
+            _bridge_missing.add(name)
+            print(f"MQTT poses for object '{name}' ignored, it is not in the scene.")
+    _filtered_poses = poses
+    if applied:
+        pose_bridge.applied += applied
+        bump_scene_version()
+    record_stage("mqtt_pose", "predict", started)
+
+def take_pending_commands():
+    """
+    Moves everything on command_queue to the scheduler, coalescing moves if
+    enabled, and drops the commands of clients that have disconnected.
     """
-    # Process all commands currently queued
-    while not command_queue.empty():
+    commands = []
+    while True:
         try:
-            conn, data = command_queue.get_nowait()
+            commands.append(command_queue.get_nowait())
         except queue.Empty:
             break
+    marked = scheduler.add(commands)
+    if marked:
+        print(f"Coalesced {marked} stale moves ({scheduler.superseded} in total)")
+    dropped = scheduler.drop_closed()
+    if dropped:
+        print(f"Dropped {dropped} commands of disconnected clients")
+
+def reject_expired_commands():
+    """Answers the commands the scheduler dropped for their deadline with an error."""
+    for conn, data, enqueued in scheduler.take_expired():
+        cmd_type = data.get("command")
+        metrics.count_command(cmd_type)
+        metrics.count_error(cmd_type)
+        try:
+            conn.send_error(data, f"Deadline of {data['deadline_ms']} ms expired after "
+                                  f"{(time.perf_counter() - enqueued) * 1000:.0f} ms in the queue")
+        except Exception as e:
+            print(f"Error rejecting expired '{cmd_type}' command:", e)
+        finally:
+            conn.command_done()
+
+def process_commands():
+    """
+    Called repeatedly from Blender's main thread.
+    It processes queued commands in the scheduler's order until none are left
+    or TICK_BUDGET is used up, renders due camera streams, then returns the delay until the
+    next call: 0 if work is left, MIN_INTERVAL after activity, doubling up to
+    IDLE_INTERVAL while idle, but never past the next stream frame.
+    MQTT poses are applied first, so this tick's renders see them, and
+    during warm-up one warm-up view is rendered before the commands.
+    """
+    global _next_interval
+    tick_start = time.perf_counter()
+    processed = apply_bridge_poses() if pose_bridge else 0
+    if warmup_views:
+        warmup_step()
+        processed += 1
+    while time.perf_counter() - tick_start < TICK_BUDGET:
+        # Take new arrivals before every command, so a move that came in
+        # during a render goes ahead of the renders queued before it
+        take_pending_commands()
+        command = scheduler.pop(time.perf_counter())
+        reject_expired_commands()
+        if command is None:
+            break
+        conn, data, enqueued = command
+        processed += 1
 
         # Data is expected to be a dict with a 'command' key.
         cmd_type = data.get("command")
-        if cmd_type == "move":
-            # Expected keys: "name", "x", "y", "z", "pitch", "roll", "yaw"
-            name = data.get("name")
-            x = data.get("x", 0)
-            y = data.get("y", 0)
-            z = data.get("z", 0)
-            pitch = data.get("pitch", 0)
-            roll = data.get("roll", 0)
-            yaw = data.get("yaw", 0)
-            print(f"Moving object '{name}' to ({x}, {y}, {z}) with rotation ({pitch}, {roll}, {yaw})")
-            xform_object_by_name(name, x, y, z, pitch, roll, yaw)
-            # Optionally send an acknowledgement (here we send a simple string)
-            try:
-                conn.sendall("ACK_MOVE\n".encode("utf-8"))
-            except Exception as e:
-                print("Error sending ACK_MOVE:", e)
-
-        elif cmd_type == "render":
-            # Expected keys: "camera" (camera name),
-            # "x", "y", "z", "pitch", "roll", "yaw", optionally "resolution" and "focal_length"
-            camera = data.get("camera")
-            x = data.get("x", 0)
-            y = data.get("y", 0)
-            z = data.get("z", 0)
-            pitch = data.get("pitch", 0)
-            roll = data.get("roll", 0)
-            yaw = data.get("yaw", 0)
-            resolution = data.get("resolution", None)  # e.g. [width, height]
-            focal_length = data.get("focal_length", None)
-            print(f"Render request from camera '{camera}' at position ({x}, {y}, {z}) with rotation ({pitch}, {roll}, {yaw})")
-            
-            # If resolution is provided update scene render resolution
-            if resolution and isinstance(resolution, (list, tuple)) and len(resolution) == 2:
-                bpy.context.scene.render.resolution_x = int(resolution[0])
-                bpy.context.scene.render.resolution_y = int(resolution[1])
-            # Update camera transform
-            xform_camera_by_name(camera, x, y, z, pitch, roll, yaw)
-            # Optionally set focal length if provided
-            if focal_length:
-                set_camera_focal_length(camera, focal_length)
-            # Render the scene
-            bpy.ops.render.render()
-            # Obtain pixel data from the Viewer Node (assumes node setup as above)
-            pixels = bpy.data.images.get('Viewer Node').pixels[:]
-            arr = np.array(pixels)
-            # Convert the raw [0,1] float values to 8-bit values (without gamma correction)
-            pixel_bytes = np.uint8(np.clip(arr, 0, 1) * 255)
-            # Remove the alpha channel so we have RGB only.
-            num_pixels = len(pixel_bytes) // 4
-            pixel_bytes = pixel_bytes.reshape((num_pixels, 4))[:, :3]
-            pixel_data = pixel_bytes.flatten().tobytes()
-            # Send the length of the data first (4-byte integer in network byte order)
-            try:
-                data_length = struct.pack("!I", len(pixel_data))
-                conn.sendall(data_length + pixel_data)
-            except Exception as e:
-                print("Error sending render image:", e)
-        else:
-            print("Unknown command received:", data)
-    # Continue processing if the server is running
-    return 0.1 if server_running else None
+        started = record_stage(cmd_type, "queue_wait", enqueued)
+        metrics.count_command(cmd_type)
+        handler = COMMAND_HANDLERS.get(cmd_type)
+        try:
+            if handler is None:
+                print("Unknown command received:", data)
+                metrics.count_error(cmd_type)
+                conn.send_error(data, data.get("error") or f"Unknown command '{cmd_type}'")
+            else:
+                handler(conn, data)
+        except Exception as e:
+            metrics.count_error(cmd_type)
+            print(f"Error handling '{cmd_type}' command:", e)
+        finally:
+            record_stage(cmd_type, "total", started)
+            # Let the network thread resume reading from this client
+            conn.command_done()
+    if len(streams):
+        render_streams()
+    publish_status()
+    # Stop the timer once the server is shut down
+    if not server_running:
+        return None
+    if warmup_views or len(scheduler) or not command_queue.empty():
+        return 0.0
+    if processed:
+        _next_interval = MIN_INTERVAL
+    else:
+        _next_interval = min(_next_interval * 2, IDLE_INTERVAL)
+    next_due = streams.next_due()
+    if next_due is not None:
+        # Wake up in time for the next streamed frame
+        return max(0.0, min(_next_interval, next_due - time.perf_counter()))
+    return _next_interval
 
 # === Blender UI Operators and Panel ===
 
@@ -259,8 +1123,72 @@ def unregister():
     bpy.utils.unregister_class(SERVER_OT_Stop)
     bpy.utils.unregister_class(SERVER_OT_Start)
 
+def run_background_loop():
+    """
+    Calls process_commands from the main thread until the server stops.
+    Used when Blender runs without a UI (blender -b), where timers do not run
+    and Blender would otherwise exit as soon as this script returns.
+    """
+    while server_running:
+        interval = process_commands()
+        if interval is None:
+            break
+        if interval:
+            time.sleep(interval)
+
+def parse_args(argv):
+    """Parses the script arguments, which Blender passes through after '--'."""
+    parser = argparse.ArgumentParser(prog="blenderServer.py")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=55001)
+    parser.add_argument("--max-connections", type=int, default=networkServer.DEFAULT_MAX_CONNECTIONS)
+    parser.add_argument("--max-inflight", type=int, default=networkServer.DEFAULT_MAX_INFLIGHT)
+    parser.add_argument("--send-queue", type=int, default=networkServer.DEFAULT_MAX_QUEUED,
+                        help="replies that may wait to be sent per client")
+    parser.add_argument("--send-policy", choices=networkServer.SEND_POLICIES,
+                        default=networkServer.DEFAULT_SEND_POLICY,
+                        help="what a reply to a client with a full send queue does")
+    parser.add_argument("--coalesce", action="store_true", help="coalesce queued moves per object")
+    parser.add_argument("--status-port", type=int, default=DEFAULT_STATUS_PORT,
+                        help="HTTP port for /metrics and /ready, 0 to disable")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="skip the warm-up renders and report ready as soon as the server listens")
+    parser.add_argument("--warmup-camera", action="append", dest="warmup_cameras", metavar="CAMERA",
+                        help="camera to warm up, repeatable (default: every camera in the scene)")
+    parser.add_argument("--warmup-resolution", action="append", dest="warmup_resolutions",
+                        type=argTypes.parse_resolution, metavar="WIDTHxHEIGHT",
+                        help="resolution to warm up, repeatable (default: the scene's)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record every received command to PATH.rec/.names/.extra for replay.py")
+    parser.add_argument("--mqtt-host", help="MQTT broker to take tracker poses from (off by default)")
+    parser.add_argument("--mqtt-port", type=int, default=poseBridge.DEFAULT_PORT)
+    parser.add_argument("--mqtt-topic", action="append", dest="mqtt_topics",
+                        help=f"pose topic filter, repeatable (default: {', '.join(poseBridge.DEFAULT_TOPICS)})")
+    parser.add_argument("--mqtt-map", action="append", metavar="TRACKER=OBJECT",
+                        help="move OBJECT with TRACKER's poses, repeatable (default: every tracker moves its namesake)")
+    parser.add_argument("--mqtt-filter", action="store_true",
+                        help="smooth MQTT poses with a Kalman filter and predict them to each render's time")
+    return parser.parse_args(argv[argv.index("--") + 1:] if "--" in argv else [])
+
 if __name__ == "__main__":
     register()
+    args = parse_args(sys.argv)
+    if args.record:
+        start_recording(args.record)
+    if not args.no_warmup:
+        # Before the server starts, so it never reports ready before warm-up
+        start_warmup(args.warmup_cameras, args.warmup_resolutions)
     # Optionally you can start the server automatically here:
-    start_network_server(host='0.0.0.0', port=55001)
-    # Comment out the above line when using on local machine with gui
\ No newline at end of file
+    start_network_server(host=args.host, port=args.port, max_connections=args.max_connections,
+                         max_inflight=args.max_inflight, coalesce=args.coalesce,
+                         status_port=args.status_port, max_queued=args.send_queue,
+                         send_policy=args.send_policy)
+    if args.mqtt_host:
+        try:
+            start_pose_bridge(args.mqtt_host, args.mqtt_port, args.mqtt_topics or poseBridge.DEFAULT_TOPICS,
+                              poseBridge.parse_mapping(args.mqtt_map), args.mqtt_filter)
+        except ValueError as e:
+            print("Invalid --mqtt-map:", e)
+    # Comment out the above line when using on local machine with gui
+    if bpy.app.background:
+        run_background_loop()
\ No newline at end of file
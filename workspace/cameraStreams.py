@@ -0,0 +1,132 @@
+"""
+Bookkeeping for push-based camera streams (the subscribe command).
+
+A subscription asks for frames of one camera at a target rate. Subscriptions
+that need the same render (camera, resolution, focal length and render
+overrides) form a group, and a due group is rendered once per tick for all
+of its due members; members that asked for different encodings each get
+their own encoding of that one render.
+
+A member is only sent a frame when the view changed since its last one
+(scene version or camera transform), so an idle scene costs nothing.
+With "delta": true a stream sends tile deltas against its previous frame
+between periodic keyframes (see deltaEncoding.py).
+
+Frames go out through ClientConnection.push_latest(), which keeps at most one
+unsent frame per stream and drops older ones for slow clients.
+
+Only touched from Blender's main thread.
+"""
+
+import deltaEncoding
+import frameEncoding
+import renderOverrides
+
+MAX_FPS = 120.0
+MIN_TILE_SIZE = 8
+MAX_TILE_SIZE = 1024
+
+
+class Subscription:
+    def __init__(self, conn, request, camera, fps, encoding, overrides, delta=None):
+        self.conn = conn
+        self.request = request  # the subscribe command; frames are encoded as replies to it
+        self.camera = camera
+        self.interval = 1.0 / fps
+        self.encoding = encoding  # (encoding, quality, scale)
+        self.overrides = overrides
+        self.delta = delta  # deltaEncoding.DeltaEncoder for delta streams, else None
+        resolution = request.get("resolution")
+        self.group_key = (camera, tuple(resolution) if resolution else None, request.get("focal_length"),
+                          renderOverrides.overrides_key(overrides))
+        self.next_due = 0.0
+        self.last_state = None  # view state of the last frame sent
+        self.frames_sent = 0
+
+    @property
+    def stream_key(self):
+        """Identifies this stream's one-slot buffer on the connection."""
+        return ("stream", self.camera)
+
+
+def parse_subscription(conn, request):
+    """Builds a Subscription from a subscribe command; raises ValueError for invalid fields."""
+    camera = request.get("camera")
+    if not camera or not isinstance(camera, str):
+        raise ValueError("subscribe needs a camera name")
+    try:
+        fps = float(request.get("fps", 30.0))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid fps {request.get('fps')!r}")
+    if not 0.0 < fps <= MAX_FPS:
+        raise ValueError(f"fps must be in (0, {MAX_FPS:g}], got {fps:g}")
+    resolution = request.get("resolution")
+    if resolution is not None and not (isinstance(resolution, (list, tuple)) and len(resolution) == 2):
+        raise ValueError(f"Invalid resolution {resolution!r}")
+    delta = None
+    if request.get("delta"):
+        tile_size = request.get("tile_size", deltaEncoding.DEFAULT_TILE_SIZE)
+        keyframe_interval = request.get("keyframe_interval", deltaEncoding.DEFAULT_KEYFRAME_INTERVAL)
+        if not isinstance(tile_size, int) or not MIN_TILE_SIZE <= tile_size <= MAX_TILE_SIZE:
+            raise ValueError(f"tile_size must be between {MIN_TILE_SIZE} and {MAX_TILE_SIZE}, got {tile_size!r}")
+        if not isinstance(keyframe_interval, int) or keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be a positive integer, got {keyframe_interval!r}")
+        delta = deltaEncoding.DeltaEncoder(tile_size, keyframe_interval)
+        # Keyframes and DLTA frames differ only in the frame header's format
+        # tag, which JSON lines only send for requests with an encoding
+        request = dict(request, encoding=request.get("encoding", "raw"))
+    return Subscription(conn, request, camera, fps, frameEncoding.parse_encoding(request),
+                        renderOverrides.parse_overrides(request), delta)
+
+
+class StreamRegistry:
+    def __init__(self):
+        self._subscriptions = {}  # (conn, camera) -> Subscription
+        self.frames_rendered = 0
+        self.frames_pushed = 0
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, subscription):
+        """Adds a subscription, replacing the client's previous one for the same camera."""
+        self._subscriptions[(subscription.conn, subscription.camera)] = subscription
+
+    def unsubscribe(self, conn, camera=None):
+        """Removes the client's subscription to camera, or all of them. Returns how many were removed."""
+        keys = [key for key in self._subscriptions
+                if key[0] is conn and (camera is None or key[1] == camera)]
+        for key in keys:
+            del self._subscriptions[key]
+        return len(keys)
+
+    def drop_closed(self):
+        for key in [key for key in self._subscriptions if key[0].closed]:
+            del self._subscriptions[key]
+
+    def due_groups(self, now):
+        """Returns {group_key: [due subscriptions]} for everything due at now."""
+        groups = {}
+        for subscription in self._subscriptions.values():
+            if subscription.next_due <= now:
+                groups.setdefault(subscription.group_key, []).append(subscription)
+        return groups
+
+    def next_due(self):
+        """The earliest time a subscription is due, or None without subscriptions."""
+        return min((s.next_due for s in self._subscriptions.values()), default=None)
+
+    def stats(self):
+        return {
+            "subscriptions": len(self._subscriptions),
+            "frames_rendered": self.frames_rendered,
+            "frames_pushed": self.frames_pushed,
+            "frames_dropped": sum(conn.pushes_dropped for conn in {key[0] for key in self._subscriptions}),
+            "keyframes": sum(s.delta.keyframes for s in self._subscriptions.values() if s.delta),
+            "delta_frames": sum(s.delta.deltas for s in self._subscriptions.values() if s.delta),
+        }
+
+
+def advance(subscription, now):
+    """Schedules the subscription's next frame one interval on, without bunching up after a stall."""
+    subscription.next_due = max(subscription.next_due + subscription.interval, now)
@@ -0,0 +1,198 @@
+"""
+Binary recording of the commands a server received, for replaying sessions
+(see replay.py).
+
+A recording at <path> is three files:
+
+    <path>.rec     RECORD_HEADER (magic, record size, Unix start time), then
+                   one fixed-size RECORD per command in arrival order
+    <path>.names   the name index: one JSON string per line; line n is name
+                   id n. Holds command names, object and camera names.
+    <path>.extra   concatenated UTF-8 JSON objects with the fields of a
+                   command that do not fit its record (resolution, encoding,
+                   frames, ...), referenced by offset and length
+
+RECORD: seconds since the start (arrival on the network thread), client id
+(connections numbered from 0 in the order they first sent a command),
+command name id, flags (bit n set if POSE_KEYS[n] was sent, FLAG_CAMERA if
+the name is a "camera" rather than a "name"), object or camera name id
+(NO_NAME if none), the pose as float32, extra offset and length (0 if the
+command has no other fields).
+
+Records are fixed size so CommandLog can memory-map the log and view it as
+a NumPy structured array without parsing anything up front. The writer
+flushes names and extra data before the records that refer to them, so a
+log that is read while still being written, or after a crash, is consistent
+up to its last whole record.
+"""
+
+import itertools
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from protocol import POSE_KEYS
+
+RECORD_MAGIC = b"TRKREC01"
+RECORD_HEADER = struct.Struct("<8sId4x")
+RECORD = struct.Struct("<dIHHI6fQI")
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("client", "<u4"), ("command", "<u2"), ("flags", "<u2"),
+                         ("name", "<u4"), ("pose", "<f4", (6,)), ("extra_offset", "<u8"),
+                         ("extra_length", "<u4")])
+assert RECORD_DTYPE.itemsize == RECORD.size
+NO_NAME = 0xFFFFFFFF
+FLAG_CAMERA = 1 << 15
+FLUSH_INTERVAL = 1.0  # seconds between flushes to disk while recording
+# Fields stored in the record itself; "id" is the client's v2 request id, which a replay assigns anew
+RECORD_FIELDS = frozenset(("command", "name", "camera", "id") + POSE_KEYS)
+
+
+class CommandRecorder:
+    """Appends commands to a recording; record() may be called from any thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.start_time = time.time()
+        self._rec = open(path + ".rec", "wb")
+        self._names = open(path + ".names", "w", encoding="utf-8")
+        self._extra = open(path + ".extra", "wb")
+        self._rec.write(RECORD_HEADER.pack(RECORD_MAGIC, RECORD.size, self.start_time))
+        self._name_ids = {}
+        self._clients = weakref.WeakKeyDictionary()  # connection -> client id
+        self._client_ids = itertools.count()  # never reused, unlike len(self._clients)
+        self._extra_offset = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def _name_id(self, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._name_ids)
+            self._names.write(json.dumps(name) + "\n")
+        return name_id
+
+    def record(self, conn, data, arrival=None):
+        """Appends one decoded command; arrival is a time.time() value, now by default."""
+        arrival = time.time() if arrival is None else arrival
+        with self._lock:
+            if self._rec is None:
+                return
+            client = self._clients.get(conn)
+            if client is None:
+                client = self._clients[conn] = next(self._client_ids)
+            command_id = self._name_id(str(data.get("command")))
+            flags = 0
+            name = data.get("name")
+            if not isinstance(name, str) and isinstance(data.get("camera"), str):
+                name = data["camera"]
+                flags |= FLAG_CAMERA
+            name_id = self._name_id(name) if isinstance(name, str) else NO_NAME
+            pose = [0.0] * len(POSE_KEYS)
+            for bit, key in enumerate(POSE_KEYS):
+                value = data.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    flags |= 1 << bit
+                    pose[bit] = value
+            extra = {key: value for key, value in data.items()
+                     if key not in RECORD_FIELDS and not key.startswith("_")}
+            # Whatever did not fit the record's one name field goes with the extra data
+            stored = None if name_id == NO_NAME else "camera" if flags & FLAG_CAMERA else "name"
+            for key in ("name", "camera"):
+                if key in data and key != stored:
+                    extra[key] = data[key]
+            offset, length = 0, 0
+            if extra:
+                blob = json.dumps(extra, separators=(",", ":")).encode("utf-8")
+                offset, length = self._extra_offset, len(blob)
+                self._extra.write(blob)
+                self._extra_offset += length
+            self._rec.write(RECORD.pack(arrival - self.start_time, client, command_id, flags, name_id,
+                                        *pose, offset, length))
+            self.records += 1
+            if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def _flush(self):
+        # Records last, so they never refer to names or extra data that are not on disk yet
+        self._names.flush()
+        self._extra.flush()
+        self._rec.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._rec is None:
+                return
+            self._flush()
+            for f in (self._names, self._extra, self._rec):
+                f.close()
+            self._rec = None
+
+    def stats(self):
+        return {"records": self.records, "names": len(self._name_ids), "extra_bytes": self._extra_offset}
+
+
+def _map(path):
+    """Read-only mapping of a file, or b'' for an empty one (which cannot be mapped)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CommandLog:
+    """
+    A recording opened for reading. records is a NumPy structured array
+    (RECORD_DTYPE) backed by the memory-mapped log; command(i) rebuilds the
+    i-th command dict.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._rec = _map(path + ".rec")
+        if len(self._rec) < RECORD_HEADER.size:
+            raise ValueError(f"{path}.rec is not a command recording")
+        magic, record_size, self.start_time = RECORD_HEADER.unpack_from(self._rec)
+        if magic != RECORD_MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path}.rec is not a command recording of this version")
+        # A log that is still being written may end in a partial record
+        count = (len(self._rec) - RECORD_HEADER.size) // RECORD.size
+        self.records = np.frombuffer(self._rec, RECORD_DTYPE, count, RECORD_HEADER.size)
+        with open(path + ".names", encoding="utf-8") as f:
+            self.names = [json.loads(line) for line in f if line.endswith("\n")]
+        self._extra = _map(path + ".extra")
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return float(self.records["t"][-1]) if len(self.records) else 0.0
+
+    def command(self, index):
+        record = self.records[index]
+        command = {"command": self.names[record["command"]]}
+        length = int(record["extra_length"])
+        if length:
+            offset = int(record["extra_offset"])
+            command.update(json.loads(bytes(self._extra[offset:offset + length])))
+        flags = int(record["flags"])
+        if record["name"] != NO_NAME:
+            command["camera" if flags & FLAG_CAMERA else "name"] = self.names[record["name"]]
+        for bit, key in enumerate(POSE_KEYS):
+            if flags & (1 << bit):
+                command[key] = float(record["pose"][bit])
+        return command
+
+    def close(self):
+        self.records = None
+        for mapped in (self._rec, self._extra):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
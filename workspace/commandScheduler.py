@@ -0,0 +1,205 @@
+"""
+Per-client scheduling of the commands Blender's main thread executes.
+
+Every connection has its own FIFO queue, so a client flooding render
+requests only delays itself. The next command is taken from the front of
+some client's queue:
+
+    - cheap commands (moves, stats, ...) go before rendering commands
+      (RENDER_COMMANDS), so a move never waits behind another client's renders
+    - among clients whose front commands have the same priority, clients take
+      turns (round-robin)
+
+A client's own commands always run in the order it sent them, so its renders
+see its earlier moves and its replies come back in request order.
+
+A command may carry "deadline_ms": if it has not started that many
+milliseconds after it arrived, it is not executed but handed back through
+take_expired() so the caller can answer it with an error (JSON-lines
+clients get an {"error": ...} line for it, see protocol.wants_error_reply()). Commands of
+connections that have closed are dropped without a reply (drop_closed(),
+and pop() on the way).
+
+With coalesce, queued moves of one object in one client's queue are
+collapsed to the newest before that client's next other command
+(coalesce_moves()).
+
+Only touched from Blender's main thread.
+"""
+
+import collections
+
+RENDER_COMMANDS = ("render", "render_batch", "render_multi")
+PRIORITY_CHEAP = 0
+PRIORITY_RENDER = 1
+
+
+def command_priority(data):
+    """Lower runs first."""
+    return PRIORITY_RENDER if data.get("command") in RENDER_COMMANDS else PRIORITY_CHEAP
+
+
+def command_deadline(data, enqueued):
+    """The time (on the enqueue clock) by which a command must start, or None."""
+    deadline_ms = data.get("deadline_ms")
+    if isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)):
+        return None
+    return enqueued + deadline_ms / 1000.0
+
+
+def coalesce_moves(commands):
+    """
+    Marks stale moves in a sequence of (conn, data, enqueued) tuples.
+    Between two commands that are not moves, only the newest move of each
+    object stays live (keyed on its name or handle, move_target()); older ones get "_superseded" set and are only
+    acknowledged when their turn comes, so every client still receives its
+    replies in request order. Anything else (render, render_batch, ...) is a
+    barrier, so a render always sees every move queued before it.
+    Returns the number of moves newly marked.
+    """
+    marked = 0
+    newest = {}  # move_target() -> data of the live move since the last barrier
+    for _, data, _ in commands:
+        if data.get("command") != "move":
+            newest.clear()
+            continue
+        if data.get("_superseded"):
+            continue
+        target = move_target(data)
+        previous = newest.get(target)
+        if previous is not None:
+            previous["_superseded"] = True
+            marked += 1
+        newest[target] = data
+    return marked
+
+
+def move_target(data):
+    """
+    What a move addresses: ("handle", h) for moves by integer handle, else
+    ("name", name). A handle and a name of the same object count as two
+    targets, which only costs a missed coalescing, never a lost move.
+    """
+    if "handle" in data:
+        return ("handle", data["handle"])
+    return ("name", data.get("name"))
+
+
+class ClientQueue:
+    def __init__(self, conn):
+        self.conn = conn
+        self.commands = collections.deque()  # (conn, data, enqueued)
+        self.max_depth = 0
+        self.executed = 0
+        self.expired = 0
+        self.superseded = 0
+
+    def stats(self):
+        return {
+            "client": str(self.conn.addr),
+            "queued": len(self.commands),
+            "max_depth": self.max_depth,
+            "executed": self.executed,
+            "expired": self.expired,
+            "superseded": self.superseded,
+        }
+
+
+class CommandScheduler:
+    def __init__(self, coalesce=False):
+        self.coalesce = coalesce
+        # conn -> ClientQueue; the order is the round-robin order, the client
+        # served last goes to the end
+        self._clients = collections.OrderedDict()
+        self._expired = []
+        self._queued = 0
+        self.executed = 0
+        self.expired = 0
+        self.dropped_closed = 0
+        self.superseded = 0
+
+    def __len__(self):
+        return self._queued
+
+    def add(self, commands):
+        """Queues (conn, data, enqueued) tuples in arrival order; returns the number of moves coalesced."""
+        touched = set()
+        for command in commands:
+            conn = command[0]
+            client = self._clients.get(conn)
+            if client is None:
+                client = self._clients[conn] = ClientQueue(conn)
+            client.commands.append(command)
+            client.max_depth = max(client.max_depth, len(client.commands))
+            self._queued += 1
+            touched.add(client)
+        marked = 0
+        if self.coalesce:
+            for client in touched:
+                if len(client.commands) > 1:
+                    count = coalesce_moves(client.commands)
+                    client.superseded += count
+                    marked += count
+            self.superseded += marked
+        return marked
+
+    def drop_closed(self):
+        """Discards the queues of connections that have closed; returns the number of commands dropped."""
+        dropped = 0
+        for conn in [conn for conn in self._clients if conn.closed]:
+            dropped += self._drop_client(conn)
+        return dropped
+
+    def _drop_client(self, conn):
+        count = len(self._clients.pop(conn).commands)
+        self._queued -= count
+        self.dropped_closed += count
+        return count
+
+    def pop(self, now):
+        """
+        The next command to execute as (conn, data, enqueued), or None if
+        nothing is queued. Front commands whose deadline passed before now
+        are set aside for take_expired() on the way.
+        """
+        while True:
+            best, best_priority = None, None
+            for client in self._clients.values():
+                if client.commands:
+                    priority = command_priority(client.commands[0][1])
+                    if best is None or priority < best_priority:
+                        best, best_priority = client, priority
+                        if priority == PRIORITY_CHEAP:
+                            break
+            if best is None:
+                return None
+            if best.conn.closed:
+                self._drop_client(best.conn)
+                continue
+            command = best.commands.popleft()
+            self._queued -= 1
+            self._clients.move_to_end(best.conn)
+            deadline = command_deadline(command[1], command[2])
+            if deadline is not None and now > deadline:
+                best.expired += 1
+                self.expired += 1
+                self._expired.append(command)
+                continue
+            best.executed += 1
+            self.executed += 1
+            return command
+
+    def take_expired(self):
+        """The commands dropped for their deadline since the last call."""
+        expired, self._expired = self._expired, []
+        return expired
+
+    def stats(self):
+        return {
+            "queued": self._queued,
+            "executed": self.executed,
+            "expired": self.expired,
+            "dropped_closed": self.dropped_closed,
+            "superseded": self.superseded,
+            "clients": [client.stats() for client in self._clients.values()],
+        }
@@ -0,0 +1,100 @@
+"""
+Tile-based delta frames for camera streams.
+
+A delta frame carries only the tiles of an RGB frame that changed since the
+previous frame sent on the same stream. Its format tag is b'DLTA' and its
+width and height are those of the full frame. The payload is
+
+    DELTA_HEADER   tile size, tile count
+    per tile:      DELTA_TILE (tile column, tile row) + the tile's raw RGB bytes
+
+Tiles are tile_size square except at the right and top edges, where they are
+clipped to the frame. Rows run bottom to top like raw frames. Every
+keyframe_interval frames, and whenever the size changes, the stream sends a
+normal (key) frame instead, which also lets a client that lost track resync.
+"""
+
+import struct
+
+import numpy as np
+
+import frameEncoding
+
+DELTA_FORMAT_TAG = b'DLTA'
+DELTA_HEADER = struct.Struct("!HI")  # tile size, tile count
+DELTA_TILE = struct.Struct("!HH")  # tile column, tile row
+DEFAULT_TILE_SIZE = 32
+DEFAULT_KEYFRAME_INTERVAL = 60
+
+
+def changed_tiles(previous, current, tile_size):
+    """
+    Compares two (height, width, 3) uint8 frames and returns a (rows, columns)
+    bool array marking the tiles that differ.
+    """
+    height, width = current.shape[:2]
+    changed = np.any(previous != current, axis=2)
+    # Reduce pixel flags to tile flags, first over rows, then over columns
+    changed = np.logical_or.reduceat(changed, np.arange(0, height, tile_size), axis=0)
+    return np.logical_or.reduceat(changed, np.arange(0, width, tile_size), axis=1)
+
+
+class DeltaEncoder:
+    """Keeps one stream's previous frame and turns new frames into delta frames."""
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = 0
+        self.deltas = 0
+        self._reference = None  # (height, width, 3) copy of the last frame sent
+        self._since_keyframe = 0
+
+    def next_frame(self, rgb, width, height):
+        """
+        Returns a delta EncodedFrame of rgb against the previous frame, or None
+        when a keyframe is due and the caller should send a normal frame.
+        Either way rgb becomes the reference for the next call.
+        """
+        current = rgb.reshape(height, width, 3)
+        previous = self._reference
+        keyframe = (previous is None or previous.shape != current.shape or
+                    self._since_keyframe + 1 >= self.keyframe_interval)
+        frame = None if keyframe else self._encode(previous, current, width, height)
+        if keyframe:
+            self._reference = current.copy()
+            self._since_keyframe = 0
+            self.keyframes += 1
+        else:
+            np.copyto(self._reference, current)
+            self._since_keyframe += 1
+            self.deltas += 1
+        return frame
+
+    def _encode(self, previous, current, width, height):
+        tile = self.tile_size
+        rows, columns = np.nonzero(changed_tiles(previous, current, tile))
+        parts = [DELTA_HEADER.pack(tile, len(rows))]
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            parts.append(DELTA_TILE.pack(column, row))
+            parts.append(current[row * tile:(row + 1) * tile, column * tile:(column + 1) * tile].tobytes())
+        return frameEncoding.EncodedFrame(DELTA_FORMAT_TAG, width, height, b"".join(parts))
+
+
+def apply_delta(reference, payload):
+    """
+    Client side: patches the changed tiles of a delta payload into reference,
+    a writable (height, width, 3) uint8 array holding the previous frame.
+    """
+    tile, count = DELTA_HEADER.unpack_from(payload)
+    offset = DELTA_HEADER.size
+    height, width = reference.shape[:2]
+    for _ in range(count):
+        column, row = DELTA_TILE.unpack_from(payload, offset)
+        offset += DELTA_TILE.size
+        y0, x0 = row * tile, column * tile
+        y1, x1 = min(y0 + tile, height), min(x0 + tile, width)
+        size = (y1 - y0) * (x1 - x0) * 3
+        reference[y0:y1, x0:x1] = np.frombuffer(payload, np.uint8, size, offset).reshape(y1 - y0, x1 - x0, 3)
+        offset += size
+    return reference
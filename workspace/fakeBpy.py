@@ -0,0 +1,167 @@
+"""
+Stand-in bpy and mathutils modules for running blenderServer.py without Blender.
+
+Only the parts of the API the server touches are provided. Rendering sleeps
+for a configurable time and leaves a 'Viewer Node' image of the scene's
+resolution, so the queueing, readback, encoding and networking code runs
+exactly as it does in Blender. Used by benchmark.py:
+
+    import fakeBpy
+    fakeBpy.install(render_seconds=0.02)
+    import blenderServer
+"""
+
+import sys
+import time
+import types
+
+import numpy as np
+
+DEFAULT_OBJECTS = ("Ball",)
+DEFAULT_CAMERAS = ("Camera",)
+RENDER_ENGINES = ("BLENDER_EEVEE_NEXT", "BLENDER_WORKBENCH", "CYCLES")
+
+
+class FakeObject:
+    def __init__(self, name, type='MESH'):
+        self.name = name
+        self.type = type
+        self.location = (0.0, 0.0, 0.0)
+        self.rotation_euler = (0.0, 0.0, 0.0)
+        self.data = types.SimpleNamespace(lens=50.0)
+
+    def __repr__(self):
+        return f"<FakeObject {self.name!r} {self.type}>"
+
+
+class FakeRenderSettings:
+    """scene.render; like Blender, assigning an unknown engine raises TypeError."""
+
+    def __init__(self, resolution):
+        self.resolution_x, self.resolution_y = resolution
+        self.resolution_percentage = 100
+        self._engine = RENDER_ENGINES[0]
+        self.use_border = False
+        self.use_crop_to_border = False
+        self.border_min_x = self.border_min_y = 0.0
+        self.border_max_x = self.border_max_y = 1.0
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @engine.setter
+    def engine(self, value):
+        if value not in RENDER_ENGINES:
+            raise TypeError(f"enum \"{value}\" not found in {RENDER_ENGINES}")
+        self._engine = value
+
+    def output_size(self):
+        """The size of the rendered image, honouring the percentage and a cropped border."""
+        width = self.resolution_x * self.resolution_percentage // 100
+        height = self.resolution_y * self.resolution_percentage // 100
+        if self.use_border and self.use_crop_to_border:
+            width = max(1, round(width * (self.border_max_x - self.border_min_x)))
+            height = max(1, round(height * (self.border_max_y - self.border_min_y)))
+        return width, height
+
+
+class FakePixels:
+    """The Image.pixels collection; only foreach_get is supported."""
+
+    def __init__(self, image):
+        self.image = image
+
+    def foreach_get(self, out):
+        np.copyto(out, self.image.data)
+
+
+class FakeImage:
+    def __init__(self, name, width, height, pattern):
+        self.name = name
+        self.size = (width, height)
+        self.channels = 4
+        self.data = pattern
+        self.pixels = FakePixels(self)
+
+
+class FakeNodes(list):
+    def new(self, type):
+        node = types.SimpleNamespace(type=type, location=(0, 0), use_alpha=True,
+                                     inputs=[None], outputs=[None])
+        self.append(node)
+        return node
+
+
+class FakeRenderer:
+    """bpy.ops.render: render() costs render_seconds plus render_seconds_per_mpixel per megapixel."""
+
+    def __init__(self, bpy, render_seconds, render_seconds_per_mpixel):
+        self.bpy = bpy
+        self.render_seconds = render_seconds
+        self.render_seconds_per_mpixel = render_seconds_per_mpixel
+        self.renders = 0
+        self._patterns = {}  # (width, height) -> float32 RGBA pixels
+
+    def _pattern(self, width, height):
+        """Deterministic noisy pixels, so compressed encodings do not get an easy image."""
+        pattern = self._patterns.get((width, height))
+        if pattern is None:
+            rng = np.random.default_rng(width * 65536 + height)
+            pattern = rng.random(width * height * 4, dtype=np.float32)
+            self._patterns[(width, height)] = pattern
+        return pattern
+
+    def render(self):
+        width, height = self.bpy.context.scene.render.output_size()
+        time.sleep(self.render_seconds + self.render_seconds_per_mpixel * width * height / 1e6)
+        self.renders += 1
+        self.bpy.data.images['Viewer Node'] = FakeImage('Viewer Node', width, height,
+                                                        self._pattern(width, height))
+        return {'FINISHED'}
+
+
+def make_bpy(render_seconds=0.0, render_seconds_per_mpixel=0.0, resolution=(1920, 1080),
+             objects=DEFAULT_OBJECTS, cameras=DEFAULT_CAMERAS):
+    """Builds a bpy module holding the given objects and cameras."""
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.SimpleNamespace(**{name: type(name, (), {}) for name in (
+        "Operator", "Panel", "Object", "Mesh", "Material", "Light", "World")})
+    scene_objects = {name: FakeObject(name) for name in objects}
+    scene_objects.update((name, FakeObject(name, 'CAMERA')) for name in cameras)
+    render = FakeRenderSettings(resolution)
+    node_tree = types.SimpleNamespace(nodes=FakeNodes(), links=types.SimpleNamespace(new=lambda *_: None))
+    scene = types.SimpleNamespace(
+        use_nodes=False, node_tree=node_tree, render=render,
+        cycles=types.SimpleNamespace(samples=128), eevee=types.SimpleNamespace(taa_render_samples=64),
+        camera=next((obj for obj in scene_objects.values() if obj.type == 'CAMERA'), None))
+    bpy.context = types.SimpleNamespace(scene=scene)
+    bpy.data = types.SimpleNamespace(objects=scene_objects, images={})
+    bpy.ops = types.SimpleNamespace(render=FakeRenderer(bpy, render_seconds, render_seconds_per_mpixel))
+    bpy.app = types.SimpleNamespace(
+        background=True,
+        handlers=types.SimpleNamespace(depsgraph_update_post=[], load_post=[], persistent=lambda f: f),
+        timers=types.SimpleNamespace(register=lambda *args, **kwargs: None))
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None)
+    return bpy
+
+
+def make_mathutils():
+    mathutils = types.ModuleType("mathutils")
+
+    class Euler(tuple):
+        def __new__(cls, angles=(0.0, 0.0, 0.0), order='XYZ'):
+            euler = super().__new__(cls, angles)
+            euler.order = order
+            return euler
+
+    mathutils.Euler = Euler
+    return mathutils
+
+
+def install(**kwargs):
+    """Registers fake bpy and mathutils modules in sys.modules; kwargs go to make_bpy(). Returns bpy."""
+    bpy = make_bpy(**kwargs)
+    sys.modules["bpy"] = bpy
+    sys.modules["mathutils"] = make_mathutils()
+    return bpy
@@ -0,0 +1,131 @@
+"""
+Frame encodings for the Blender render server.
+
+Frames come out of the readback stage as a (width * height, 3) uint8 RGB
+buffer whose rows run bottom-to-top (Blender's image layout). This module
+turns such a buffer into the payload a client asked for:
+
+    raw   - the RGB buffer as is (rows bottom-to-top, no copy)
+    png   - lossless PNG, rows top-to-bottom (zlib only, no extra dependency)
+    jpeg  - lossy JPEG with a quality setting (needs Pillow)
+    webp  - lossy WebP with a quality setting (needs Pillow)
+
+A request can also ask for a server-side downscale with "scale" (0 < scale <= 1).
+When a lossy format is requested but Pillow is not installed the frame is
+sent as PNG instead; the reply header always names the format actually used.
+The wire headers themselves live in protocol.py.
+"""
+
+import io
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, lossy formats fall back to PNG
+    Image = None
+
+FORMAT_TAGS = {
+    'raw': b'RAW ',
+    'png': b'PNG ',
+    'jpeg': b'JPEG',
+    'webp': b'WEBP',
+}
+ENCODING_ALIASES = {'jpg': 'jpeg'}
+
+DEFAULT_QUALITY = 90
+PNG_COMPRESSION_LEVEL = 1  # favour speed, encoding runs on Blender's main thread
+
+EncodedFrame = namedtuple('EncodedFrame', ['format', 'width', 'height', 'payload'])
+
+
+def parse_encoding(request):
+    """
+    Reads the encoding fields of a request dict.
+    Returns (encoding, quality, scale) or raises ValueError for bad values.
+    """
+    encoding = request.get("encoding", "raw")
+    if not isinstance(encoding, str):
+        raise ValueError(f"Encoding must be a string, got {encoding!r}")
+    encoding = ENCODING_ALIASES.get(encoding.lower(), encoding.lower())
+    if encoding not in FORMAT_TAGS:
+        raise ValueError(f"Unknown encoding '{encoding}'")
+    quality = request.get("quality", DEFAULT_QUALITY)
+    if not _is_number(quality) or not 1 <= quality <= 100:
+        raise ValueError(f"Quality must be between 1 and 100, got {quality!r}")
+    scale = request.get("scale", 1.0)
+    if not _is_number(scale) or not 0.0 < scale <= 1.0:
+        raise ValueError(f"Scale must be in (0, 1], got {scale!r}")
+    return encoding, int(quality), float(scale)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def downscale(rgb, width, height, scale):
+    """Nearest-neighbour downscale of an RGB buffer. Returns (rgb, width, height)."""
+    new_width = max(1, int(round(width * scale)))
+    new_height = max(1, int(round(height * scale)))
+    if (new_width, new_height) == (width, height):
+        return rgb, width, height
+    image = rgb.reshape(height, width, 3)
+    rows = np.arange(new_height) * height // new_height
+    cols = np.arange(new_width) * width // new_width
+    scaled = image[rows[:, None], cols[None, :]]
+    return scaled.reshape(new_width * new_height, 3), new_width, new_height
+
+
+def _png_chunk(tag, data):
+    chunk = tag + data
+    return struct.pack("!I", len(data)) + chunk + struct.pack("!I", zlib.crc32(chunk))
+
+
+def encode_png(rgb, width, height):
+    """Encodes a bottom-to-top RGB buffer as an upright 8-bit PNG."""
+    image = rgb.reshape(height, width, 3)
+    # Every scanline starts with a filter-type byte (0 = none)
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = image[::-1].reshape(height, width * 3)
+    header = struct.pack("!IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'IDAT', zlib.compress(scanlines, PNG_COMPRESSION_LEVEL)),
+        _png_chunk(b'IEND', b''),
+    ))
+
+
+def encode_lossy(rgb, width, height, encoding, quality):
+    """Encodes a bottom-to-top RGB buffer as an upright JPEG or WebP with Pillow."""
+    image = Image.frombuffer('RGB', (width, height), rgb, 'raw', 'RGB', 0, -1)
+    out = io.BytesIO()
+    image.save(out, format=encoding.upper(), quality=quality)
+    return out.getvalue()
+
+
+def encode_frame(rgb, width, height, encoding='raw', quality=DEFAULT_QUALITY, scale=1.0):
+    """
+    Encodes an RGB readback buffer. For 'raw' at full scale the payload is the
+    input buffer itself, so the caller must send it before it is reused.
+    """
+    if scale < 1.0:
+        rgb, width, height = downscale(rgb, width, height, scale)
+    if encoding in ('jpeg', 'webp') and Image is None:
+        encoding = 'png'
+    if encoding == 'raw':
+        payload = rgb
+    elif encoding == 'png':
+        payload = encode_png(rgb, width, height)
+    else:
+        payload = encode_lossy(rgb, width, height, encoding, quality)
+    return EncodedFrame(FORMAT_TAGS[encoding], width, height, payload)
+
+
+def payload_size(payload):
+    """Byte length of a bytes object or NumPy buffer."""
+    return payload.nbytes if isinstance(payload, np.ndarray) else len(payload)
+
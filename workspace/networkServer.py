@@ -0,0 +1,481 @@
+"""
+asyncio network front-end for the Blender render server.
+
+All client sockets are served by one asyncio event loop running in a
+background thread. Each connection's protocol is picked from its first bytes
+(see protocol.py). Decoded commands are handed to a callback (in the Blender
+server this puts them on command_queue for the main thread), and replies are
+written back through the ClientConnection.send_* methods, which encode them
+for the client's protocol and are safe to call from any thread.
+
+Flow control:
+    - at most max_connections clients are served, further ones are closed
+      right after accept
+    - each client may have at most max_inflight commands handed off and not
+      yet finished; once that is reached the loop stops reading from its
+      socket, so the client's sends block on TCP instead of growing a queue
+    - replies are queued per client and written by a sender task on the event
+      loop, so the thread that produced them (Blender's main thread) goes on
+      with the next command while a slow client is still receiving. At most
+      max_queued messages wait per client; send_policy decides what a send
+      to a full queue does:
+        drop_oldest  drop the oldest queued message (the default). Only v2
+                     clients match replies by id and can live with missing
+                     ones; JSON-lines and legacy clients are disconnected
+                     instead
+        disconnect   close the client
+        block        wait for space, closing the client after SEND_TIMEOUT;
+                     the sending thread (Blender's main thread) waits with it
+      A burst of replies can fill the queue of a client that is reading just
+      fine, so drop_oldest and disconnect first wait up to SEND_GRACE for
+      room; only a client that does not free any counts as stalled, and is
+      not waited for again until its queue has emptied.
+      Frames of a multi-frame reply (render_batch, render_multi) are never
+      dropped and do not count against max_queued, so such a reply always
+      arrives whole; its size is bounded by the request.
+    - a queued message's buffers are released (on_sent) only once the
+      transport has written all of them to the socket, see _send_queued()
+"""
+
+import asyncio
+import collections
+import threading
+
+import protocol
+
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_MAX_INFLIGHT = 32
+DEFAULT_MAX_QUEUED = 16
+SEND_POLICIES = ("block", "drop_oldest", "disconnect")
+DEFAULT_SEND_POLICY = "drop_oldest"
+READ_CHUNK = 64 * 1024
+SEND_TIMEOUT = 30.0
+SEND_GRACE = 0.05  # how long a full queue may take to drain before the client counts as stalled
+STATUS_REQUEST_TIMEOUT = 5.0
+HTTP_REASONS = {200: "OK", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ClientConnection:
+    """One connected client, shared between the event loop and the Blender main thread."""
+
+    def __init__(self, server, reader, writer, max_inflight):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info('peername')
+        self.max_inflight = max_inflight
+        self.codec = None  # chosen from the first bytes the client sends
+        self.closed = False
+        self._inflight = 0
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        self._latest = {}  # stream key -> newest unsent pushed message
+        self._push_task = None
+        self._push_lock = threading.Lock()
+        self._unsent = {}  # stream key -> pushed messages not yet written or dropped
+        self.pushes_dropped = 0
+        # Outbound queue of (parts, on_sent, bounded), filled by send_parts() on
+        # any thread and emptied by the sender task on the event loop
+        self._outbound = collections.deque()
+        self._bounded = 0  # queued messages that count against max_queued
+        self._stalled = False  # the queue stayed full for SEND_GRACE, see _make_room()
+        self._outbound_changed = threading.Condition()
+        self._sending = False  # a sender task is running or scheduled
+        self._send_task = None
+        self.sends_dropped = 0
+        # With no high-water mark drain() only returns once the transport has
+        # written everything, so on_sent() never releases a buffer it still holds
+        writer.transport.set_write_buffer_limits(high=0)
+
+    def __repr__(self):
+        return f"<ClientConnection {self.addr}>"
+
+    # --- called from any thread ---
+
+    def send_ack(self, request, text, flags=0):
+        return self.send_parts(self.codec.encode_ack(request, text, flags))
+
+    def send_frame(self, request, frame, index=None, count=None, on_sent=None):
+        """
+        Sends an EncodedFrame; index and count are set for frames of a batch
+        reply. The payload is queued without a copy, see send_parts().
+        """
+        try:
+            parts = self.codec.encode_frame(request, frame, index, count)
+        except Exception:
+            if on_sent is not None:
+                on_sent()
+            raise
+        return self.send_parts(parts, on_sent, bounded=index is None)
+
+    def send_result(self, request, result):
+        """Sends a JSON-serializable result, e.g. for stats queries."""
+        return self.send_parts(self.codec.encode_result(request, result))
+
+    def send_error(self, request, message):
+        return self.send_parts(self.codec.encode_error(request, message))
+
+    def send_parts(self, parts, on_sent=None, bounded=True):
+        """
+        Queues the buffers to be written to the client in order and returns
+        the number of bytes queued, without waiting for them to be sent. The
+        buffers must not be changed until on_sent() is called: on the event
+        loop thread once the transport has written them to the socket, or
+        when they are dropped because the queue was full or the client went
+        away. on_sent is called exactly once, also when this raises
+        ConnectionError. Messages sent with bounded=False (frames of a
+        multi-frame reply) skip the send policy and are never dropped.
+        This may wait for the event loop, so it must not be called on its thread.
+        """
+        try:
+            nbytes = sum(memoryview(part).nbytes for part in parts)
+            dropped = None
+            with self._outbound_changed:
+                if self.closed:
+                    raise ConnectionError(f"Client {self.addr} is disconnected")
+                if bounded and self._bounded >= self.server.max_queued:
+                    dropped = self._make_room()
+                self._outbound.append((parts, on_sent, bounded))
+                self._bounded += bounded
+                on_sent = None  # the sender task calls it now
+                start = not self._sending
+                self._sending = True
+        finally:
+            if on_sent is not None:
+                on_sent()
+        if dropped is not None:
+            self.sends_dropped += 1
+            self.server.sends_dropped += 1
+            if dropped[1] is not None:
+                dropped[1]()
+        if start:
+            self.server.loop.call_soon_threadsafe(self._start_sender)
+        return nbytes
+
+    def send_policy(self):
+        """The server's send policy as it applies to this client."""
+        policy = self.server.send_policy
+        if policy == "drop_oldest" and self.codec.name != "v2":
+            # Replies without request ids cannot be matched once one is missing
+            return "disconnect"
+        return policy
+
+    def _make_room(self):
+        """Applies the send policy to a full outbound queue; returns a dropped message or None."""
+        policy = self.send_policy()
+        if policy != "block" and not self._stalled:
+            if self._outbound_changed.wait_for(
+                    lambda: self.closed or self._bounded < self.server.max_queued, SEND_GRACE):
+                if self.closed:
+                    raise ConnectionError(f"Client {self.addr} is disconnected")
+                return None
+            self._stalled = True
+        if policy == "drop_oldest":
+            for i, message in enumerate(self._outbound):
+                if message[2]:
+                    del self._outbound[i]
+                    self._bounded -= 1
+                    return message
+            return None
+        if policy == "disconnect":
+            self.server.send_disconnects += 1
+            self.close()
+            raise ConnectionError(f"Outbound queue of client {self.addr} is full, disconnecting")
+        if not self._outbound_changed.wait_for(
+                lambda: self.closed or self._bounded < self.server.max_queued, SEND_TIMEOUT):
+            self.close()
+            raise ConnectionError(f"Timed out sending to client {self.addr}")
+        if self.closed:
+            raise ConnectionError(f"Client {self.addr} is disconnected")
+        return None
+
+    def queued(self):
+        """Number of messages waiting in the outbound queue."""
+        return len(self._outbound)
+
+    def push_latest(self, key, parts):
+        """
+        Queues a pushed message (e.g. a streamed frame) without waiting for it
+        to be sent. Each stream key holds at most one unsent message: a newer
+        one replaces it and the older one is dropped, so a slow client gets
+        the latest frame instead of a growing backlog. The buffers must not be
+        reused by the caller.
+        """
+        if not self.closed:
+            with self._push_lock:
+                self._unsent[key] = self._unsent.get(key, 0) + 1
+            self.server.loop.call_soon_threadsafe(self._push_latest, key, parts)
+
+    def push_pending(self, key):
+        """True while a message pushed on this stream key has not been written yet."""
+        return self._unsent.get(key, 0) > 0
+
+    def command_done(self):
+        """Marks one handed-off command as finished so reading can resume."""
+        self.server.loop.call_soon_threadsafe(self._release)
+
+    def close(self):
+        if not self.closed:
+            self.server.loop.call_soon_threadsafe(self._close)
+
+    # --- event loop side ---
+
+    def _start_sender(self):
+        if self._send_task is None:
+            self._send_task = asyncio.ensure_future(self._send_queued())
+
+    async def _send_queued(self):
+        try:
+            while True:
+                with self._outbound_changed:
+                    if not self._outbound or self.closed:
+                        self._sending = False
+                        self._stalled = False
+                        break
+                    parts, on_sent, bounded = self._outbound.popleft()
+                    self._bounded -= bounded
+                    self._outbound_changed.notify_all()
+                try:
+                    for part in parts:
+                        self.writer.write(part)
+                    # The transport may keep views of the buffers until they are
+                    # written (Python 3.12+ does not copy them); drain() waits for
+                    # that, see set_write_buffer_limits() in __init__
+                    await self.writer.drain()
+                finally:
+                    if on_sent is not None:
+                        on_sent()
+        except ConnectionError:
+            self._close()
+        finally:
+            self._send_task = None
+
+    async def write_parts(self, parts):
+        """Writes buffers from the event loop thread itself (e.g. the render pool dispatcher)."""
+        # Separate writes: the transport sends each buffer directly when it can
+        # and only copies what the socket did not take
+        for part in parts:
+            self.writer.write(part)
+        await self.writer.drain()
+
+    def _push_latest(self, key, parts):
+        if self._latest.pop(key, None) is not None:
+            self.pushes_dropped += 1
+            self._push_written(key)
+        self._latest[key] = parts
+        if self._push_task is None:
+            self._push_task = asyncio.ensure_future(self._write_latest())
+
+    async def _write_latest(self):
+        try:
+            while self._latest and not self.closed:
+                # Oldest stream first, so one busy stream cannot starve the others
+                key = next(iter(self._latest))
+                await self.write_parts(self._latest.pop(key))
+                self._push_written(key)
+        except ConnectionError:
+            self._latest.clear()
+        finally:
+            self._push_task = None
+
+    def _push_written(self, key):
+        with self._push_lock:
+            self._unsent[key] -= 1
+
+    def _acquire(self):
+        self._inflight += 1
+        if self._inflight >= self.max_inflight:
+            self._has_space.clear()
+
+    def _release(self):
+        self._inflight -= 1
+        if self._inflight < self.max_inflight:
+            self._has_space.set()
+
+    def _close(self):
+        with self._outbound_changed:
+            self.closed = True
+            dropped = list(self._outbound)
+            self._outbound.clear()
+            self._bounded = 0
+            self._sending = False
+            self._outbound_changed.notify_all()
+        for _, on_sent, _ in dropped:
+            if on_sent is not None:
+                on_sent()
+        self._has_space.set()
+        self.writer.close()
+
+
+class NetworkServer:
+    """
+    Accepts clients on host:port and decodes their commands with the codec
+    protocol.select_codec() picks for each connection.
+    on_command(conn, data) is called on the event loop thread for every
+    decoded command; it must not block. on_disconnect(conn), if given, is
+    called on the event loop thread when a client goes away.
+
+    With a status_port, a minimal HTTP server on that port answers GET
+    requests for the paths in status_routes; each route is a callable
+    returning (status code, content type, body text), or a coroutine function
+    producing it, and runs on the event loop thread.
+
+    max_queued and send_policy bound each client's outbound queue (see above).
+    """
+
+    def __init__(self, on_command, host='0.0.0.0', port=55001,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, max_inflight=DEFAULT_MAX_INFLIGHT,
+                 on_disconnect=None, status_port=0, status_routes=None,
+                 max_queued=DEFAULT_MAX_QUEUED, send_policy=DEFAULT_SEND_POLICY):
+        if send_policy not in SEND_POLICIES:
+            raise ValueError(f"Unknown send policy {send_policy!r}, expected one of {', '.join(SEND_POLICIES)}")
+        self.on_command = on_command
+        self.on_disconnect = on_disconnect
+        self.status_port = status_port
+        self.status_routes = status_routes or {}
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.max_queued = max(1, max_queued)
+        self.send_policy = send_policy
+        self.sends_dropped = 0
+        self.send_disconnects = 0
+        self.clients = set()
+        self.loop = None
+        self._server = None
+        self._status_server = None
+        self._thread = None
+        self._started = threading.Event()
+
+    def start(self):
+        """Starts the event loop thread and returns once the socket is listening."""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self, timeout=2.0):
+        """Closes the listening socket and all clients and stops the loop thread."""
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self.loop = None
+
+    def send_stats(self):
+        return {
+            "policy": self.send_policy,
+            "max_queued": self.max_queued,
+            "queued": sum(conn.queued() for conn in list(self.clients)),
+            "dropped": self.sends_dropped,
+            "disconnects": self.send_disconnects,
+        }
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(asyncio.start_server(
+                self._handle_client, self.host, self.port))
+            print(f"Server listening on {self.host}:{self.port}")
+            if self.status_port:
+                self._status_server = self.loop.run_until_complete(asyncio.start_server(
+                    self._handle_status_request, self.host, self.status_port))
+                print(f"Status endpoints {sorted(self.status_routes)} on {self.host}:{self.status_port}")
+        except Exception as e:
+            print("Exception starting server:", e)
+            return
+        finally:
+            self._started.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _shutdown(self):
+        if self._status_server is not None:
+            self._status_server.close()
+        self._server.close()
+        for conn in list(self.clients):
+            conn._close()
+        await self._server.wait_closed()
+
+    async def _handle_client(self, reader, writer):
+        conn = ClientConnection(self, reader, writer, self.max_inflight)
+        if len(self.clients) >= self.max_connections:
+            print(f"Rejecting client from {conn.addr}: {self.max_connections} connections already open")
+            writer.close()
+            return
+        self.clients.add(conn)
+        print(f"Client connected from {conn.addr}")
+        try:
+            await self._read_commands(conn)
+        except ConnectionError:
+            pass
+        except protocol.ProtocolError as e:
+            print(f"Protocol error from {conn.addr}: {e}")
+        except Exception as e:
+            print("Exception in client handler:", e)
+        finally:
+            print(f"Client from {conn.addr} disconnected.")
+            self.clients.discard(conn)
+            conn._close()
+            if self.on_disconnect is not None:
+                self.on_disconnect(conn)
+
+    async def _handle_status_request(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), STATUS_REQUEST_TIMEOUT)
+            # Skip the request headers
+            while (await asyncio.wait_for(reader.readline(), STATUS_REQUEST_TIMEOUT)).strip():
+                pass
+            fields = request_line.decode("latin-1").split()
+            path = fields[1].split("?")[0] if len(fields) >= 2 else "/"
+            route = self.status_routes.get(path)
+            if route is None:
+                status, content_type, body = 404, "text/plain", "Not found\n"
+            else:
+                try:
+                    result = route()
+                    if asyncio.iscoroutine(result):
+                        result = await result
+                    status, content_type, body = result
+                except Exception as e:
+                    status, content_type, body = 500, "text/plain", f"{e}\n"
+            payload = body.encode("utf-8")
+            writer.write((f"HTTP/1.0 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                          f"Content-Type: {content_type}\r\n"
+                          f"Content-Length: {len(payload)}\r\n"
+                          "Connection: close\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_commands(self, conn):
+        prefix = b""
+        while not conn.closed:
+            # Backpressure: stop reading while this client has too much work queued
+            await conn._has_space.wait()
+            data = await conn.reader.read(READ_CHUNK)
+            if not data:
+                break  # Connection closed
+            if conn.codec is None:
+                prefix += data
+                conn.codec = protocol.select_codec(prefix)
+                if conn.codec is None:
+                    continue
+                print(f"Client {conn.addr} speaks the {conn.codec.name} protocol")
+                data = prefix
+            commands = conn.codec.feed(data)
+            output = conn.codec.take_output()
+            if output:
+                conn.writer.write(output)
+            for command in commands:
+                # One read can hold many commands; hand them off only while
+                # there is room, so max_inflight is a hard limit
+                await conn._has_space.wait()
+                if conn.closed:
+                    break
+                conn._acquire()
+                self.on_command(conn, command)
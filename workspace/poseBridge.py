@@ -0,0 +1,165 @@
+"""
+Direct MQTT subscription for tracker poses, so live poses reach Blender
+without a TCP client sending move commands and waiting for ACK_MOVE.
+
+Trackers publish JSON on tracker/<name>/pose (the same messages the backend
+ingests):
+
+    {"x": 1.0, "y": 2.0, "z": 0.5, "pitch": 0, "roll": 0, "yaw": 90, "t": 1718000000.25}
+
+The rotation fields default to 0 and a message may hold a JSON list of such
+objects, of which the last one counts. Each tracker maps to a Blender object,
+by default the object with the tracker's name.
+
+paho's network thread only parses messages and overwrites one slot per
+object under a single lock; Blender's main thread swaps the whole slot dict
+out once per tick (take()) and applies what it got. Poses that are
+overwritten before a tick applies them are counted as superseded.
+"""
+
+import json
+import threading
+import time
+
+DEFAULT_PORT = 1883
+DEFAULT_TOPICS = ("tracker/+/pose",)
+TOPIC_PREFIX = "tracker/"
+POSE_FIELDS = ("x", "y", "z", "pitch", "roll", "yaw")
+REQUIRED_FIELDS = ("x", "y", "z")
+
+
+def parse_mapping(entries):
+    """["ball=Ball", ...] -> {"ball": "Ball", ...}; raises ValueError for entries without '='."""
+    mapping = {}
+    for entry in entries or ():
+        tracker, sep, object_name = entry.partition("=")
+        if not sep or not tracker or not object_name:
+            raise ValueError(f"Expected TRACKER=OBJECT, got {entry!r}")
+        mapping[tracker] = object_name
+    return mapping
+
+
+def parse_pose(payload):
+    """
+    Decodes a pose message into ((x, y, z, pitch, roll, yaw), t), where t is
+    the sample time in Unix seconds or None. Raises ValueError if invalid.
+    """
+    try:
+        data = json.loads(payload)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(data, list):
+        if not data:
+            raise ValueError("Empty pose list")
+        data = data[-1]
+    if not isinstance(data, dict) or any(key not in data for key in REQUIRED_FIELDS):
+        raise ValueError(f"Pose needs {', '.join(REQUIRED_FIELDS)}")
+    try:
+        pose = tuple(float(data.get(key, 0.0)) for key in POSE_FIELDS)
+        t = float(data["t"]) if "t" in data else None
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid pose: {e}")
+    return pose, t
+
+
+class PoseBridge:
+    """Latest pose per Blender object, filled from MQTT and drained by the main thread."""
+
+    def __init__(self, mapping=None, topics=DEFAULT_TOPICS):
+        # With a mapping only mapped trackers are applied, otherwise every tracker to its namesake
+        self.mapping = mapping or {}
+        self.topics = tuple(topics)
+        self.client = None
+        self._lock = threading.Lock()
+        self._slots = {}  # object name -> (pose, t, receive time)
+        self.received = 0
+        self.invalid = 0
+        self.ignored = 0
+        self.superseded = 0
+        self.applied = 0  # counted by the caller of take()
+        self.connected = False
+
+    def object_name(self, topic):
+        """The Blender object for a pose topic, or None if the topic is not mapped."""
+        if not topic.startswith(TOPIC_PREFIX):
+            return None
+        tracker = topic[len(TOPIC_PREFIX):].split("/", 1)[0]
+        if not tracker:
+            return None
+        if self.mapping:
+            return self.mapping.get(tracker)
+        return tracker
+
+    # --- MQTT thread ---
+
+    def on_message(self, topic, payload):
+        """Parses one message and stores it as its object's latest pose."""
+        name = self.object_name(topic)
+        if name is None:
+            self.ignored += 1
+            return
+        try:
+            pose, t = parse_pose(payload)
+        except ValueError:
+            self.invalid += 1
+            return
+        with self._lock:
+            if name in self._slots:
+                self.superseded += 1
+            self._slots[name] = (pose, t, time.time())
+            self.received += 1
+
+    # --- main thread ---
+
+    def take(self):
+        """Returns {object name: (pose, t, receive time)} of everything received since the last call."""
+        with self._lock:
+            slots, self._slots = self._slots, {}
+        return slots
+
+    def start(self, host, port=DEFAULT_PORT):
+        """Connects on paho's network thread, which reconnects by itself. Returns False without paho-mqtt."""
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            print("paho-mqtt is not installed in Blender's Python, MQTT poses are disabled")
+            return False
+        if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            client = mqtt.Client()
+
+        def on_connect(client, userdata, flags, *args):
+            # (Re)subscribe on every connect, so a broker restart does not lose the subscription
+            self.connected = True
+            for topic in self.topics:
+                client.subscribe(topic, qos=0)
+            print(f"Subscribed to MQTT poses on {', '.join(self.topics)} at {host}:{port}")
+
+        def on_disconnect(client, userdata, *args):
+            self.connected = False
+
+        client.on_connect = on_connect
+        client.on_disconnect = on_disconnect
+        client.on_message = lambda client, userdata, message: self.on_message(message.topic, message.payload)
+        client.connect_async(host, port)
+        client.loop_start()
+        self.client = client
+        return True
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.client = None
+            self.connected = False
+
+    def stats(self):
+        return {
+            "connected": int(self.connected),
+            "received": self.received,
+            "applied": self.applied,
+            "superseded": self.superseded,
+            "invalid": self.invalid,
+            "ignored": self.ignored,
+        }
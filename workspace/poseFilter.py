@@ -0,0 +1,154 @@
+"""
+Constant-velocity Kalman filter for many tracked objects at once.
+
+Every object has six independent channels (x, y, z, pitch, roll, yaw), each
+with a position/velocity state and its 2x2 covariance. All of it lives in
+NumPy arrays indexed by object, so a batch of measurements is one vectorized
+update and predicting every object to a render timestamp is one vectorized
+extrapolation, whatever the number of objects.
+
+Angles are in degrees like move commands; their innovations are wrapped to
+[-180, 180) so a yaw going from 179 to -179 is a small step. Times are in
+seconds on any clock, as long as measurements and predictions use the same one.
+
+Independent of Blender so it can be tested on its own.
+"""
+
+import numpy as np
+
+CHANNELS = 6  # x, y, z, pitch, roll, yaw
+ANGLES = slice(3, 6)
+# Defaults: white acceleration noise density, measurement variance and the
+# initial velocity variance of a new object, all per channel
+PROCESS_NOISE = 5.0
+MEASUREMENT_NOISE = 1e-4
+INITIAL_VELOCITY_VARIANCE = 1.0
+# Predictions never extrapolate further than this past an object's last
+# measurement, so a tracker that stops publishing holds still
+MAX_PREDICTION = 0.25
+
+
+def wrap_degrees(values):
+    return (values + 180.0) % 360.0 - 180.0
+
+
+class PoseFilter:
+    def __init__(self, process_noise=PROCESS_NOISE, measurement_noise=MEASUREMENT_NOISE,
+                 max_prediction=MAX_PREDICTION, capacity=16):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.max_prediction = max_prediction
+        self.names = []
+        self.index = {}  # object name -> row
+        self.position = np.zeros((capacity, CHANNELS))
+        self.velocity = np.zeros((capacity, CHANNELS))
+        # Covariance [[p00, p01], [p01, p11]] per object and channel
+        self.p00 = np.zeros((capacity, CHANNELS))
+        self.p01 = np.zeros((capacity, CHANNELS))
+        self.p11 = np.zeros((capacity, CHANNELS))
+        self.time = np.zeros(capacity)  # time of each object's last measurement
+        self.updates = 0
+        self.out_of_order = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def _rows(self, names):
+        """Rows for names, adding unknown objects as needed. Returns (rows, mask of newly added)."""
+        rows = np.empty(len(names), dtype=np.intp)
+        is_new = np.zeros(len(names), dtype=bool)
+        for i, name in enumerate(names):
+            row = self.index.get(name)
+            if row is None:
+                row = self.index[name] = len(self.names)
+                self.names.append(name)
+                is_new[i] = True
+            rows[i] = row
+        if len(self.names) > len(self.time):
+            self._grow(max(len(self.names), 2 * len(self.time)))
+        return rows, is_new
+
+    def _grow(self, capacity):
+        for attr in ("position", "velocity", "p00", "p01", "p11", "time"):
+            old = getattr(self, attr)
+            new = np.zeros((capacity,) + old.shape[1:])
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    def update(self, names, poses, times):
+        """
+        Feeds one measurement per entry: names is a sequence of object names,
+        poses an (n, 6) array-like and times n measurement times. Measurements
+        older than an object's last one are ignored.
+        """
+        if not len(names):
+            return
+        poses = np.asarray(poses, dtype=float).reshape(len(names), CHANNELS)
+        times = np.asarray(times, dtype=float).reshape(len(names))
+        rows, is_new = self._rows(names)
+        # Repeated objects are applied in rounds, oldest measurement first,
+        # since one vectorized step can only update each row once
+        order = np.lexsort((times, rows))
+        rows, is_new, poses, times = rows[order], is_new[order], poses[order], times[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        # The oldest measurement of a new object initializes it
+        is_new = first & np.isin(rows, rows[is_new])
+        positions = np.arange(len(rows))
+        occurrence = positions - np.maximum.accumulate(np.where(first, positions, 0))
+        for n in range(occurrence.max() + 1):
+            step = occurrence == n
+            self._step(rows[step], is_new[step], poses[step], times[step])
+
+    def _step(self, rows, is_new, poses, times):
+        if is_new.any():
+            new = rows[is_new]
+            self.position[new] = poses[is_new]
+            self.velocity[new] = 0.0
+            self.p00[new] = self.measurement_noise
+            self.p01[new] = 0.0
+            self.p11[new] = INITIAL_VELOCITY_VARIANCE
+            self.time[new] = times[is_new]
+            self.updates += int(is_new.sum())
+            rows, poses, times = rows[~is_new], poses[~is_new], times[~is_new]
+        dt = times - self.time[rows]
+        valid = dt >= 0
+        if not valid.all():
+            self.out_of_order += int((~valid).sum())
+            rows, poses, times, dt = rows[valid], poses[valid], times[valid], dt[valid]
+        if not len(rows):
+            return
+        dt = dt[:, None]
+        q = self.process_noise
+        # Predict to the measurement time
+        position = self.position[rows] + self.velocity[rows] * dt
+        p00, p01, p11 = self.p00[rows], self.p01[rows], self.p11[rows]
+        p00 = p00 + dt * (2 * p01 + dt * p11) + q * dt ** 3 / 3
+        p01 = p01 + dt * p11 + q * dt ** 2 / 2
+        p11 = p11 + q * dt
+        # Correct with the measured position
+        innovation = poses - position
+        innovation[:, ANGLES] = wrap_degrees(innovation[:, ANGLES])
+        s = p00 + self.measurement_noise
+        k0 = p00 / s
+        k1 = p01 / s
+        position += k0 * innovation
+        position[:, ANGLES] = wrap_degrees(position[:, ANGLES])
+        self.position[rows] = position
+        self.velocity[rows] += k1 * innovation
+        self.p11[rows] = p11 - k1 * p01
+        self.p01[rows] = (1 - k0) * p01
+        self.p00[rows] = (1 - k0) * p00
+        self.time[rows] = times
+        self.updates += len(rows)
+
+    def predict(self, t):
+        """Poses of all objects at time t as an (n, 6) array, in the order of self.names."""
+        count = len(self.names)
+        dt = np.clip(t - self.time[:count], 0.0, self.max_prediction)[:, None]
+        poses = self.position[:count] + self.velocity[:count] * dt
+        poses[:, ANGLES] = wrap_degrees(poses[:, ANGLES])
+        return poses
+
+    def stats(self):
+        return {"objects": len(self.names), "updates": self.updates, "out_of_order": self.out_of_order}
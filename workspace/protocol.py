@@ -0,0 +1,375 @@
+"""
+Wire protocols spoken by the Blender render server.
+
+The protocol is picked from the first bytes a client sends:
+
+    JSON lines (v1)   the client opens with '{'. One JSON object per line,
+                      replies are 'ACK_MOVE\\n' or length-prefixed frames.
+    Legacy floats     anything else. The old MATLAB format: 8 little-endian
+                      float32 (width, height, x, y, z, pitch, roll, yaw), a
+                      uint32 name length and the object name. The object is
+                      moved, the active camera renders and the reply is raw
+                      RGBA bytes without a prefix.
+    Binary v2         the client opens with V2_HELLO (b'TRK2' + version) and
+                      the server answers with the version it speaks. After
+                      that every message in both directions is V2_HEADER
+                      (payload length, opcode, flags, request id) followed by
+                      the payload. Replies carry the request id of the
+                      request they answer, so clients can pipeline requests.
+
+v2 request opcodes and payloads:
+    OP_JSON     UTF-8 JSON object, any command the JSON protocol accepts
+    OP_MOVE     V2_NAME (uint16 length) + name, then V2_POSE (6 float32)
+    OP_RENDER   V2_NAME + camera, V2_POSE, V2_VIEW (width, height, focal
+                length; 0 keeps the current value), then optionally a JSON
+                object with further render fields such as "encoding"
+
+v2 reply opcodes and payloads:
+    OP_ACK      ASCII acknowledgement, e.g. b'ACK_MOVE'
+    OP_FRAME    V2_FRAME (format, width, height, index, count) + frame bytes
+    OP_RESULT   UTF-8 JSON object
+    OP_ERROR    UTF-8 error message
+
+Codecs are sans-IO: feed() takes received bytes and returns decoded command
+dicts, and the encode_* methods return lists of byte buffers to be written
+in order. Buffers are returned separately so large payloads are never copied
+into a joined bytes object.
+"""
+
+import json
+import struct
+from collections import namedtuple
+
+# Encoded frame header: format tag, width, height, payload length
+FRAME_HEADER = struct.Struct("!4sIII")
+# Prefix of every frame in a render_batch reply: frame index, frame count
+BATCH_FRAME_HEADER = struct.Struct("!II")
+# Length prefix of a plain (legacy) render reply
+LENGTH_PREFIX = struct.Struct("!I")
+
+PROTOCOL_V2_MAGIC = b"TRK2"
+PROTOCOL_V2_VERSION = 2
+V2_HELLO = struct.Struct("!4sB")
+V2_HEADER = struct.Struct("!IBBI")  # payload length, opcode, flags, request id
+V2_NAME = struct.Struct("!H")
+V2_POSE = struct.Struct("!6f")
+V2_VIEW = struct.Struct("!HHf")
+V2_FRAME = struct.Struct("!4sIIII")
+V2_MAX_PAYLOAD = 64 * 1024 * 1024
+
+OP_JSON = 0x00
+OP_MOVE = 0x01
+OP_RENDER = 0x02
+OP_ACK = 0x80
+OP_FRAME = 0x81
+OP_RESULT = 0x82
+OP_ERROR = 0x83
+
+# v2 reply flags
+FLAG_SUPERSEDED = 0x01  # OP_ACK for a move that was replaced by a newer one
+
+LEGACY_REQUEST = struct.Struct("<8f")
+LEGACY_NAME_LENGTH = struct.Struct("<I")
+
+MAX_LINE_BYTES = 16 * 1024 * 1024  # render_batch requests can be long lines
+
+POSE_KEYS = ("x", "y", "z", "pitch", "roll", "yaw")
+
+
+# A frame received over v2, e.g. by the render pool dispatcher relaying a worker's reply
+RelayedFrame = namedtuple('RelayedFrame', ['format', 'width', 'height', 'payload'])
+
+
+class ProtocolError(Exception):
+    """The client sent bytes that do not fit its protocol; the connection should be closed."""
+
+
+def payload_view(payload):
+    """Flat byte memoryview of a bytes object or NumPy buffer, without copying."""
+    view = memoryview(payload)
+    if view.ndim == 1 and view.format == 'B':
+        return view
+    return view.cast('B') if view.nbytes else memoryview(b'')
+
+
+def frame_header(frame):
+    """Packs the FRAME_HEADER describing an EncodedFrame."""
+    return FRAME_HEADER.pack(frame.format, frame.width, frame.height, memoryview(frame.payload).nbytes)
+
+
+def select_codec(prefix):
+    """
+    Picks the codec for a new connection from the first bytes received.
+    Returns None while there are not enough bytes to tell.
+    """
+    if not prefix:
+        return None
+    if prefix[:1] in (b"{", b" ", b"\t", b"\r", b"\n"):
+        return JsonLineCodec()
+    if len(prefix) < len(PROTOCOL_V2_MAGIC) and PROTOCOL_V2_MAGIC.startswith(prefix):
+        return None
+    if prefix.startswith(PROTOCOL_V2_MAGIC):
+        return BinaryV2Codec()
+    return LegacyFloatCodec()
+
+
+class JsonLineCodec:
+    """Newline-terminated JSON commands, the original protocol of the server."""
+
+    name = "json"
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scanned = 0  # bytes of _buffer already known to hold no newline
+
+    def feed(self, data):
+        self._buffer += data
+        commands = []
+        while True:
+            end = self._buffer.find(b"\n", self._scanned)
+            if end < 0:
+                self._scanned = len(self._buffer)
+                break
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end + 1]
+            self._scanned = 0
+            if not line.strip():
+                continue
+            try:
+                command = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                print("JSON decode error:", e)
+                continue
+            if not isinstance(command, dict):
+                print("Ignoring JSON message that is not an object:", command)
+                continue
+            commands.append(command)
+        if len(self._buffer) > MAX_LINE_BYTES:
+            raise ProtocolError(f"JSON line longer than {MAX_LINE_BYTES} bytes")
+        return commands
+
+    def take_output(self):
+        return b""
+
+    def encode_ack(self, request, text, flags=0):
+        return [text.encode("ascii") + b"\n"]
+
+    def encode_frame(self, request, frame, index=None, count=None):
+        parts = []
+        if index is not None:
+            parts.append(BATCH_FRAME_HEADER.pack(index, count))
+        if "encoding" in request:
+            parts.append(frame_header(frame))
+        else:
+            # Send the length of the data first (4-byte integer in network byte order)
+            parts.append(LENGTH_PREFIX.pack(memoryview(frame.payload).nbytes))
+        parts.append(payload_view(frame.payload))
+        return parts
+
+    def encode_result(self, request, result):
+        return [json.dumps(result).encode("utf-8") + b"\n"]
+
+    def encode_error(self, request, message):
+        # JSON clients never had error replies and would misread them as
+        # frames, so only requests that opt in get one
+        if not wants_error_reply(request):
+            return []
+        return [json.dumps({"error": message}).encode("utf-8") + b"\n"]
+
+
+def wants_error_reply(request):
+    """
+    Whether a JSON-lines request is answered with an {"error": ...} line when
+    it fails: requests that set "error_replies": true, and requests with a
+    "deadline_ms", since those can be dropped.
+    """
+    return request.get("error_replies") is True or "deadline_ms" in request
+
+
+class LegacyFloatCodec:
+    """
+    The fixed 32-byte float protocol of the original MATLAB server. Every
+    request becomes a move of the named object followed by a render from the
+    active camera. Moves are not acknowledged and frames are sent as raw RGBA.
+    """
+
+    name = "legacy"
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        commands = []
+        header_size = LEGACY_REQUEST.size + LEGACY_NAME_LENGTH.size
+        while len(self._buffer) >= header_size:
+            (name_length,) = LEGACY_NAME_LENGTH.unpack_from(self._buffer, LEGACY_REQUEST.size)
+            if name_length > 4096:
+                raise ProtocolError(f"Legacy object name of {name_length} bytes")
+            if len(self._buffer) < header_size + name_length:
+                break
+            width, height, *pose = LEGACY_REQUEST.unpack_from(self._buffer)
+            name = bytes(self._buffer[header_size:header_size + name_length]).decode("utf-8", "replace")
+            del self._buffer[:header_size + name_length]
+            commands.append(dict(zip(POSE_KEYS, pose), command="move", name=name))
+            commands.append({"command": "render", "resolution": [int(width), int(height)]})
+        return commands
+
+    def take_output(self):
+        return b""
+
+    def encode_ack(self, request, text, flags=0):
+        return []
+
+    def encode_frame(self, request, frame, index=None, count=None):
+        # The old server sent every Viewer Node channel; alpha is always opaque here
+        rgb = bytes(payload_view(frame.payload))
+        pixels = len(rgb) // 3
+        rgba = bytearray(b"\xff" * (pixels * 4))
+        for channel in range(3):
+            rgba[channel::4] = rgb[channel::3]
+        return [rgba]
+
+    def encode_result(self, request, result):
+        return []
+
+    def encode_error(self, request, message):
+        return []
+
+
+class BinaryV2Codec:
+    """Length-prefixed binary framing with request ids and opcodes."""
+
+    name = "v2"
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._output = bytearray()
+        self._greeted = False
+
+    def feed(self, data):
+        self._buffer += data
+        commands = []
+        if not self._greeted:
+            if len(self._buffer) < V2_HELLO.size:
+                return commands
+            magic, version = V2_HELLO.unpack_from(self._buffer)
+            del self._buffer[:V2_HELLO.size]
+            if magic != PROTOCOL_V2_MAGIC:
+                raise ProtocolError("Bad protocol v2 greeting")
+            # Answer with the version this server speaks; the client decides whether to go on
+            self._output += V2_HELLO.pack(PROTOCOL_V2_MAGIC, min(version, PROTOCOL_V2_VERSION))
+            self._greeted = True
+        while len(self._buffer) >= V2_HEADER.size:
+            length, opcode, flags, request_id = V2_HEADER.unpack_from(self._buffer)
+            if length > V2_MAX_PAYLOAD:
+                raise ProtocolError(f"v2 payload of {length} bytes")
+            end = V2_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            payload = bytes(self._buffer[V2_HEADER.size:end])
+            del self._buffer[:end]
+            try:
+                command = decode_v2_request(opcode, payload)
+            except ProtocolError as e:
+                # The framing is intact, so answer this request with an error and go on
+                command = {"command": None, "error": str(e)}
+            command["id"] = request_id
+            commands.append(command)
+        return commands
+
+    def take_output(self):
+        output = bytes(self._output)
+        self._output.clear()
+        return output
+
+    def encode_ack(self, request, text, flags=0):
+        payload = text.encode("ascii")
+        return [V2_HEADER.pack(len(payload), OP_ACK, flags, request.get("id", 0)), payload]
+
+    def encode_frame(self, request, frame, index=None, count=None):
+        view = payload_view(frame.payload)
+        header = V2_FRAME.pack(frame.format, frame.width, frame.height,
+                               index or 0, 1 if count is None else count)
+        return [V2_HEADER.pack(len(header) + len(view), OP_FRAME, 0, request.get("id", 0)) + header,
+                view]
+
+    def encode_result(self, request, result):
+        payload = json.dumps(result).encode("utf-8")
+        return [V2_HEADER.pack(len(payload), OP_RESULT, 0, request.get("id", 0)), payload]
+
+    def encode_error(self, request, message):
+        payload = str(message).encode("utf-8")
+        return [V2_HEADER.pack(len(payload), OP_ERROR, 0, request.get("id", 0)), payload]
+
+
+def _read_name(payload, offset):
+    (length,) = V2_NAME.unpack_from(payload, offset)
+    offset += V2_NAME.size
+    name = payload[offset:offset + length].decode("utf-8")
+    return name, offset + length
+
+
+def decode_v2_request(opcode, payload):
+    """Turns one v2 request payload into the same command dict the JSON protocol produces."""
+    try:
+        if opcode == OP_JSON:
+            command = json.loads(payload)
+            if not isinstance(command, dict):
+                raise ProtocolError("v2 JSON payload is not an object")
+            return command
+        if opcode == OP_MOVE:
+            name, offset = _read_name(payload, 0)
+            pose = V2_POSE.unpack_from(payload, offset)
+            return dict(zip(POSE_KEYS, pose), command="move", name=name)
+        if opcode == OP_RENDER:
+            camera, offset = _read_name(payload, 0)
+            pose = V2_POSE.unpack_from(payload, offset)
+            offset += V2_POSE.size
+            width, height, focal_length = V2_VIEW.unpack_from(payload, offset)
+            offset += V2_VIEW.size
+            command = json.loads(payload[offset:]) if len(payload) > offset else {}
+            if not isinstance(command, dict):
+                raise ProtocolError("v2 render options are not a JSON object")
+            command.update(zip(POSE_KEYS, pose), command="render", camera=camera)
+            if width and height:
+                command["resolution"] = [width, height]
+            if focal_length:
+                command["focal_length"] = focal_length
+            return command
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ProtocolError(f"Malformed v2 payload for opcode {opcode:#04x}: {e}")
+    raise ProtocolError(f"Unknown v2 opcode {opcode:#04x}")
+
+
+# === v2 client side (used by the render pool dispatcher) ===
+
+def encode_v2_request(request_id, command):
+    """Packs a command dict as an OP_JSON request."""
+    payload = json.dumps(command).encode("utf-8")
+    return V2_HEADER.pack(len(payload), OP_JSON, 0, request_id) + payload
+
+
+def decode_v2_frame(payload):
+    """Splits an OP_FRAME payload into (RelayedFrame, index, count)."""
+    fmt, width, height, index, count = V2_FRAME.unpack_from(payload)
+    return RelayedFrame(fmt, width, height, memoryview(payload)[V2_FRAME.size:]), index, count
+
+
+class V2MessageReader:
+    """Splits a v2 byte stream into (opcode, flags, request_id, payload) messages."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        messages = []
+        while len(self._buffer) >= V2_HEADER.size:
+            length, opcode, flags, request_id = V2_HEADER.unpack_from(self._buffer)
+            end = V2_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            messages.append((opcode, flags, request_id, bytes(self._buffer[V2_HEADER.size:end])))
+            del self._buffer[:end]
+        return messages
@@ -0,0 +1,81 @@
+"""
+Content-addressed cache of encoded render results.
+
+A key describes everything that decides what a render looks like: camera,
+pose, resolution, focal length, encoding, per-request render settings and the
+scene version at the time of the request. Poses are quantized so float noise from clients does not defeat
+the cache. Entries are evicted least-recently-used first once the total size
+of the cached payloads exceeds max_bytes.
+
+The cache is only touched from Blender's main thread and is not locked.
+"""
+
+from collections import OrderedDict
+
+
+class RenderCache:
+    def __init__(self, max_bytes, position_quantum=1e-4, angle_quantum=1e-3):
+        self.max_bytes = max_bytes
+        self.position_quantum = position_quantum
+        self.angle_quantum = angle_quantum
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def quantize_pose(self, pose):
+        """Rounds (x, y, z, pitch, roll, yaw) to the cache's quanta; None stays None."""
+        if pose is None:
+            return None
+        x, y, z, pitch, roll, yaw = pose
+        return (tuple(round(float(v) / self.position_quantum) for v in (x, y, z)) +
+                tuple(round(float(v) / self.angle_quantum) for v in (pitch, roll, yaw)))
+
+    def make_key(self, camera, pose, resolution, focal_length, encoding, scene_version, settings=()):
+        return (camera, self.quantize_pose(pose), tuple(resolution), focal_length,
+                encoding, settings, scene_version)
+
+    def get(self, key):
+        """Returns the cached value for key (marking it recently used) or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, nbytes):
+        """Stores value under key, evicting old entries to stay within max_bytes."""
+        if not self.enabled or nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self._entries[key] = (value, nbytes)
+        self.total_bytes += nbytes
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
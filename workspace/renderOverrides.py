@@ -0,0 +1,108 @@
+"""
+Per-request render settings: fast previews and region-of-interest crops.
+
+Optional render request fields:
+
+    "engine"                 "cycles", "eevee", "workbench" or a Blender engine id
+                             such as "BLENDER_EEVEE_NEXT"
+    "samples"                render samples for Cycles or EEVEE (ignored by Workbench)
+    "resolution_percentage"  1-100, scales the render resolution
+    "crop"                   [x_min, y_min, x_max, y_max] in 0-1, measured from the
+                             bottom-left corner like Blender's render border. Only
+                             that region is rendered and sent back.
+
+apply_overrides() sets them on the scene for one render and puts every
+changed value back afterwards, so other requests see the scene's own settings.
+"""
+
+from contextlib import contextmanager
+
+OVERRIDE_KEYS = ("engine", "samples", "resolution_percentage", "crop")
+
+# Engine ids differ between Blender versions; the first one the scene accepts is used
+ENGINE_ALIASES = {
+    "cycles": ("CYCLES",),
+    "eevee": ("BLENDER_EEVEE_NEXT", "BLENDER_EEVEE"),
+    "workbench": ("BLENDER_WORKBENCH",),
+}
+
+
+def parse_overrides(request):
+    """
+    Returns the validated override fields of a request as a dict (empty if it
+    sets none). Raises ValueError for invalid values.
+    """
+    overrides = {}
+    engine = request.get("engine")
+    if engine is not None:
+        if not isinstance(engine, str) or not engine:
+            raise ValueError(f"Invalid engine {engine!r}")
+        overrides["engine"] = ENGINE_ALIASES.get(engine.lower(), (engine.upper(),))
+    samples = request.get("samples")
+    if samples is not None:
+        if isinstance(samples, bool) or not isinstance(samples, int) or samples < 1:
+            raise ValueError(f"samples must be a positive integer, got {samples!r}")
+        overrides["samples"] = samples
+    percentage = request.get("resolution_percentage")
+    if percentage is not None:
+        if isinstance(percentage, bool) or not isinstance(percentage, (int, float)) or not 1 <= percentage <= 100:
+            raise ValueError(f"resolution_percentage must be between 1 and 100, got {percentage!r}")
+        overrides["resolution_percentage"] = int(percentage)
+    crop = request.get("crop")
+    if crop is not None:
+        try:
+            x_min, y_min, x_max, y_max = (float(v) for v in crop)
+        except (TypeError, ValueError):
+            raise ValueError(f"crop must be [x_min, y_min, x_max, y_max], got {crop!r}")
+        if not (0.0 <= x_min < x_max <= 1.0 and 0.0 <= y_min < y_max <= 1.0):
+            raise ValueError(f"crop must be an increasing region within 0-1, got {crop!r}")
+        overrides["crop"] = (x_min, y_min, x_max, y_max)
+    return overrides
+
+
+def overrides_key(overrides):
+    """A hashable form of parsed overrides, for render cache keys."""
+    return tuple(sorted(overrides.items()))
+
+
+@contextmanager
+def apply_overrides(scene, overrides):
+    """Applies parsed overrides to the scene and restores the previous values on exit."""
+    saved = []  # (owner, attribute, previous value), restored in reverse order
+
+    def set_value(owner, attribute, value):
+        previous = getattr(owner, attribute)
+        if previous != value:
+            setattr(owner, attribute, value)
+            saved.append((owner, attribute, previous))
+
+    render = scene.render
+    try:
+        if "engine" in overrides:
+            for engine in overrides["engine"]:
+                try:
+                    set_value(render, "engine", engine)
+                    break
+                except TypeError:
+                    continue  # not an engine of this Blender version
+            else:
+                raise ValueError(f"Unknown render engine {overrides['engine'][0]!r}")
+        if "samples" in overrides:
+            if render.engine == 'CYCLES':
+                set_value(scene.cycles, "samples", overrides["samples"])
+            elif render.engine.startswith('BLENDER_EEVEE'):
+                set_value(scene.eevee, "taa_render_samples", overrides["samples"])
+        if "resolution_percentage" in overrides:
+            set_value(render, "resolution_percentage", overrides["resolution_percentage"])
+        if "crop" in overrides:
+            x_min, y_min, x_max, y_max = overrides["crop"]
+            set_value(render, "use_border", True)
+            set_value(render, "use_crop_to_border", True)
+            set_value(render, "border_min_x", x_min)
+            set_value(render, "border_min_y", y_min)
+            set_value(render, "border_max_x", x_max)
+            set_value(render, "border_max_y", y_max)
+        yield
+    finally:
+        for owner, attribute, previous in reversed(saved):
+            setattr(owner, attribute, previous)
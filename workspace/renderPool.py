@@ -0,0 +1,555 @@
+"""
+Render pool: one dispatcher in front of several headless Blender workers.
+
+The dispatcher listens where a single Blender server would (port 55001) and
+speaks the same protocols, so clients do not change how they connect. It
+starts N `blender -b tennisCourt.blend --python blenderServer.py` workers on
+local ports and talks to each of them over protocol v2.
+
+    move               broadcast to every worker so they all hold the same
+                       scene state; acknowledged once every worker has applied it
+    render, others     sent to the worker with the fewest requests in flight;
+                       the views of a render_multi stay together on one worker
+    ready, stats       answered by the dispatcher from every worker's reply: ready
+                       once all workers are warmed up, stats per worker plus the pool
+    pool_stats         answered by the dispatcher: per-worker load and utilization
+    subscribe          not supported; camera streams need a single Blender server
+
+Each worker connection is FIFO, and moves are sent to all workers before any
+later render is dispatched, so a render always sees the moves its client
+sent before it. Replies are written to each client in request order even
+when workers finish out of order.
+
+A worker whose process exits or whose connection drops fails the requests it
+had in flight and is started again after RESTART_DELAY; it gets the newest
+move of every object before any render. /ready and /metrics on --status-port
+report the whole pool.
+
+Only the standard library is needed, so this runs under the system python3:
+
+    python3 renderPool.py --workers 4
+"""
+
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import commandLog
+import networkServer
+import protocol
+
+BLENDER_BIN = os.environ.get("BLENDER_BIN", "blender")
+WORKSPACE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BLEND_FILE = os.path.join(WORKSPACE, "tennisCourt.blend")
+WORKER_BASE_PORT = 55101
+CONNECT_TIMEOUT = 180.0  # Blender needs a while to start and load the scene
+RESTART_DELAY = 5.0
+QUERY_TIMEOUT = 10.0  # for ready/stats queries answered by every worker
+DEFAULT_STATUS_PORT = 9464
+READ_CHUNK = 256 * 1024
+BROADCAST_COMMANDS = {"move"}
+# Pushed frames arrive after the request is complete, which the dispatcher cannot relay;
+# handles are numbered by each worker on its own, so they would not agree across workers
+UNSUPPORTED_COMMANDS = {"subscribe", "unsubscribe", "handles"}
+# Replies of these are a sequence of frames, each carrying its index and the frame count
+MULTI_FRAME_COMMANDS = {"render_batch", "render_multi"}
+
+
+class Worker:
+    """One Blender worker process and the v2 connection to it."""
+
+    def __init__(self, index, port, spawn):
+        self.index = index
+        self.port = port
+        self.spawn = spawn  # () -> subprocess.Popen of a new worker process
+        self.process = None
+        self.restarts = 0
+        self.alive = False
+        self.lost = asyncio.Event()  # set when the connection drops
+        self.inflight = 0
+        self.completed = 0
+        self.busy_time = 0.0
+        self._busy_since = None
+        self._ids = itertools.count(1)
+        self._handlers = {}  # request id -> on_message callback
+        self.reader = None
+        self.writer = None
+        self._reader_task = None
+
+    async def connect(self):
+        """Waits for the worker to listen, then performs the v2 handshake."""
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while True:
+            if self.process is not None and self.process.poll() is not None:
+                raise RuntimeError(f"Worker {self.index} exited with code {self.process.returncode}")
+            try:
+                self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.5)
+        self.writer.write(protocol.V2_HELLO.pack(protocol.PROTOCOL_V2_MAGIC, protocol.PROTOCOL_V2_VERSION))
+        magic, version = protocol.V2_HELLO.unpack(await self.reader.readexactly(protocol.V2_HELLO.size))
+        if magic != protocol.PROTOCOL_V2_MAGIC:
+            raise RuntimeError(f"Worker {self.index} did not answer the v2 handshake")
+        self.alive = True
+        self.lost.clear()
+        print(f"Worker {self.index} ready on port {self.port} (protocol v{version})")
+        self._reader_task = asyncio.ensure_future(self._read_replies())
+
+    def request(self, command, on_message):
+        """
+        Sends a command to the worker. on_message(opcode, flags, payload) is
+        called for every reply to it and returns True once the request is
+        complete.
+        """
+        if not self.alive:
+            raise ConnectionError(f"Worker {self.index} is not connected")
+        request_id = next(self._ids)
+        self._handlers[request_id] = on_message
+        if self.inflight == 0:
+            self._busy_since = time.monotonic()
+        self.inflight += 1
+        self.writer.write(protocol.encode_v2_request(request_id, command))
+
+    def _finish(self):
+        self.inflight -= 1
+        self.completed += 1
+        if self.inflight == 0:
+            self.busy_time += time.monotonic() - self._busy_since
+
+    async def _read_replies(self):
+        decoder = protocol.V2MessageReader()
+        try:
+            while True:
+                data = await self.reader.read(READ_CHUNK)
+                if not data:
+                    break
+                for opcode, flags, request_id, payload in decoder.feed(data):
+                    handler = self._handlers.get(request_id)
+                    if handler is not None and handler(opcode, flags, payload):
+                        del self._handlers[request_id]
+                        self._finish()
+        except ConnectionError:
+            pass
+        finally:
+            self.alive = False
+            print(f"Lost connection to worker {self.index}")
+            handlers, self._handlers = self._handlers, {}
+            for handler in handlers.values():
+                handler(protocol.OP_ERROR, 0, b"Render worker exited")
+                self._finish()
+            self.lost.set()
+
+    def stop(self):
+        """Terminates the worker process if it is still running."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def stats(self, now):
+        busy = self.busy_time + (now - self._busy_since if self.inflight else 0.0)
+        return {
+            "index": self.index,
+            "port": self.port,
+            "alive": self.alive,
+            "restarts": self.restarts,
+            "inflight": self.inflight,
+            "completed": self.completed,
+            "busy_seconds": busy,
+        }
+
+
+class OrderedReplies:
+    """
+    Writes replies to one client in request order, even when workers finish
+    out of order. A command counts as in flight (NetworkServer max_inflight)
+    until its reply has been written, so a client that does not read its
+    replies stops being read from instead of piling them up here.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.failed = False
+        self._slots = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._run())
+
+    def open_slot(self):
+        """Reserves the next place in the reply order; put byte-part lists on it, then None."""
+        slot = asyncio.Queue()
+        self._slots.put_nowait(slot)
+        return slot
+
+    async def _run(self):
+        while True:
+            slot = await self._slots.get()
+            while True:
+                parts = await slot.get()
+                if parts is None:
+                    break
+                if not self.conn.closed and not self.failed:
+                    try:
+                        await self.conn.write_parts(parts)
+                    except ConnectionError:
+                        # Skip the rest right away; the connection closes on the next loop turn
+                        self.failed = True
+                        self.conn.close()
+            self.conn.command_done()
+
+
+class RenderPool:
+    """Dispatches client commands across the workers; runs on the network server's event loop."""
+
+    def __init__(self, recorder=None):
+        self.workers = []
+        self.recorder = recorder  # commandLog.CommandRecorder, or None
+        self.started = time.monotonic()
+        self.ready = asyncio.Event()
+        self.stopping = False
+        self._replies = {}  # conn -> OrderedReplies
+        self._tasks = set()
+        self._supervisors = []
+        self._moves = {}  # object name -> newest broadcast move, replayed to restarted workers
+
+    async def start(self, workers):
+        self.workers = workers
+        attempted = [asyncio.Event() for _ in workers]
+        for worker, event in zip(workers, attempted):
+            self._supervisors.append(asyncio.ensure_future(self._supervise(worker, event)))
+        for event in attempted:
+            await event.wait()
+        self.ready.set()
+
+    async def _supervise(self, worker, attempted):
+        """Starts a worker, and starts it again whenever it exits or its connection drops."""
+        while not self.stopping:
+            worker.process = worker.spawn()
+            try:
+                await worker.connect()
+            except Exception as e:
+                print(f"Worker {worker.index} failed to start: {e}")
+            else:
+                # Before any render can reach it, so it holds the same scene as the others
+                for move in self._moves.values():
+                    worker.request(move, lambda opcode, flags, payload: True)
+                attempted.set()
+                await worker.lost.wait()
+            attempted.set()
+            worker.stop()
+            if self.stopping:
+                break
+            worker.restarts += 1
+            print(f"Restarting worker {worker.index} in {RESTART_DELAY:g}s")
+            await asyncio.sleep(RESTART_DELAY)
+            if worker.process.poll() is None:
+                worker.process.kill()
+
+    def stop(self):
+        """Stops restarting workers and terminates their processes."""
+        self.stopping = True
+        for task in self._supervisors:
+            task.cancel()
+        for worker in self.workers:
+            worker.stop()
+
+    # --- NetworkServer callbacks ---
+
+    def on_command(self, conn, command):
+        if self.recorder is not None:
+            # Recorded here rather than on the workers, which see the fanned-out moves
+            self.recorder.record(conn, command)
+        replies = self._replies.get(conn)
+        if replies is None:
+            replies = self._replies[conn] = OrderedReplies(conn)
+        task = asyncio.ensure_future(self._dispatch(conn, command, replies.open_slot()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def on_disconnect(self, conn):
+        replies = self._replies.pop(conn, None)
+        if replies is not None:
+            replies.task.cancel()
+
+    # --- dispatching ---
+
+    async def _dispatch(self, conn, command, slot):
+        try:
+            await self.ready.wait()
+            cmd_type = command.get("command")
+            # The dispatcher numbers worker requests itself
+            forwarded = {k: v for k, v in command.items() if k != "id"}
+            live = [worker for worker in self.workers if worker.alive]
+            if cmd_type == "pool_stats":
+                slot.put_nowait(conn.codec.encode_result(command, self.stats()))
+            elif cmd_type == "ready":
+                slot.put_nowait(conn.codec.encode_result(command, await self.readiness()))
+            elif cmd_type == "stats" and command.get("format") == "prometheus":
+                text = await self.prometheus_metrics()
+                slot.put_nowait(conn.codec.encode_result(command, {"format": "prometheus", "text": text}))
+            elif cmd_type == "stats":
+                slot.put_nowait(conn.codec.encode_result(command, await self.worker_stats()))
+            elif cmd_type in UNSUPPORTED_COMMANDS:
+                slot.put_nowait(conn.codec.encode_error(command, f"'{cmd_type}' is not supported by the render pool"))
+            elif "handle" in command or "handles" in command:
+                slot.put_nowait(conn.codec.encode_error(command, "Handles are not supported by the render pool"))
+            elif not live:
+                slot.put_nowait(conn.codec.encode_error(command, "No render workers available"))
+            elif cmd_type in BROADCAST_COMMANDS:
+                await self._broadcast(conn, command, forwarded, slot, live)
+            elif cmd_type == "render_batch" and not command.get("frames"):
+                pass  # nothing to render, and workers send nothing back for it
+            else:
+                worker = min(live, key=lambda w: w.inflight)
+                await self._forward(conn, command, forwarded, slot, worker)
+        except Exception as e:
+            print(f"Error dispatching '{command.get('command')}':", e)
+            slot.put_nowait(conn.codec.encode_error(command, str(e)))
+        finally:
+            slot.put_nowait(None)
+
+    async def _broadcast(self, conn, command, forwarded, slot, workers):
+        """Applies a scene change on every worker and acknowledges it once all have."""
+        loop = asyncio.get_running_loop()
+        # Always ask for superseded acks so every worker answers every move
+        forwarded["superseded_ack"] = True
+        self._moves[forwarded.get("name")] = forwarded
+        futures = []
+        for worker in workers:
+            future = loop.create_future()
+
+            def on_message(opcode, flags, payload, future=future):
+                if not future.done():
+                    future.set_result((opcode, flags, payload))
+                return True
+
+            worker.request(forwarded, on_message)
+            futures.append(future)
+        for worker in workers:
+            await worker.writer.drain()
+        opcode, flags, payload = (await asyncio.gather(*futures))[0]
+        if opcode != protocol.OP_ACK:
+            slot.put_nowait(conn.codec.encode_error(command, payload.decode("utf-8", "replace")))
+        elif flags & protocol.FLAG_SUPERSEDED and not command.get("superseded_ack", True):
+            pass
+        else:
+            slot.put_nowait(conn.codec.encode_ack(command, payload.decode("ascii"), flags))
+
+    async def _forward(self, conn, command, forwarded, slot, worker):
+        """Sends a command to one worker and relays its replies to the client."""
+        done = asyncio.get_running_loop().create_future()
+        batch = command.get("command") in MULTI_FRAME_COMMANDS
+
+        def on_message(opcode, flags, payload):
+            finished = True
+            if opcode == protocol.OP_FRAME:
+                frame, index, count = protocol.decode_v2_frame(payload)
+                if batch:
+                    slot.put_nowait(conn.codec.encode_frame(command, frame, index, count))
+                    finished = index + 1 >= count
+                else:
+                    slot.put_nowait(conn.codec.encode_frame(command, frame))
+            elif opcode == protocol.OP_ACK:
+                slot.put_nowait(conn.codec.encode_ack(command, payload.decode("ascii"), flags))
+            elif opcode == protocol.OP_RESULT:
+                slot.put_nowait(conn.codec.encode_result(command, json.loads(payload)))
+            else:
+                slot.put_nowait(conn.codec.encode_error(command, payload.decode("utf-8", "replace")))
+            if finished and not done.done():
+                done.set_result(None)
+            return finished
+
+        worker.request(forwarded, on_message)
+        await worker.writer.drain()
+        await done
+
+    async def _query(self, worker, command):
+        """One worker's JSON result for a command, or None if it is down or does not answer."""
+        if not worker.alive:
+            return None
+        future = asyncio.get_running_loop().create_future()
+
+        def on_message(opcode, flags, payload):
+            if not future.done():
+                future.set_result(json.loads(payload) if opcode == protocol.OP_RESULT else None)
+            return True
+
+        try:
+            worker.request(command, on_message)
+            await worker.writer.drain()
+            return await asyncio.wait_for(future, QUERY_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError):
+            return None
+
+    async def _query_all(self, command):
+        return await asyncio.gather(*(self._query(worker, command) for worker in self.workers))
+
+    async def readiness(self):
+        """Ready once every worker is up and has finished its warm-up."""
+        results = await self._query_all({"command": "ready"})
+        workers = [{"index": worker.index, "alive": worker.alive,
+                    "ready": bool(result and result.get("ready")),
+                    "warmup": result.get("warmup") if result else None}
+                   for worker, result in zip(self.workers, results)]
+        return {"ready": bool(workers) and all(entry["ready"] for entry in workers), "workers": workers}
+
+    async def worker_stats(self):
+        """The stats of every worker (None for a worker that is down) and the pool's own."""
+        results = await self._query_all({"command": "stats"})
+        return {"pool": self.stats(), "workers": [{"index": worker.index, "stats": result}
+                                                  for worker, result in zip(self.workers, results)]}
+
+    async def prometheus_metrics(self):
+        """Every worker's metrics with a worker label, followed by the pool gauges."""
+        results = await self._query_all({"command": "stats", "format": "prometheus"})
+        texts = {worker.index: result["text"] for worker, result in zip(self.workers, results)
+                 if result and "text" in result}
+        stats = self.stats()
+        gauges = {
+            "render_pool_workers": len(self.workers),
+            "render_pool_workers_alive": sum(1 for entry in stats["workers"] if entry["alive"]),
+            "render_pool_worker_restarts_total": sum(entry["restarts"] for entry in stats["workers"]),
+        }
+        lines = merge_prometheus(texts)
+        for name, value in gauges.items():
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        now = time.monotonic()
+        uptime = now - self.started
+        workers = [worker.stats(now) for worker in self.workers]
+        for entry in workers:
+            entry["utilization"] = entry["busy_seconds"] / uptime if uptime else 0.0
+        return {"uptime": uptime, "workers": workers}
+
+
+def merge_prometheus(texts):
+    """
+    Merges the Prometheus texts of several workers ({worker index: text})
+    into one list of lines: every sample gets a worker label, and the samples
+    of one metric stay together under a single TYPE line.
+    """
+    families = {}  # TYPE line -> sample lines, in first-seen order
+    for index, text in sorted(texts.items()):
+        family = families.setdefault(None, [])
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                family = families.setdefault(line, [])
+            elif line and not line.startswith("#"):
+                name, _, value = line.rpartition(" ")
+                label = f'worker="{index}"'
+                name = name[:-1] + f",{label}}}" if name.endswith("}") else f"{name}{{{label}}}"
+                family.append(f"{name} {value}")
+    lines = []
+    for type_line, samples in families.items():
+        if type_line is not None:
+            lines.append(type_line)
+        lines += samples
+    return lines
+
+
+def spawn_worker(index, blend_file, port, worker_args):
+    command = [BLENDER_BIN, "-b", blend_file, "--python", os.path.join(WORKSPACE, "blenderServer.py"),
+               "--", "--host", "127.0.0.1", "--port", str(port),
+               # Workers share the host; their metrics are reachable through the stats command
+               "--status-port", "0"] + worker_args
+    print(f"Starting worker {index}: {' '.join(command)}")
+    return subprocess.Popen(command)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Dispatch render requests across headless Blender workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=55001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--blend-file", default=DEFAULT_BLEND_FILE)
+    parser.add_argument("--worker-base-port", type=int, default=WORKER_BASE_PORT)
+    parser.add_argument("--max-inflight", type=int, default=networkServer.DEFAULT_MAX_INFLIGHT,
+                        help="commands per client whose replies have not been written yet")
+    parser.add_argument("--status-port", type=int, default=DEFAULT_STATUS_PORT,
+                        help="HTTP port for the pool's /metrics and /ready, 0 to disable")
+    parser.add_argument("--coalesce", action="store_true", help="coalesce queued moves on the workers")
+    parser.add_argument("--no-warmup", action="store_true", help="skip the workers' warm-up renders")
+    parser.add_argument("--record", metavar="PATH", help="record the commands clients send, see replay.py")
+    parser.add_argument("--mqtt-host", help="let every worker take tracker poses from this MQTT broker")
+    parser.add_argument("--mqtt-port", type=int)
+    parser.add_argument("--mqtt-topic", action="append", default=[])
+    parser.add_argument("--mqtt-map", action="append", default=[], metavar="TRACKER=OBJECT")
+    parser.add_argument("--mqtt-filter", action="store_true")
+    return parser.parse_args(argv)
+
+
+def mqtt_worker_args(args):
+    """The blenderServer.py options that make each worker subscribe to the poses itself."""
+    if not args.mqtt_host:
+        return []
+    worker_args = ["--mqtt-host", args.mqtt_host]
+    if args.mqtt_port:
+        worker_args += ["--mqtt-port", str(args.mqtt_port)]
+    for topic in args.mqtt_topic:
+        worker_args += ["--mqtt-topic", topic]
+    for entry in args.mqtt_map:
+        worker_args += ["--mqtt-map", entry]
+    if args.mqtt_filter:
+        worker_args.append("--mqtt-filter")
+    return worker_args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    worker_args = ((["--coalesce"] if args.coalesce else []) + (["--no-warmup"] if args.no_warmup else [])
+                   + mqtt_worker_args(args))
+    recorder = commandLog.CommandRecorder(args.record) if args.record else None
+    pool = RenderPool(recorder)
+
+    async def ready_route():
+        if (await pool.readiness())["ready"]:
+            return 200, "text/plain", "ready\n"
+        return 503, "text/plain", "warming up\n"
+
+    async def metrics_route():
+        return 200, "text/plain; version=0.0.4", await pool.prometheus_metrics()
+
+    server = networkServer.NetworkServer(pool.on_command, args.host, args.port, max_inflight=args.max_inflight,
+                                         on_disconnect=pool.on_disconnect, status_port=args.status_port,
+                                         status_routes={"/ready": ready_route, "/metrics": metrics_route})
+    # docker stop sends SIGTERM; turn it into a normal exit so the workers are stopped too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    workers = []
+    try:
+        for index in range(args.workers):
+            port = args.worker_base_port + index
+            workers.append(Worker(index, port, functools.partial(
+                spawn_worker, index, args.blend_file, port, worker_args)))
+        server.start()
+        asyncio.run_coroutine_threadsafe(pool.start(workers), server.loop)
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server.loop is not None:
+            server.loop.call_soon_threadsafe(pool.stop)
+        server.stop()
+        if recorder:
+            recorder.close()
+        processes = [worker.process for worker in workers if worker.process is not None]
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Replays a command recording (commandLog.py, made with blenderServer.py
+--record) into a running server, so a production session can be rerun as a
+load test or re-rendered offline.
+
+Every recorded client gets its own protocol v2 connection and sends its
+commands in the recorded order, each no earlier than its recorded arrival
+time divided by --speed (0: as fast as possible). Like the original
+clients, a connection waits for each reply before sending its next command,
+so a slower server falls behind the schedule; how far is reported as lag.
+Stream commands (subscribe, unsubscribe) are skipped.
+
+    python3 replay.py /tmp/session --port 55001 --speed 4
+    python3 replay.py /tmp/session --fake --render-ms 20 --speed 0
+
+With --fake the server runs in a child process on fakeBpy, like benchmark.py.
+The result is printed as JSON in the benchmark's format, plus lag figures.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+import commandLog
+from benchmark import (REPLY_TIMEOUT, V2Client, fetch_server_stats, free_port, percentile, run_server, summarize,
+                       wait_for_server)
+
+SKIPPED_COMMANDS = ("subscribe", "unsubscribe")
+
+
+def scene_names(log):
+    """(object names, camera names) referenced by the recording's records."""
+    records = log.records
+    has_name = records["name"] != commandLog.NO_NAME
+    is_camera = (records["flags"] & commandLog.FLAG_CAMERA) != 0
+    objects = sorted({log.names[i] for i in np.unique(records["name"][has_name & ~is_camera])})
+    cameras = sorted({log.names[i] for i in np.unique(records["name"][has_name & is_camera])})
+    return objects, cameras
+
+
+async def replay_client(log, indices, host, port, speed, started, samples):
+    """Sends one recorded client's commands on schedule, waiting for each reply."""
+    client = V2Client()
+    await client.connect(port, host)
+    try:
+        for index in indices:
+            command = log.command(index)
+            if command["command"] in SKIPPED_COMMANDS:
+                continue
+            scheduled = started + (float(log.records["t"][index]) / speed if speed else 0.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent = time.perf_counter()
+            received, error = await asyncio.wait_for(client.request(command), REPLY_TIMEOUT)
+            samples.append((command["command"], time.perf_counter() - sent, received, error,
+                            max(0.0, sent - scheduled)))
+    finally:
+        client.close()
+
+
+async def replay(log, host, port, speed):
+    clients = log.records["client"]
+    samples = []
+    started = time.perf_counter()
+    await asyncio.gather(*(replay_client(log, np.flatnonzero(clients == client), host, port, speed,
+                                         started, samples)
+                           for client in np.unique(clients)))
+    duration = max(time.perf_counter() - started, 1e-9)
+    lags = sorted(sample[4] for sample in samples)
+    kinds = sorted({sample[0] for sample in samples})
+    return {
+        "recording": {"path": log.path, "commands": len(log), "duration": log.duration,
+                      "clients": int(len(np.unique(clients)))},
+        "speed": speed,
+        "duration": duration,
+        "skipped": len(log) - len(samples),
+        "lag_p50": percentile(lags, 0.50),
+        "lag_max": lags[-1] if lags else 0.0,
+        "total": summarize(samples, duration),
+        "commands": {kind: summarize([s for s in samples if s[0] == kind], duration) for kind in kinds},
+        "server": await fetch_server_stats(port, host),
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replay a blenderServer.py command recording.")
+    parser.add_argument("recording", help="recording path, without the .rec/.names/.extra suffix")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=55001)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed as a multiple of real time, 0 for as fast as possible")
+    parser.add_argument("--fake", action="store_true", help="replay into a fakeBpy server in a child process")
+    parser.add_argument("--render-ms", type=float, default=20.0, help="synthetic render cost with --fake")
+    parser.add_argument("--server-log", action="store_true", help="show the --fake server's output")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args(argv)
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+    return args
+
+
+async def run(args, log):
+    if not args.fake:
+        return await replay(log, args.host, args.port, args.speed)
+    objects, cameras = scene_names(log)
+    port = free_port()
+    # benchmark.run_server with the recording's objects and cameras, falling back to Ball and Camera
+    options = {"render_ms": args.render_ms, "render_ms_per_mpixel": 0.0, "objects": objects, "cameras": cameras,
+               "object": "Ball", "camera": "Camera", "cache": True, "coalesce": False, "server_log": args.server_log}
+    # spawn, so the child imports the fake bpy into a clean interpreter
+    process = multiprocessing.get_context("spawn").Process(target=run_server, args=(port, options), daemon=True)
+    process.start()
+    try:
+        await wait_for_server(port, process)
+        return await replay(log, '127.0.0.1', port, args.speed)
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    log = commandLog.CommandLog(args.recording)
+    try:
+        result = asyncio.run(run(args, log))
+    finally:
+        log.close()
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Integer handles for scene objects and packed scene snapshots.
+
+A handle stands for an object name. It is resolved to the Blender object
+once and the reference is kept, so commands that use handles skip the name
+lookup. Every use checks that the object still exists under that name; a
+handle whose object was removed or renamed is dropped, and all handles are
+dropped when another .blend file is loaded (invalidate()). Handle numbers
+are never reused, so a stale handle fails instead of addressing another object.
+
+A snapshot is one float32 array (little-endian), SNAPSHOT_FIELDS per object:
+handle, location, rotation in degrees (pitch, roll, yaw, the order move
+takes them) and focal length (NaN for anything but a camera).
+"""
+
+import math
+
+import numpy as np
+
+SNAPSHOT_FORMAT = b"SNAP"
+SNAPSHOT_FIELDS = ("handle", "x", "y", "z", "pitch", "roll", "yaw", "focal_length")
+SNAPSHOT_DTYPE = np.dtype("<f4")
+
+
+def _is_alive(obj, name):
+    try:
+        return obj.name == name
+    except ReferenceError:
+        # Blender raises this for objects that have been deleted
+        return False
+
+
+class HandleRegistry:
+    def __init__(self, objects):
+        self._objects = objects  # () -> the name -> object mapping, bpy.data.objects
+        self._handles = {}  # name -> handle
+        self._names = {}  # handle -> name
+        self._cached = {}  # handle -> object
+        self._next_handle = 1
+        self.generation = 0  # bumped by invalidate()
+
+    def __len__(self):
+        return len(self._names)
+
+    def handle(self, name):
+        """The handle for an object name, registering it; None if there is no such object."""
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle if self.resolve(handle) is not None else None
+        obj = self._objects().get(name)
+        if obj is None:
+            return None
+        handle = self._next_handle
+        self._next_handle += 1
+        self._handles[name] = handle
+        self._names[handle] = name
+        self._cached[handle] = obj
+        return handle
+
+    def resolve(self, handle):
+        """The object of a handle, or None if the handle is unknown or its object is gone."""
+        name = self._names.get(handle)
+        if name is None:
+            return None
+        obj = self._cached[handle]
+        if _is_alive(obj, name):
+            return obj
+        obj = self._objects().get(name)
+        if obj is None:
+            self._drop(handle)
+            return None
+        # Same name, new object (e.g. undo); keep the handle
+        self._cached[handle] = obj
+        return obj
+
+    def lookup(self, name):
+        """Object by name through the handle cache; None if missing."""
+        handle = self.handle(name)
+        return None if handle is None else self._cached[handle]
+
+    def _drop(self, handle):
+        name = self._names.pop(handle)
+        del self._handles[name]
+        del self._cached[handle]
+
+    def invalidate(self):
+        """Drops every handle, e.g. after another .blend file was loaded."""
+        self._handles.clear()
+        self._names.clear()
+        self._cached.clear()
+        self.generation += 1
+
+    def all_handles(self):
+        """Handles for every object in the scene, registering new ones."""
+        return {name: self.handle(name) for name in list(self._objects().keys())}
+
+    def stats(self):
+        return {"handles": len(self._names), "generation": self.generation}
+
+
+def snapshot_array(entries):
+    """Packs [(handle, object), ...] into an (n, len(SNAPSHOT_FIELDS)) float32 array."""
+    snapshot = np.empty((len(entries), len(SNAPSHOT_FIELDS)), dtype=SNAPSHOT_DTYPE)
+    for row, (handle, obj) in zip(snapshot, entries):
+        location = obj.location
+        rotation = obj.rotation_euler
+        lens = obj.data.lens if obj.type == 'CAMERA' else math.nan
+        row[:] = (handle, location[0], location[1], location[2],
+                  math.degrees(rotation[0]), math.degrees(rotation[1]), math.degrees(rotation[2]), lens)
+    return snapshot
@@ -0,0 +1,132 @@
+"""
+In-process latency histograms and counters for the Blender render server.
+
+Every command is timed per stage (queue_wait, xform, render, readback,
+encode, send, total) into a Histogram with fixed log-spaced buckets, so
+recording is a bisect and a few additions and can stay on in production.
+Percentiles are estimated from the buckets, which are about 20% wide.
+
+Recording happens on Blender's main thread; snapshots may be taken from the
+network thread (the /metrics endpoint) and can be off by the sample being
+recorded at that moment, which is fine for monitoring.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+
+# Bucket upper bounds from 10 us to ~100 s, growing by 20% per bucket
+BUCKET_BOUNDS = tuple(1e-5 * 1.2 ** i for i in range(int(math.log(1e7) / math.log(1.2)) + 2))
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Estimates the q-quantile by interpolating inside the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+                upper = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(estimate, self.max)
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self):
+        summary = {"count": self.count,
+                   "mean": self.total / self.count if self.count else 0.0,
+                   "max": self.max}
+        for q in PERCENTILES:
+            summary[f"p{int(q * 100)}"] = self.percentile(q)
+        return summary
+
+
+class ServerMetrics:
+    """Per-command stage histograms plus command, error and byte counters."""
+
+    def __init__(self):
+        self._stages = {}  # (command, stage) -> Histogram
+        self._counters = {}  # command -> {"count": n, "errors": n, "bytes_sent": n}
+        self._lock = threading.Lock()
+
+    def _histogram(self, command, stage):
+        key = (command, stage)
+        histogram = self._stages.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(key, Histogram())
+        return histogram
+
+    def _counter(self, command):
+        counters = self._counters.get(command)
+        if counters is None:
+            with self._lock:
+                counters = self._counters.setdefault(command, {"count": 0, "errors": 0, "bytes_sent": 0})
+        return counters
+
+    def observe(self, command, stage, seconds):
+        self._histogram(command, stage).record(seconds)
+
+    def count_command(self, command):
+        self._counter(command)["count"] += 1
+
+    def count_error(self, command):
+        self._counter(command)["errors"] += 1
+
+    def add_bytes(self, command, nbytes):
+        self._counter(command)["bytes_sent"] += nbytes
+
+    def snapshot(self):
+        """Returns {command: {"count", "errors", "bytes_sent", "stages": {stage: summary}}}."""
+        with self._lock:
+            stages = list(self._stages.items())
+            counters = list(self._counters.items())
+        result = {}
+        for command, counts in counters:
+            result[str(command)] = dict(counts, stages={})
+        for (command, stage), histogram in stages:
+            entry = result.setdefault(str(command), {"count": 0, "errors": 0, "bytes_sent": 0, "stages": {}})
+            entry["stages"][stage] = histogram.snapshot()
+        return result
+
+    def prometheus(self, gauges=None, prefix="blender_server"):
+        """
+        Renders the metrics in the Prometheus text exposition format. gauges
+        is an optional {name: value} dict of extra values (cache size, ...).
+        """
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        snapshot = self.snapshot()
+        for command, entry in sorted(snapshot.items()):
+            for stage, summary in sorted(entry["stages"].items()):
+                labels = f'command="{command}",stage="{stage}"'
+                for q in PERCENTILES:
+                    lines.append(f'{prefix}_stage_seconds{{{labels},quantile="{q}"}} '
+                                 f'{summary[f"p{int(q * 100)}"]:.6g}')
+                lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {summary['mean'] * summary['count']:.6g}")
+                lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {summary['count']}")
+        for name in ("count", "errors", "bytes_sent"):
+            metric = f"{prefix}_commands_total" if name == "count" else f"{prefix}_command_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for command, entry in sorted(snapshot.items()):
+                lines.append(f'{metric}{{command="{command}"}} {entry[name]}')
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -1,3 +1,12 @@
 #!/bin/bash
 # start_blender.sh
-exec xvfb-run -a blender /workspace/tennisCourt.blend --python -u /workspace/blenderServer.py
\ No newline at end of file
+# With BLENDER_MQTT_HOST set (e.g. tracker_mqtt) the server takes tracker poses straight from that MQTT broker.
+MQTT_ARGS=()
+if [ -n "$BLENDER_MQTT_HOST" ]; then
+    MQTT_ARGS=(--mqtt-host "$BLENDER_MQTT_HOST")
+fi
+# With RENDER_WORKERS > 1 a dispatcher on port 55001 spreads renders over that many headless Blender workers.
+if [ "${RENDER_WORKERS:-1}" -gt 1 ]; then
+    exec python3 -u /workspace/renderPool.py --workers "$RENDER_WORKERS" --blend-file /workspace/tennisCourt.blend "${MQTT_ARGS[@]}"
+fi
+exec xvfb-run -a blender /workspace/tennisCourt.blend --python -u /workspace/blenderServer.py -- "${MQTT_ARGS[@]}"
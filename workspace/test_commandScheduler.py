@@ -0,0 +1,82 @@
+"""Tests for commandScheduler.py; run with python3 -m unittest from this folder."""
+
+import unittest
+
+import commandScheduler
+
+
+class FakeConnection:
+    def __init__(self, addr):
+        self.addr = addr
+        self.closed = False
+
+
+def move(**fields):
+    return dict(fields, command="move", x=0.0, y=0.0, z=0.0)
+
+
+class CoalesceTests(unittest.TestCase):
+    def test_moves_by_different_handles_are_kept(self):
+        conn = FakeConnection("a")
+        first, second = move(handle=1), move(handle=2)
+        self.assertEqual(commandScheduler.coalesce_moves([(conn, first, 0.0), (conn, second, 0.0)]), 0)
+        self.assertNotIn("_superseded", first)
+        self.assertNotIn("_superseded", second)
+
+    def test_older_move_by_same_handle_is_superseded(self):
+        conn = FakeConnection("a")
+        first, other, second = move(handle=1), move(handle=2), move(handle=1)
+        commands = [(conn, first, 0.0), (conn, other, 0.0), (conn, second, 0.0)]
+        self.assertEqual(commandScheduler.coalesce_moves(commands), 1)
+        self.assertTrue(first["_superseded"])
+        self.assertNotIn("_superseded", other)
+        self.assertNotIn("_superseded", second)
+
+    def test_handle_and_name_moves_are_not_merged(self):
+        conn = FakeConnection("a")
+        by_name, by_handle = move(name="Ball"), move(handle=1)
+        self.assertEqual(commandScheduler.coalesce_moves([(conn, by_name, 0.0), (conn, by_handle, 0.0)]), 0)
+
+    def test_render_is_a_barrier(self):
+        conn = FakeConnection("a")
+        first, second = move(name="Ball"), move(name="Ball")
+        commands = [(conn, first, 0.0), (conn, {"command": "render"}, 0.0), (conn, second, 0.0)]
+        self.assertEqual(commandScheduler.coalesce_moves(commands), 0)
+
+
+class SchedulerTests(unittest.TestCase):
+    def test_moves_go_before_other_clients_renders(self):
+        scheduler = commandScheduler.CommandScheduler()
+        renderer, mover = FakeConnection("r"), FakeConnection("m")
+        scheduler.add([(renderer, {"command": "render"}, 0.0), (renderer, {"command": "render"}, 0.0),
+                       (mover, move(name="Ball"), 0.0)])
+        self.assertIs(scheduler.pop(0.0)[0], mover)
+        self.assertIs(scheduler.pop(0.0)[0], renderer)
+
+    def test_coalescing_moves_to_two_handles(self):
+        scheduler = commandScheduler.CommandScheduler(coalesce=True)
+        conn = FakeConnection("a")
+        moves = [move(handle=1), move(handle=2), move(handle=1), move(handle=2)]
+        self.assertEqual(scheduler.add([(conn, data, 0.0) for data in moves]), 2)
+        self.assertEqual([bool(data.get("_superseded")) for data in moves], [True, True, False, False])
+
+    def test_expired_commands_are_set_aside(self):
+        scheduler = commandScheduler.CommandScheduler()
+        conn = FakeConnection("a")
+        expired = {"command": "render", "deadline_ms": 10}
+        scheduler.add([(conn, expired, 0.0), (conn, {"command": "render"}, 0.0)])
+        self.assertNotIn("deadline_ms", scheduler.pop(1.0)[1])
+        self.assertEqual([data for _, data, _ in scheduler.take_expired()], [expired])
+
+    def test_closed_clients_are_dropped(self):
+        scheduler = commandScheduler.CommandScheduler()
+        conn = FakeConnection("a")
+        scheduler.add([(conn, {"command": "render"}, 0.0)])
+        conn.closed = True
+        self.assertIsNone(scheduler.pop(0.0))
+        self.assertEqual(scheduler.dropped_closed, 1)
+        self.assertEqual(len(scheduler), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Tests for poseFilter.py; run with python3 -m unittest from this folder."""
+
+import unittest
+
+import numpy as np
+
+import poseFilter
+
+RATE = 60.0  # measurements per second
+
+
+def trajectory(t):
+    """A pose moving at constant velocity on every channel; yaw crosses 180."""
+    return np.array([1.0 + 2.0 * t, -0.5 * t, 0.3, 10.0 + 5.0 * t, 0.0, 170.0 + 20.0 * t])
+
+
+def feed(pose_filter, name, start, end):
+    """Feeds the trajectory of one object from start to end; returns the time of the last measurement."""
+    times = np.arange(start, end, 1.0 / RATE)
+    for t in times:
+        pose_filter.update([name], [trajectory(t)], [t])
+    return times[-1]
+
+
+def pose_error(actual, expected):
+    difference = actual - expected
+    difference[poseFilter.ANGLES] = poseFilter.wrap_degrees(difference[poseFilter.ANGLES])
+    return np.abs(difference).max()
+
+
+class PoseFilterTests(unittest.TestCase):
+    def test_converges_on_constant_velocity(self):
+        pose_filter = poseFilter.PoseFilter()
+        last = feed(pose_filter, "ball", 0.0, 2.0)
+        self.assertLess(pose_error(pose_filter.velocity[0], np.array([2.0, -0.5, 0.0, 5.0, 0.0, 20.0])), 0.05)
+        # Between measurements the prediction follows the motion, across the yaw wrap too
+        t = last + 0.5 / RATE
+        self.assertLess(pose_error(pose_filter.predict(t)[0], trajectory(t)), 0.01)
+
+    def test_dropout_holds_then_resumes(self):
+        pose_filter = poseFilter.PoseFilter()
+        last = feed(pose_filter, "ball", 0.0, 2.0)
+        limit = last + poseFilter.MAX_PREDICTION
+        # A tracker that stopped publishing is extrapolated at most MAX_PREDICTION
+        np.testing.assert_allclose(pose_filter.predict(last + 1.0), pose_filter.predict(limit))
+        self.assertLess(pose_error(pose_filter.predict(last + 1.0)[0], trajectory(limit)), 0.01)
+        # Once measurements come back it follows the object again
+        last = feed(pose_filter, "ball", last + 1.0, last + 1.5)
+        t = last + 0.5 / RATE
+        self.assertLess(pose_error(pose_filter.predict(t)[0], trajectory(t)), 0.01)
+
+    def test_batched_objects_are_independent(self):
+        batched = poseFilter.PoseFilter(capacity=1)
+        alone = {"ball": poseFilter.PoseFilter(), "racket": poseFilter.PoseFilter()}
+        offsets = {"ball": 0.0, "racket": 3.0}
+        for t in np.arange(0.0, 1.0, 1.0 / RATE):
+            poses = [trajectory(t + offsets[name]) for name in ("ball", "racket")]
+            batched.update(["ball", "racket"], poses, [t, t])
+            for name, pose in zip(("ball", "racket"), poses):
+                alone[name].update([name], [pose], [t])
+        # Only the racket keeps publishing
+        later = np.arange(1.0, 1.5, 1.0 / RATE)
+        for t in later:
+            batched.update(["racket"], [trajectory(t + offsets["racket"])], [t])
+            alone["racket"].update(["racket"], [trajectory(t + offsets["racket"])], [t])
+        t = later[-1]
+        self.assertEqual(batched.names, ["ball", "racket"])
+        np.testing.assert_allclose(batched.predict(t), [alone["ball"].predict(t)[0], alone["racket"].predict(t)[0]])
+
+    def test_repeated_object_in_one_batch(self):
+        batched, single = poseFilter.PoseFilter(), poseFilter.PoseFilter()
+        times = np.arange(0.0, 0.5, 1.0 / RATE)
+        # Given out of order; applied oldest first like one at a time
+        batched.update(["ball"] * len(times), [trajectory(t) for t in times[::-1]], times[::-1])
+        for t in times:
+            single.update(["ball"], [trajectory(t)], [t])
+        np.testing.assert_allclose(batched.predict(times[-1]), single.predict(times[-1]))
+        self.assertEqual(batched.out_of_order, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()